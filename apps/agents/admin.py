@@ -1,4 +1,11 @@
+import json
+
 from django.contrib import admin
+from django.http import HttpResponseRedirect
+from django.utils import timezone
+from django.utils.html import format_html
+
+from iacol_project.pagination import EstimatedCountPaginator
 from .models import AgentCategory, Agent, UserSubscription, AgentConfiguration, AgentUsageLog, Product, AutomotiveCenterInfo, AdvancedCatalogCategory, AdvancedCatalogProduct, AdvancedCatalogModel, AdvancedCatalogImage
 
 @admin.register(AgentCategory)
@@ -91,10 +98,49 @@ class AutomotiveCenterInfoAdmin(admin.ModelAdmin):
 
 @admin.register(AgentUsageLog)
 class AgentUsageLogAdmin(admin.ModelAdmin):
+    """
+    Admin para una tabla de decenas de millones de filas: conteos estimados,
+    paginación por keyset sobre la pk, sin el COUNT(*) del total y navegación
+    por fechas (por defecto el mes actual) en lugar de filtrar toda la tabla.
+    """
     list_display = ['user', 'agent', 'success', 'execution_time', 'created_at']
-    list_filter = ['success', 'agent', 'created_at']
-    search_fields = ['user__username', 'agent__name']
-    readonly_fields = ['created_at']
+    list_filter = ['success', 'agent']
+    list_select_related = ['user', 'agent']
+    # Búsqueda exacta: un icontains sobre los JOIN recorrería la tabla entera
+    search_fields = ['=user__username', '=agent__name', '=execution_id']
+    search_help_text = 'Usuario, nombre del agente o execution_id exactos'
+    date_hierarchy = 'created_at'
+    ordering = ['-id']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    autocomplete_fields = ['user', 'agent']
+    readonly_fields = ['created_at', 'payload_offloaded', 'full_input_data', 'full_output_data']
+    # El payload completo (y su descompresión) solo se carga en el detalle de una ejecución
+    exclude = ['input_data', 'output_data']
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if request.resolver_match and request.resolver_match.url_name.endswith('_changelist'):
+            queryset = queryset.defer('input_data', 'output_data')
+        return queryset
+
+    def changelist_view(self, request, extra_context=None):
+        # Sin parámetros, date_hierarchy listaría los años con un DISTINCT sobre toda la tabla
+        if request.method == 'GET' and not request.GET:
+            today = timezone.localdate()
+            return HttpResponseRedirect(f'{request.path}?created_at__year={today.year}&created_at__month={today.month}')
+        return super().changelist_view(request, extra_context)
+
+    def _format_json(self, value):
+        return format_html('<pre style="white-space: pre-wrap;">{}</pre>', json.dumps(value, indent=2, ensure_ascii=False))
+
+    @admin.display(description='Input data')
+    def full_input_data(self, obj):
+        return self._format_json(obj.full_payload['input_data'])
+
+    @admin.display(description='Output data')
+    def full_output_data(self, obj):
+        return self._format_json(obj.full_payload['output_data'])
 
 @admin.register(AdvancedCatalogCategory)
 class AdvancedCatalogCategoryAdmin(admin.ModelAdmin):
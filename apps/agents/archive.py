@@ -0,0 +1,193 @@
+"""
+Archivo en frío de AgentUsageLog.
+
+archive_usage_logs() exporta los logs con más de USAGE_LOG_RETENTION_DAYS días a
+ficheros JSONL comprimidos con gzip, agrupados por mes de created_at:
+
+    USAGE_LOG_ARCHIVE_DIR/2025-03/part-000000001000-000000005999.jsonl.gz
+
+y después los borra de la tabla por lotes. Cada lote se escribe en un fichero
+temporal, se sincroniza a disco y se renombra antes de borrar sus filas: si el
+proceso muere entre ambos pasos, la siguiente ejecución vuelve a exportar esas
+filas y los lectores descartan los ids repetidos.
+
+archived_usage_stats() / historical_usage_stats() calculan estadísticas (p. ej.
+para una disputa de facturación) leyendo solo los meses del rango pedido.
+"""
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Avg, Count, Q
+from django.utils import timezone
+
+from .models import AgentUsageLog, AgentUsageLogPayload
+from .payloads import decompress_payload
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FIELDS = (
+    'id', 'user_id', 'user__username', 'agent_id', 'agent__name', 'execution_id', 'execution_time',
+    'success', 'error_message', 'created_at', 'input_data', 'output_data', 'payload_offloaded',
+)
+
+
+def archive_dir():
+    return Path(settings.USAGE_LOG_ARCHIVE_DIR)
+
+
+def month_key(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y-%m')
+
+
+def _serialize(row, payloads):
+    stored = payloads.get(row['id'])
+    if stored is not None:
+        full = decompress_payload(stored.codec, stored.data)
+        row['input_data'], row['output_data'] = full['input_data'], full['output_data']
+    row['created_at'] = row['created_at'].isoformat()
+    row['username'] = row.pop('user__username')
+    row['agent_name'] = row.pop('agent__name')
+    del row['payload_offloaded']
+    return json.dumps(row, ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+def _write_part(month, rows):
+    """Escribe el lote de forma atómica (temporal + fsync + rename) y devuelve la ruta"""
+    directory = archive_dir() / month
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"part-{rows[0]['id']:012d}-{rows[-1]['id']:012d}.jsonl.gz"
+    tmp_path = path.with_name(f'.{path.name}.tmp')
+    with open(tmp_path, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6) as out:
+        for line in rows:
+            out.write(line['line'].encode())
+            out.write(b'\n')
+    with open(tmp_path, 'rb') as raw:
+        os.fsync(raw.fileno())
+    os.replace(tmp_path, path)
+    return path
+
+
+def archive_batch(cutoff, batch_size):
+    """Exporta y borra un lote de logs anteriores a `cutoff`; devuelve cuántos se archivaron"""
+    rows = list(
+        AgentUsageLog.objects.filter(created_at__lt=cutoff).order_by('id').values(*ARCHIVE_FIELDS)[:batch_size]
+    )
+    if not rows:
+        return 0
+    offloaded_ids = [row['id'] for row in rows if row['payload_offloaded']]
+    payloads = AgentUsageLogPayload.objects.in_bulk(offloaded_ids) if offloaded_ids else {}
+
+    by_month = {}
+    for row in rows:
+        month = month_key(row['created_at'])
+        by_month.setdefault(month, []).append({'id': row['id'], 'line': _serialize(row, payloads)})
+    for month, month_rows in by_month.items():
+        _write_part(month, month_rows)
+
+    ids = [row['id'] for row in rows]
+    # El borrado en cascada incluye AgentUsageLogPayload
+    AgentUsageLog.objects.filter(id__in=ids).delete()
+    return len(ids)
+
+
+def archive_usage_logs(retention_days=None, batch_size=None, max_batches=None):
+    """
+    Archiva y borra los logs con más de `retention_days` días. Se limita a
+    `max_batches` lotes por ejecución; lo pendiente queda para la siguiente.
+    """
+    retention_days = settings.USAGE_LOG_RETENTION_DAYS if retention_days is None else retention_days
+    if not retention_days:
+        return 0
+    batch_size = batch_size or settings.USAGE_LOG_ARCHIVE_BATCH_SIZE
+    max_batches = max_batches or settings.USAGE_LOG_ARCHIVE_MAX_BATCHES
+    cutoff = timezone.now() - timedelta(days=retention_days)
+
+    archived = 0
+    for _ in range(max_batches):
+        count = archive_batch(cutoff, batch_size)
+        archived += count
+        if count < batch_size:
+            break
+    if archived:
+        logger.info("Archivados %d logs de uso anteriores a %s en %s", archived, cutoff.date(), archive_dir())
+    return archived
+
+
+def _months_between(start, end):
+    """Meses ('YYYY-MM') del rango; None en un extremo significa sin límite"""
+    months = sorted(path.name for path in archive_dir().glob('[0-9][0-9][0-9][0-9]-[0-9][0-9]') if path.is_dir())
+    if start is not None:
+        months = [month for month in months if month >= month_key(start)]
+    if end is not None:
+        months = [month for month in months if month <= month_key(end)]
+    return months
+
+
+def iter_archived_logs(start=None, end=None, user_id=None, agent_id=None):
+    """Logs archivados (dicts) con created_at en [start, end), sin ids repetidos"""
+    seen = set()
+    for month in _months_between(start, end):
+        for path in sorted((archive_dir() / month).glob('part-*.jsonl.gz')):
+            with gzip.open(path, 'rt', encoding='utf-8') as lines:
+                for line in lines:
+                    row = json.loads(line)
+                    if row['id'] in seen:
+                        continue
+                    if user_id is not None and row['user_id'] != user_id:
+                        continue
+                    if agent_id is not None and row['agent_id'] != agent_id:
+                        continue
+                    created_at = datetime.fromisoformat(row['created_at'])
+                    if (start is not None and created_at < start) or (end is not None and created_at >= end):
+                        continue
+                    seen.add(row['id'])
+                    row['created_at'] = created_at
+                    yield row
+
+
+def _stats(total, successful, time_sum):
+    return {
+        'total_executions': total,
+        'successful_executions': successful,
+        'failed_executions': total - successful,
+        'success_rate': (successful / total * 100) if total > 0 else 0,
+        'avg_execution_time': (time_sum / total) if total > 0 else None,
+    }
+
+
+def archived_usage_stats(start=None, end=None, user_id=None, agent_id=None):
+    """Estadísticas de los logs archivados con los mismos campos que la API agent-stats"""
+    total = successful = 0
+    time_sum = 0.0
+    for row in iter_archived_logs(start, end, user_id, agent_id):
+        total += 1
+        successful += row['success']
+        time_sum += row['execution_time'] or 0
+    return _stats(total, successful, time_sum)
+
+
+def historical_usage_stats(start=None, end=None, user_id=None, agent_id=None):
+    """Estadísticas combinadas de la tabla (logs recientes) y del archivo"""
+    filters = Q()
+    if start is not None:
+        filters &= Q(created_at__gte=start)
+    if end is not None:
+        filters &= Q(created_at__lt=end)
+    if user_id is not None:
+        filters &= Q(user_id=user_id)
+    if agent_id is not None:
+        filters &= Q(agent_id=agent_id)
+    live = AgentUsageLog.objects.filter(filters).aggregate(
+        total=Count('id'), successful=Count('id', filter=Q(success=True)), avg_time=Avg('execution_time'),
+    )
+    archived = archived_usage_stats(start, end, user_id, agent_id)
+
+    total = live['total'] + archived['total_executions']
+    successful = live['successful'] + archived['successful_executions']
+    time_sum = (live['avg_time'] or 0) * live['total'] + (archived['avg_execution_time'] or 0) * archived['total_executions']
+    return _stats(total, successful, time_sum)
@@ -0,0 +1,273 @@
+"""
+Ejecuciones en tiempo real para el dashboard del agente (server-sent events).
+
+- Publicación: al crear un AgentUsageLog (AgentUsageLogManager.create_log),
+  tras el commit se publica el evento en el canal Redis pub/sub del par
+  (usuario, agente) y se invalida el cache de estadísticas del dashboard, de
+  modo que una recarga de la página parte de los mismos contadores que luego
+  se actualizan en vivo.
+- Suscripción: cada event loop de un proceso web tiene un ExecutionHub con una
+  sola conexión de pub/sub; las conexiones SSE abiertas se suscriben a su canal
+  en el hub, que reparte los mensajes en colas acotadas. Un cliente que no lee
+  a tiempo (cola llena) o un corte de Redis cierran el stream.
+- Stream: cada conexión dura como mucho SSE_MAX_STREAM_SECONDS (Django 4.2 no
+  detecta la desconexión del cliente durante un StreamingHttpResponse) y el
+  navegador reconecta con la cabecera Last-Event-ID; las ejecuciones creadas
+  entre conexiones se recuperan de la base de datos antes de seguir en vivo.
+  Si se perdieron más de CATCHUP_LIMIT se envía un evento 'reload' y el
+  navegador recarga el dashboard en lugar de recibirlas una a una. Tras la
+  recuperación se devuelve la conexión a la base de datos: la parte en vivo no
+  la usa y el stream no debe retenerla del pool durante minutos.
+
+Sin Redis (cache degradado) el stream solo envía lo pendiente y pide al
+navegador que reconecte más tarde.
+"""
+import asyncio
+import json
+import logging
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import connection
+
+from iacol_project.cache import REDIS_ERRORS
+
+from .models import AgentUsageLog
+from .subscriptions import dashboard_stats_cache_key
+
+logger = logging.getLogger(__name__)
+
+EVENT_FIELDS = ('id', 'execution_id', 'success', 'execution_time', 'created_at')
+SUBSCRIBER_QUEUE_SIZE = 100
+CATCHUP_LIMIT = 100
+RECONNECT_MS = 3000
+UNAVAILABLE_RECONNECT_MS = 30000
+
+_CLOSED = object()
+
+
+def execution_channel(user_id, agent_id):
+    return f'agents:executions:{user_id}:{agent_id}'
+
+
+def execution_event(values):
+    """Evento serializable a partir de los EVENT_FIELDS de un log"""
+    event = {field: values[field] for field in EVENT_FIELDS}
+    event['created_at'] = event['created_at'].isoformat()
+    return event
+
+
+def _redis_backend():
+    """Backend 'default' si es Redis y no está en modo degradado; si no, None"""
+    from django_redis.cache import RedisCache
+    backend = caches['default']
+    if not isinstance(backend, RedisCache) or getattr(backend, 'degraded', False):
+        return None
+    return backend
+
+
+def publish_execution(log):
+    """Publica `log` en el canal de su (usuario, agente); se llama tras el commit"""
+    cache.delete(dashboard_stats_cache_key(log.user_id, log.agent_id))
+    if _redis_backend() is None:
+        return
+    from django_redis import get_redis_connection
+    message = json.dumps(execution_event({field: getattr(log, field) for field in EVENT_FIELDS}))
+    try:
+        get_redis_connection('default').publish(execution_channel(log.user_id, log.agent_id), message)
+    except REDIS_ERRORS as e:
+        # El log ya está guardado; los dashboards abiertos lo recuperan al reconectar
+        logger.debug("No se pudo publicar la ejecución %s: %s", log.id, e)
+
+
+class SubscriptionClosed(Exception):
+    """El hub cerró la suscripción (cola llena o Redis no disponible)"""
+
+
+class Subscription:
+    def __init__(self, hub, channel):
+        self.hub = hub
+        self.channel = channel
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    async def get(self, timeout):
+        """Siguiente evento, o None si no llega ninguno en `timeout` segundos"""
+        try:
+            event = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if event is _CLOSED:
+            raise SubscriptionClosed(self.channel)
+        return event
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            logger.info("Suscriptor lento en %s; se cierra su stream", self.channel)
+            self.hub.discard(self)
+            self.terminate()
+
+    def terminate(self):
+        # Vacía la cola para que el cierre llegue antes que los eventos pendientes
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(_CLOSED)
+
+    async def close(self):
+        await self.hub.unsubscribe(self)
+
+
+class ExecutionHub:
+    """Una conexión de pub/sub por event loop repartida entre las suscripciones SSE"""
+
+    def __init__(self, pubsub):
+        self.pubsub = pubsub
+        self.subscriptions = {}  # canal -> set de Subscription
+        self.broken = False
+        self._reader = None
+
+    async def subscribe(self, channel):
+        subscription = Subscription(self, channel)
+        if channel not in self.subscriptions:
+            self.subscriptions[channel] = set()
+            try:
+                await self.pubsub.subscribe(channel)
+            except BaseException:
+                del self.subscriptions[channel]
+                raise
+        self.subscriptions[channel].add(subscription)
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.create_task(self._read())
+        return subscription
+
+    def discard(self, subscription):
+        """Quita la suscripción del reparto; devuelve True si era la última del canal"""
+        subscriptions = self.subscriptions.get(subscription.channel)
+        if subscriptions is None:
+            return False
+        subscriptions.discard(subscription)
+        if subscriptions:
+            return False
+        del self.subscriptions[subscription.channel]
+        return True
+
+    async def unsubscribe(self, subscription):
+        if self.discard(subscription) and not self.broken:
+            try:
+                await self.pubsub.unsubscribe(subscription.channel)
+            except REDIS_ERRORS as e:
+                logger.debug("Error al cancelar la suscripción a %s: %s", subscription.channel, e)
+
+    async def _read(self):
+        try:
+            while self.subscriptions:
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if not message or message.get('type') != 'message':
+                    continue
+                channel = message['channel']
+                if isinstance(channel, bytes):
+                    channel = channel.decode()
+                event = json.loads(message['data'])
+                for subscription in list(self.subscriptions.get(channel, ())):
+                    subscription.put(event)
+        except REDIS_ERRORS as e:
+            # redis-py ya reintentó la reconexión: se cierran los streams y el siguiente usa otro hub
+            logger.warning("Pub/sub de ejecuciones sin Redis: %s", e)
+            self.broken = True
+            for subscriptions in list(self.subscriptions.values()):
+                for subscription in subscriptions:
+                    subscription.terminate()
+            self.subscriptions.clear()
+            try:
+                await self.pubsub.reset()
+            except REDIS_ERRORS:
+                pass
+
+
+_hubs = weakref.WeakKeyDictionary()
+
+
+def get_hub():
+    """Hub del event loop actual, o None si Redis no está disponible"""
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None or hub.broken:
+        backend = _redis_backend()
+        if backend is None or not hasattr(backend, 'get_async_client'):
+            return None
+        hub = ExecutionHub(backend.get_async_client().pubsub())
+        _hubs[loop] = hub
+    return hub
+
+
+async def subscribe(user_id, agent_id):
+    """Suscripción al canal de (usuario, agente), o None si Redis no está disponible"""
+    hub = get_hub()
+    if hub is None:
+        return None
+    try:
+        return await hub.subscribe(execution_channel(user_id, agent_id))
+    except REDIS_ERRORS as e:
+        logger.warning("No se pudo suscribir a las ejecuciones de %s/%s: %s", user_id, agent_id, e)
+        return None
+
+
+def format_event(event):
+    return f"id: {event['id']}\nevent: execution\ndata: {json.dumps(event)}\n\n"
+
+
+def release_connection():
+    """Cierra (devuelve al pool) la conexión del hilo de la petición"""
+    # Dentro de un atomic (ATOMIC_REQUESTS, tests) cerrarla rompería la transacción
+    if not connection.in_atomic_block:
+        connection.close()
+
+
+async def stream_execution_events(user_id, agent_id, last_id=None):
+    """
+    Mensajes SSE con las ejecuciones de (usuario, agente): primero las
+    posteriores a `last_id` (si se indica) y después las nuevas en vivo.
+    """
+    # Suscribirse antes de consultar la base de datos: nada cae entre ambas
+    subscription = await subscribe(user_id, agent_id)
+    try:
+        yield f'retry: {RECONNECT_MS if subscription else UNAVAILABLE_RECONNECT_MS}\n\n'
+        if last_id is not None:
+            missed = (
+                AgentUsageLog.objects.filter(user_id=user_id, agent_id=agent_id, id__gt=last_id)
+                .order_by('id').values(*EVENT_FIELDS)[:CATCHUP_LIMIT + 1]
+            )
+            events = [execution_event(values) async for values in missed]
+            if len(events) > CATCHUP_LIMIT:
+                # Los contadores del navegador ya no se pueden cuadrar evento a evento
+                yield 'event: reload\ndata: {}\n\n'
+                return
+            for event in events:
+                last_id = event['id']
+                yield format_event(event)
+        # La comprobación de la suscripción en la vista y la recuperación abren la conexión
+        await sync_to_async(release_connection)()
+        if subscription is None:
+            return
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.SSE_MAX_STREAM_SECONDS
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                event = await subscription.get(min(settings.SSE_HEARTBEAT_SECONDS, remaining))
+            except SubscriptionClosed:
+                return
+            if event is None:
+                # Comentario SSE: mantiene viva la conexión a través de proxies
+                yield ': keepalive\n\n'
+                continue
+            if last_id is not None and event['id'] <= last_id:
+                continue  # ya enviado en la recuperación
+            last_id = event['id']
+            yield format_event(event)
+    finally:
+        if subscription is not None:
+            await subscription.close()
@@ -0,0 +1,108 @@
+"""
+Exportación en streaming del historial de ejecuciones (AgentUsageLog).
+
+Las filas salen de un cursor del servidor (QuerySet.iterator()) con una proyección
+values_list y se escriben en bloques de ~EXPORT_BUFFER_BYTES: la memoria no
+depende del número de ejecuciones. El generador es async porque bajo ASGI
+Django consume entero (en una lista) cualquier iterador síncrono de un
+StreamingHttpResponse.
+"""
+import csv
+import io
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+EXPORT_COLUMNS = ('created_at', 'execution_id', 'success', 'execution_time', 'error_message')
+EXPORT_BUFFER_BYTES = 64 * 1024
+
+# Celdas que Excel/LibreOffice interpretarían como fórmula
+CSV_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _csv_cell(value):
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class CSVEncoder:
+    content_type = 'text/csv; charset=utf-8'
+    extension = 'csv'
+
+    def __init__(self):
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+
+    def header(self):
+        self.writer.writerow(EXPORT_COLUMNS)
+        return self._take()
+
+    def row(self, values):
+        created_at, *rest = values
+        self.writer.writerow([created_at.isoformat(), *(_csv_cell(value) for value in rest)])
+        return self._take()
+
+    def _take(self):
+        value = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return value
+
+
+class JSONLEncoder:
+    content_type = 'application/x-ndjson; charset=utf-8'
+    extension = 'jsonl'
+
+    def header(self):
+        return ''
+
+    def row(self, values):
+        entry = dict(zip(EXPORT_COLUMNS, values))
+        entry['created_at'] = entry['created_at'].isoformat()
+        return json.dumps(entry, ensure_ascii=False) + '\n'
+
+
+EXPORT_FORMATS = {
+    'csv': CSVEncoder,
+    'jsonl': JSONLEncoder,
+}
+
+
+async def aiter_server_side(queryset, chunk_size):
+    """
+    Filas de queryset.iterator() (cursor del servidor) leídas en bloques desde un
+    hilo. Es lo que hace QuerySet.aiterator(), pero en Django 4.2 aiterator()
+    llama a __iter__() del iterable en el event loop, y el de values()/values_list()
+    no es un generador: abre el cursor en el acto (SynchronousOnlyOperation).
+    QuerySet.iterator() sí es un generador y la consulta empieza en el hilo.
+    """
+    rows = queryset.iterator(chunk_size=chunk_size)  # generador: la consulta empieza con el primer next()
+    try:
+        while True:
+            chunk = await sync_to_async(list)(islice(rows, chunk_size))
+            for row in chunk:
+                yield row
+            if len(chunk) < chunk_size:
+                break
+    finally:
+        # Cierra el cursor también si el cliente corta la descarga
+        await sync_to_async(rows.close)()
+
+
+async def stream_executions(queryset, encoder):
+    """Bloques de bytes con las ejecuciones de `queryset` (ya filtrado) en el formato de `encoder`"""
+    rows = queryset.order_by('created_at', 'id').values_list(*EXPORT_COLUMNS)
+    chunk = [encoder.header()]
+    size = len(chunk[0])
+    async for values in aiter_server_side(rows, settings.EXECUTION_EXPORT_CHUNK_SIZE):
+        line = encoder.row(values)
+        chunk.append(line)
+        size += len(line)
+        if size >= EXPORT_BUFFER_BYTES:
+            yield ''.join(chunk).encode()
+            chunk, size = [], 0
+    if chunk:
+        yield ''.join(chunk).encode()
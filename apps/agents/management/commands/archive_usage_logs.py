@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.agents.archive import archive_dir, archive_usage_logs
+
+
+class Command(BaseCommand):
+    help = (
+        'Exporta a USAGE_LOG_ARCHIVE_DIR (JSONL gzip por mes) y borra los AgentUsageLog con más de '
+        'USAGE_LOG_RETENTION_DAYS días. Es lo que ejecuta a diario la tarea archive_old_usage_logs.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='Retención en días (por defecto el setting)')
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--max-batches', type=int, default=None)
+
+    def handle(self, *args, **options):
+        days = options['days'] if options['days'] is not None else settings.USAGE_LOG_RETENTION_DAYS
+        archived = archive_usage_logs(days, options['batch_size'], options['max_batches'])
+        self.stdout.write(self.style.SUCCESS(f'{archived} logs con más de {days} días archivados en {archive_dir()}'))
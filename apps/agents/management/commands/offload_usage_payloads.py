@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.agents.models import AgentUsageLog, AgentUsageLogPayload
+
+
+class Command(BaseCommand):
+    help = (
+        'Mueve a AgentUsageLogPayload (comprimidos) los input_data/output_data de los logs existentes que '
+        'superan USAGE_LOG_INLINE_PAYLOAD_BYTES. Idempotente; después, VACUUM FULL (o pg_repack) de '
+        'agents_agentusagelog devuelve el espacio al sistema.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        scanned = offloaded = raw_bytes = stored_bytes = 0
+        while True:
+            logs = list(
+                AgentUsageLog.objects.filter(id__gt=last_id, payload_offloaded=False)
+                .only('id', 'input_data', 'output_data')
+                .order_by('id')[:batch_size]
+            )
+            if not logs:
+                break
+            last_id = logs[-1].id
+            scanned += len(logs)
+
+            changed, stored = [], []
+            for log in logs:
+                payload = log.set_payload(log.input_data, log.output_data)
+                if payload is not None:
+                    changed.append(log)
+                    stored.append(payload)
+                    raw_bytes += payload.raw_size
+                    stored_bytes += len(payload.data)
+            if changed:
+                with transaction.atomic():
+                    AgentUsageLogPayload.objects.bulk_create(stored, ignore_conflicts=True)
+                    AgentUsageLog.objects.bulk_update(changed, ['input_data', 'output_data', 'payload_offloaded'])
+                offloaded += len(changed)
+            self.stdout.write(f'  {scanned} revisados, {offloaded} movidos')
+
+        ratio = f' ({raw_bytes // 1024} KB -> {stored_bytes // 1024} KB)' if offloaded else ''
+        self.stdout.write(self.style.SUCCESS(f'{offloaded} de {scanned} logs con payload fuera de la tabla{ratio}'))
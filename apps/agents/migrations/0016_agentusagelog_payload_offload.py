@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agents', '0015_advancedcatalogcategory_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgentUsageLogPayload',
+            fields=[
+                ('log', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='payload', serialize=False, to='agents.agentusagelog')),
+                ('codec', models.CharField(max_length=10)),
+                ('data', models.BinaryField()),
+                ('raw_size', models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='agentusagelog',
+            name='payload_offloaded',
+            field=models.BooleanField(default=False),
+        ),
+        # Los datos ya van comprimidos: TOAST fuera de línea sin recomprimir
+        migrations.RunSQL(
+            'ALTER TABLE agents_agentusagelogpayload ALTER COLUMN data SET STORAGE EXTERNAL',
+            migrations.RunSQL.noop,
+        ),
+    ]
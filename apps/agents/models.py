@@ -1,10 +1,14 @@
-from django.db import models
+from asgiref.sync import sync_to_async
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
+from django.utils.functional import cached_property
 from django.core.validators import RegexValidator, MinValueValidator, EmailValidator
 import os
 import uuid
 
+from . import payloads
+
 class AgentCategory(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField()
@@ -14,6 +18,25 @@ class AgentCategory(models.Model):
     def __str__(self):
         return self.name
 
+class AgentQuerySet(models.QuerySet):
+    """update()/delete() en bloque (acciones del admin) también purgan la página de soluciones"""
+
+    def update(self, **kwargs):
+        updated = super().update(**kwargs)
+        if updated:
+            Agent._purge_page_cache()
+        return updated
+
+    def delete(self):
+        result = super().delete()
+        if result[0]:
+            Agent._purge_page_cache()
+        return result
+
+    update.alters_data = True
+    delete.alters_data = True
+    delete.queryset_only = True
+
 class Agent(models.Model):
     PRICING_TYPES = [
         ('monthly', 'Mensual'),
@@ -41,6 +64,8 @@ class Agent(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = AgentQuerySet.as_manager()
+
     class Meta:
         indexes = [
             models.Index(fields=['is_active', 'show_in_agents']),
@@ -49,6 +74,20 @@ class Agent(models.Model):
             models.Index(fields=['created_at']),
         ]
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._purge_page_cache()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        self._purge_page_cache()
+        return result
+
+    @staticmethod
+    def _purge_page_cache():
+        from iacol_project.page_cache import purge_page_cache_on_commit
+        purge_page_cache_on_commit(['solutions'])
+
     def get_image_url(self):
         """Devuelve la URL correcta para acceder a la imagen"""
         if self.image and self.image.name:
@@ -58,6 +97,16 @@ class Agent(models.Model):
     def __str__(self):
         return self.name
 
+class UserSubscriptionQuerySet(models.QuerySet):
+    def active(self):
+        """
+        Suscripciones que dan acceso: activas y sin vencer. No basta con
+        status='active': entre dos ejecuciones del job de ciclo de vida
+        (apps/agents/subscriptions.py) una vencida aún no está marcada.
+        """
+        return self.filter(status='active', end_date__gt=timezone.now())
+
+
 class UserSubscription(models.Model):
     STATUS_CHOICES = [
         ('active', 'Activa'),
@@ -74,6 +123,8 @@ class UserSubscription(models.Model):
     auto_renew = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = UserSubscriptionQuerySet.as_manager()
+
     class Meta:
         unique_together = ['user', 'agent']
         indexes = [
@@ -376,17 +427,44 @@ class AutomotiveCenterInfo(models.Model):
     def __str__(self):
         return f"Centro Automotriz: {self.agent_config.agent.name}"
 
+class AgentUsageLogManager(models.Manager):
+    def create_log(self, input_data=None, output_data=None, **fields):
+        """
+        Crea el log; si los payloads superan USAGE_LOG_INLINE_PAYLOAD_BYTES se
+        guardan comprimidos en AgentUsageLogPayload y en línea queda un resumen.
+        Tras el commit se publica en el dashboard en vivo (ver events.py).
+        """
+        from .events import publish_execution
+        log = self.model(**fields)
+        payload = log.set_payload(input_data or {}, output_data or {})
+        with transaction.atomic():
+            log.save()
+            if payload is not None:
+                payload.log = log
+                payload.save()
+            transaction.on_commit(lambda: publish_execution(log))
+        return log
+
+    async def acreate_log(self, **kwargs):
+        return await sync_to_async(self.create_log)(**kwargs)
+
+
 class AgentUsageLog(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     agent = models.ForeignKey(Agent, on_delete=models.CASCADE)
     execution_id = models.CharField(max_length=100)
+    # Con payload_offloaded contienen solo un resumen; el documento completo
+    # está en AgentUsageLogPayload (ver apps/agents/payloads.py y get_payload())
     input_data = models.JSONField(default=dict)
     output_data = models.JSONField(default=dict)
+    payload_offloaded = models.BooleanField(default=False)
     execution_time = models.FloatField()  # En segundos
     success = models.BooleanField(default=True)
     error_message = models.TextField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = AgentUsageLogManager()
+
     class Meta:
         # Consider partitioning by created_at for large datasets
         # db_table = 'agents_agentusagelog'  # For partitioning in PostgreSQL
@@ -402,6 +480,45 @@ class AgentUsageLog(models.Model):
         status = "✓" if self.success else "✗"
         return f"{status} {self.user.username} - {self.agent.name} [{self.created_at}]"
 
+    def set_payload(self, input_data, output_data):
+        """
+        Asigna input_data/output_data; devuelve el AgentUsageLogPayload (sin
+        guardar) si van fuera de la tabla, o None si caben en línea
+        """
+        offload, input_size, output_size = payloads.should_offload(input_data, output_data)
+        if not offload:
+            self.input_data, self.output_data, self.payload_offloaded = input_data, output_data, False
+            return None
+        codec, data, raw_size = payloads.compress_payload(input_data, output_data)
+        self.input_data = payloads.summarize(input_data, input_size)
+        self.output_data = payloads.summarize(output_data, output_size)
+        self.payload_offloaded = True
+        self.__dict__['full_payload'] = {'input_data': input_data, 'output_data': output_data}
+        return AgentUsageLogPayload(log=self, codec=codec, data=data, raw_size=raw_size)
+
+    @cached_property
+    def full_payload(self):
+        """Payload completo; una consulta y descompresión solo si se guardó fuera de la tabla"""
+        if not self.payload_offloaded:
+            return {'input_data': self.input_data, 'output_data': self.output_data}
+        try:
+            stored = AgentUsageLogPayload.objects.get(log_id=self.pk)
+        except AgentUsageLogPayload.DoesNotExist:
+            # Archivado o borrado: queda el resumen
+            return {'input_data': self.input_data, 'output_data': self.output_data}
+        return payloads.decompress_payload(stored.codec, stored.data)
+
+
+class AgentUsageLogPayload(models.Model):
+    """input_data/output_data completos y comprimidos de un AgentUsageLog"""
+    log = models.OneToOneField(AgentUsageLog, on_delete=models.CASCADE, primary_key=True, related_name='payload')
+    codec = models.CharField(max_length=10)
+    data = models.BinaryField()
+    raw_size = models.PositiveIntegerField()  # bytes del JSON sin comprimir
+
+    def __str__(self):
+        return f"Payload {self.log_id} ({self.codec}, {len(self.data)}/{self.raw_size} bytes)"
+
 class AdvancedCatalogCategory(models.Model):
     """Modelo para categorías del catálogo avanzado"""
     name = models.CharField(max_length=100, verbose_name='Nombre de la categoría')
@@ -0,0 +1,299 @@
+"""
+Cliente HTTP de n8n.
+
+Un cliente por proceso (get_client()) con una requests.Session compartida:
+conexiones keep-alive reutilizadas entre peticiones y hasta
+N8N_MAX_CONNECTIONS peticiones simultáneas por host. Si todas están ocupadas,
+una nueva petición espera como mucho N8N_CONNECT_TIMEOUT antes de fallar.
+
+- Timeouts: N8N_CONNECT_TIMEOUT para conectar y N8N_TIMEOUT para la respuesta.
+- Reintentos (N8N_MAX_RETRIES) con backoff exponencial y jitter completo:
+  - ante fallos al conectar y respuestas 429/503, en cualquier método;
+  - ante conexiones cortadas, timeouts de lectura y respuestas 502/504 solo
+    en GET. Un webhook (POST) que falló así puede haberse ejecutado igualmente:
+    se lanza N8NOutcomeUnknown, que no se reintenta en ningún nivel, para no
+    ejecutar el workflow dos veces.
+- Circuit breaker por host: tras N8N_CIRCUIT_FAILURE_THRESHOLD fallos
+  seguidos, las peticiones fallan sin salir del proceso durante
+  N8N_CIRCUIT_RESET_TIMEOUT segundos. Después se deja pasar una petición de
+  prueba.
+
+Los workflows se disparan por su webhook, cuyo path es Agent.n8n_workflow_id
+(N8N_WEBHOOK_URL + n8n_workflow_id). Las ejecuciones se consultan con la API
+pública de n8n (N8N_API_URL, cabecera X-N8N-API-KEY).
+
+Los métodos a* son las versiones async de las vistas ASGI. Ejecutan la
+petición en un hilo con la misma sesión, así que comparten el pool y los
+límites. Para no esperar la respuesta existe dispatch_workflow(), que
+encola la tarea de Celery trigger_n8n_workflow.
+"""
+import logging
+import random
+import threading
+import time
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 502, 503, 504}
+# El proxy (o n8n) pudo haber recibido la petición antes de fallar
+AMBIGUOUS_STATUSES = {502, 504}
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+MAX_BACKOFF_SECONDS = 10
+FINISHED_STATUSES = {'success', 'error', 'crashed', 'canceled'}
+
+
+class N8NError(Exception):
+    pass
+
+
+class N8NUnavailable(N8NError):
+    """n8n no responde: circuito abierto, pool saturado o reintentos agotados"""
+
+
+class N8NOutcomeUnknown(N8NError):
+    """La petición llegó a n8n pero no hubo respuesta válida; no se reintenta, pudo ejecutarse"""
+
+
+class N8NRequestError(N8NError):
+    """n8n rechazó la petición (4xx o 5xx no reintentable); no se reintenta"""
+
+    def __init__(self, status_code, body):
+        super().__init__(f"n8n respondió {status_code}: {body[:200]}")
+        self.status_code = status_code
+        self.body = body
+
+
+class CircuitBreaker:
+    """Fallos seguidos de un host; abierto hasta `open_until`, después deja pasar una petición de prueba"""
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.open_until = 0
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return bool(self.open_until) and time.monotonic() < self.open_until
+
+    def allow(self):
+        with self._lock:
+            if not self.open_until:
+                return True
+            now = time.monotonic()
+            if now < self.open_until:
+                return False
+            # Medio abierto: esta petición es la prueba; las demás esperan otro periodo
+            self.open_until = now + self.reset_timeout
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self.open_until:
+                logger.info("n8n responde de nuevo; circuito cerrado")
+            self.failures = 0
+            self.open_until = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.open_until or self.failures >= self.failure_threshold:
+                if not self.open_until:
+                    logger.warning("n8n falla %d veces seguidas; circuito abierto durante %ss",
+                                   self.failures, self.reset_timeout)
+                self.open_until = time.monotonic() + self.reset_timeout
+
+
+def _not_sent(error):
+    """True si el error de conexión ocurrió antes de enviar la petición"""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+class N8NClient:
+    def __init__(self, webhook_url=None, api_url=None, api_key=None, timeout=None, connect_timeout=None,
+                 max_retries=None, retry_backoff=None, max_connections=None, failure_threshold=None,
+                 reset_timeout=None):
+        self.webhook_url = webhook_url or settings.N8N_WEBHOOK_URL
+        self.api_url = api_url or settings.N8N_API_URL
+        self.api_key = settings.N8N_API_KEY if api_key is None else api_key
+        self.timeout = (
+            settings.N8N_CONNECT_TIMEOUT if connect_timeout is None else connect_timeout,
+            settings.N8N_TIMEOUT if timeout is None else timeout,
+        )
+        self.max_retries = settings.N8N_MAX_RETRIES if max_retries is None else max_retries
+        self.retry_backoff = settings.N8N_RETRY_BACKOFF if retry_backoff is None else retry_backoff
+        self.max_connections = max_connections or settings.N8N_MAX_CONNECTIONS
+        self.failure_threshold = failure_threshold or settings.N8N_CIRCUIT_FAILURE_THRESHOLD
+        self.reset_timeout = settings.N8N_CIRCUIT_RESET_TIMEOUT if reset_timeout is None else reset_timeout
+
+        self.session = requests.Session()
+        # max_retries=0: los reintentos (con jitter y breaker) los hace request()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.max_connections, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['User-Agent'] = 'iacol-n8n-client'
+        self._hosts = {}
+        self._hosts_lock = threading.Lock()
+
+    def _host(self, url):
+        """(semáforo de concurrencia, circuit breaker) del host de `url`"""
+        netloc = urlsplit(url).netloc
+        with self._hosts_lock:
+            if netloc not in self._hosts:
+                self._hosts[netloc] = (
+                    threading.BoundedSemaphore(self.max_connections),
+                    CircuitBreaker(self.failure_threshold, self.reset_timeout),
+                )
+            return self._hosts[netloc]
+
+    def circuit(self, url):
+        return self._host(url)[1]
+
+    def _backoff(self, attempt):
+        # Jitter completo: reparte los reintentos de muchos clientes en lugar de sincronizarlos
+        return random.uniform(0, min(MAX_BACKOFF_SECONDS, self.retry_backoff * 2 ** attempt))
+
+    def _send(self, method, url, **kwargs):
+        semaphore, _ = self._host(url)
+        if not semaphore.acquire(timeout=self.timeout[0]):
+            # Saturación local, no un fallo de n8n: no cuenta para el breaker
+            raise N8NUnavailable(f"{self.max_connections} peticiones en curso a {urlsplit(url).netloc}")
+        try:
+            return self.session.request(method, url, timeout=self.timeout, **kwargs)
+        finally:
+            semaphore.release()
+
+    def request(self, method, url, **kwargs):
+        """Petición con reintentos y circuit breaker; devuelve la respuesta 2xx/3xx"""
+        breaker = self.circuit(url)
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(self._backoff(attempt - 1))
+            if not breaker.allow():
+                raise N8NUnavailable(f"Circuito abierto para {urlsplit(url).netloc}")
+            try:
+                response = self._send(method, url, **kwargs)
+            except requests.ConnectionError as e:
+                breaker.record_failure()
+                if not (idempotent or _not_sent(e)):
+                    raise N8NOutcomeUnknown(f"Conexión cortada tras enviar {method} {url}: {e}") from e
+                last_error = e
+                continue
+            except requests.Timeout as e:
+                breaker.record_failure()
+                if not idempotent:
+                    raise N8NOutcomeUnknown(f"n8n no respondió a tiempo ({method} {url})") from e
+                last_error = e
+                continue
+            if response.status_code in RETRY_STATUSES:
+                breaker.record_failure()
+                if not idempotent and response.status_code in AMBIGUOUS_STATUSES:
+                    raise N8NOutcomeUnknown(f"n8n respondió {response.status_code} a {method} {url}")
+                last_error = N8NRequestError(response.status_code, response.text)
+                continue
+            breaker.record_success()
+            if response.status_code >= 400:
+                raise N8NRequestError(response.status_code, response.text)
+            return response
+        raise N8NUnavailable(f"n8n no disponible tras {self.max_retries + 1} intentos: {last_error}") from last_error
+
+    @staticmethod
+    def _body(response):
+        if not response.content:
+            return None
+        if 'json' in response.headers.get('Content-Type', ''):
+            return response.json()
+        return response.text
+
+    def webhook_url_for(self, workflow_id, test=False):
+        # n8n sirve los webhooks de prueba (editor abierto) en /webhook-test/
+        base = self.webhook_url.replace('/webhook/', '/webhook-test/') if test else self.webhook_url
+        return urljoin(base if base.endswith('/') else base + '/', workflow_id)
+
+    def trigger_workflow(self, workflow_id, payload=None, test=False):
+        """POST al webhook del workflow; devuelve la respuesta de n8n (JSON o texto)"""
+        response = self.request('POST', self.webhook_url_for(workflow_id, test), json=payload or {})
+        return self._body(response)
+
+    def get_execution(self, execution_id, include_data=False):
+        url = urljoin(self.api_url if self.api_url.endswith('/') else self.api_url + '/', f'executions/{execution_id}')
+        headers = {'X-N8N-API-KEY': self.api_key} if self.api_key else {}
+        response = self.request('GET', url, params={'includeData': str(include_data).lower()}, headers=headers)
+        return response.json()
+
+    def wait_for_execution(self, execution_id, timeout=60, poll_interval=1.0, include_data=False):
+        """Consulta la ejecución hasta que termina; N8NError si no termina en `timeout` segundos"""
+        deadline = time.monotonic() + timeout
+        while True:
+            execution = self.get_execution(execution_id, include_data)
+            if execution.get('finished') or execution.get('status') in FINISHED_STATUSES:
+                return execution
+            if time.monotonic() + poll_interval > deadline:
+                raise N8NError(f"La ejecución {execution_id} no terminó en {timeout}s")
+            time.sleep(poll_interval)
+
+    # Versiones async: el trabajo bloqueante va a un hilo del executor, no al hilo de Django
+
+    async def atrigger_workflow(self, workflow_id, payload=None, test=False):
+        return await sync_to_async(self.trigger_workflow, thread_sensitive=False)(workflow_id, payload, test)
+
+    async def aget_execution(self, execution_id, include_data=False):
+        return await sync_to_async(self.get_execution, thread_sensitive=False)(execution_id, include_data)
+
+    async def await_execution(self, execution_id, timeout=60, poll_interval=1.0, include_data=False):
+        return await sync_to_async(self.wait_for_execution, thread_sensitive=False)(
+            execution_id, timeout, poll_interval, include_data,
+        )
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Cliente compartido del proceso (se crea al primer uso, después del fork de los workers)"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = N8NClient()
+    return _client
+
+
+def reset_client():
+    """Cierra el cliente compartido; el siguiente get_client() lee de nuevo la configuración"""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+
+
+def dispatch_workflow(workflow_id, payload=None):
+    """
+    Dispara el workflow desde un worker de Celery sin esperar la respuesta.
+    Devuelve False si no se pudo encolar (broker no disponible).
+    """
+    from .tasks import trigger_n8n_workflow
+    try:
+        trigger_n8n_workflow.apply_async((workflow_id, payload), retry=False)
+    except Exception as e:
+        logger.warning("Broker no disponible (%s); workflow %s no disparado", e, workflow_id)
+        return False
+    return True
@@ -0,0 +1,74 @@
+"""
+Payloads de AgentUsageLog fuera de la tabla de logs.
+
+n8n envía la conversación completa en input_data/output_data; guardada en línea
+hace crecer el heap y el TOAST de la tabla más consultada. Si el JSON de ambos
+campos supera USAGE_LOG_INLINE_PAYLOAD_BYTES, en la fila solo queda un resumen
+(claves, tamaño y un extracto) y el documento completo se guarda comprimido en
+AgentUsageLogPayload, que solo se lee al abrir una ejecución concreta.
+
+Códecs: 'br' (Brotli, ya requerido por la compresión de respuestas) o 'gzip'
+de la biblioteca estándar; cada fila guarda el suyo, así que cambiar
+USAGE_LOG_PAYLOAD_CODEC no afecta a los payloads existentes.
+"""
+import gzip
+import json
+
+from django.conf import settings
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+OFFLOADED_KEY = '_offloaded'
+PREVIEW_CHARS = 200
+
+
+def _compress_br(data):
+    return brotli.compress(data, quality=settings.USAGE_LOG_PAYLOAD_BROTLI_QUALITY)
+
+
+CODECS = {
+    'gzip': (lambda data: gzip.compress(data, compresslevel=6), gzip.decompress),
+    'br': (_compress_br, lambda data: brotli.decompress(data)),
+}
+
+
+def default_codec():
+    codec = settings.USAGE_LOG_PAYLOAD_CODEC
+    if codec == 'br' and brotli is None:
+        return 'gzip'
+    return codec
+
+
+def dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=str).encode()
+
+
+def compress_payload(input_data, output_data, codec=None):
+    """(códec, bytes comprimidos, tamaño sin comprimir) del documento con ambos campos"""
+    codec = codec or default_codec()
+    raw = dumps({'input_data': input_data, 'output_data': output_data})
+    return codec, CODECS[codec][0](raw), len(raw)
+
+
+def decompress_payload(codec, data):
+    """{'input_data': ..., 'output_data': ...}"""
+    return json.loads(CODECS[codec][1](bytes(data)))
+
+
+def summarize(value, size):
+    """Resumen que queda en línea en lugar del valor completo"""
+    summary = {OFFLOADED_KEY: True, 'bytes': size}
+    if isinstance(value, dict):
+        summary['keys'] = list(value)[:20]
+    preview = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, default=str)
+    summary['preview'] = preview[:PREVIEW_CHARS]
+    return summary
+
+
+def should_offload(input_data, output_data):
+    """(offload?, tamaño de input_data, tamaño de output_data) en bytes de JSON"""
+    input_size, output_size = len(dumps(input_data)), len(dumps(output_data))
+    return input_size + output_size > settings.USAGE_LOG_INLINE_PAYLOAD_BYTES, input_size, output_size
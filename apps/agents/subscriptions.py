@@ -0,0 +1,146 @@
+"""
+Ciclo de vida de UserSubscription en lote (tarea process_subscription_lifecycle).
+
+En cada ejecución:
+
+1. Renovación: las activas con auto_renew, agente activo y end_date dentro de
+   SUBSCRIPTION_RENEWAL_LEAD_HOURS se extienden SUBSCRIPTION_RENEWAL_DAYS
+   (desde end_date, o desde ahora si ya había vencido).
+2. Vencimiento: las activas con end_date pasado pasan a 'expired'.
+
+Las candidatas se buscan por el índice (status, end_date) en lotes de
+SUBSCRIPTION_BATCH_SIZE y se actualizan con un UPDATE ... WHERE id IN (...)
+por lote; una fila actualizada sale del filtro, así que el siguiente lote
+empieza donde acabó el anterior. Los emails se encolan con send_email_task
+tras el commit de cada lote y se invalida el cache de estadísticas del
+dashboard de cada (usuario, agente) afectado.
+
+No hay cobro automático: la renovación solo extiende el periodo.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from iacol_project.celery import send_email_task
+
+from .models import UserSubscription
+
+logger = logging.getLogger(__name__)
+
+BATCH_FIELDS = (
+    'id', 'user_id', 'agent_id', 'end_date', 'user__email', 'user__first_name', 'user__username', 'agent__name',
+)
+
+
+def dashboard_stats_cache_key(user_id, agent_id):
+    return f'agent_dashboard_stats_{user_id}_{agent_id}'
+
+
+def invalidate_access_caches(rows):
+    cache.delete_many([dashboard_stats_cache_key(row['user_id'], row['agent_id']) for row in rows])
+
+
+def _queue_emails(rows, build_message):
+    for row in rows:
+        if not row['user__email']:
+            continue
+        subject, message = build_message(row)
+        try:
+            send_email_task.delay(subject, message, [row['user__email']])
+        except Exception:
+            # Sin broker no se reintenta: el cambio de estado ya está hecho
+            logger.warning("No se pudo encolar el email de suscripción %s", row['id'], exc_info=True)
+
+
+def _after_commit(rows, build_message):
+    invalidate_access_caches(rows)
+    _queue_emails(rows, build_message)
+
+
+def _greeting(row):
+    return f"Hola {row['user__first_name'] or row['user__username']},"
+
+
+def renewal_email(row, new_end_date):
+    return (
+        f"Tu suscripción a {row['agent__name']} se ha renovado",
+        f"{_greeting(row)}\n\nTu suscripción al agente {row['agent__name']} se ha renovado automáticamente "
+        f"hasta el {timezone.localtime(new_end_date):%d/%m/%Y}.\n\nSi no deseas renovarla, desactiva la "
+        f"renovación automática desde tu panel.",
+    )
+
+
+def expiry_email(row):
+    return (
+        f"Tu suscripción a {row['agent__name']} ha vencido",
+        f"{_greeting(row)}\n\nTu suscripción al agente {row['agent__name']} ha vencido y el agente ya no está "
+        f"disponible en tu cuenta.\n\nPuedes volver a suscribirte desde el catálogo de agentes.",
+    )
+
+
+def _process_batches(candidates, apply, build_message, batch_size, max_batches):
+    """
+    Selecciona lotes de `candidates` (consulta ordenada por el índice), aplica
+    `apply(ids)` (UPDATE en bloque que saca las filas del filtro) y encola los
+    emails tras el commit. Devuelve el total de filas actualizadas.
+    """
+    processed = 0
+    for _ in range(max_batches):
+        with transaction.atomic():
+            # skip_locked: otra ejecución concurrente toma otras filas
+            rows = list(
+                candidates.select_for_update(skip_locked=True, of=('self',))
+                .order_by('end_date', 'id').values(*BATCH_FIELDS)[:batch_size]
+            )
+            if not rows:
+                break
+            apply([row['id'] for row in rows])
+            transaction.on_commit(lambda rows=rows: _after_commit(rows, build_message))
+        processed += len(rows)
+        if len(rows) < batch_size:
+            break
+    return processed
+
+
+def renew_due_subscriptions(now=None, batch_size=None, max_batches=None):
+    now = now or timezone.now()
+    period = timedelta(days=settings.SUBSCRIPTION_RENEWAL_DAYS)
+    candidates = UserSubscription.objects.filter(
+        status='active', end_date__lte=now + timedelta(hours=settings.SUBSCRIPTION_RENEWAL_LEAD_HOURS),
+        auto_renew=True, agent__is_active=True,
+    )
+
+    def apply(ids):
+        UserSubscription.objects.filter(id__in=ids).update(end_date=Greatest(F('end_date'), Value(now)) + period)
+
+    def build_message(row):
+        return renewal_email(row, max(row['end_date'], now) + period)
+
+    return _process_batches(candidates, apply, build_message, batch_size or settings.SUBSCRIPTION_BATCH_SIZE,
+                            max_batches or settings.SUBSCRIPTION_MAX_BATCHES)
+
+
+def expire_due_subscriptions(now=None, batch_size=None, max_batches=None):
+    now = now or timezone.now()
+    candidates = UserSubscription.objects.filter(status='active', end_date__lte=now)
+
+    def apply(ids):
+        UserSubscription.objects.filter(id__in=ids).update(status='expired')
+
+    return _process_batches(candidates, apply, expiry_email, batch_size or settings.SUBSCRIPTION_BATCH_SIZE,
+                            max_batches or settings.SUBSCRIPTION_MAX_BATCHES)
+
+
+def process_subscription_lifecycle(now=None):
+    """Renueva y luego vence; devuelve {'renewed': n, 'expired': n}"""
+    now = now or timezone.now()
+    result = {'renewed': renew_due_subscriptions(now), 'expired': expire_due_subscriptions(now)}
+    if any(result.values()):
+        logger.info("Suscripciones renovadas: %(renewed)d, vencidas: %(expired)d", result)
+    return result
@@ -0,0 +1,48 @@
+import logging
+
+from celery import shared_task
+from django.core.cache import cache
+
+from .archive import archive_usage_logs
+from .n8n import N8NOutcomeUnknown, N8NRequestError, N8NUnavailable, get_client
+from .subscriptions import process_subscription_lifecycle
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_LOCK_KEY = 'agents:archive_usage_logs:lock'
+ARCHIVE_LOCK_TIMEOUT = 6 * 60 * 60
+
+
+@shared_task(ignore_result=True)
+def archive_old_usage_logs():
+    """Tarea diaria (CELERY_BEAT_SCHEDULE): archiva y borra los logs fuera de retención"""
+    # Una sola ejecución a la vez aunque beat la encole de nuevo mientras sigue en curso
+    if not cache.add(ARCHIVE_LOCK_KEY, 1, ARCHIVE_LOCK_TIMEOUT):
+        logger.info("Archivado de logs de uso ya en curso; se omite esta ejecución")
+        return
+    try:
+        archive_usage_logs()
+    finally:
+        cache.delete(ARCHIVE_LOCK_KEY)
+
+
+@shared_task(ignore_result=True)
+def process_subscriptions():
+    """Tarea periódica (CELERY_BEAT_SCHEDULE): renueva y vence suscripciones en lote"""
+    process_subscription_lifecycle()
+
+
+@shared_task(bind=True, ignore_result=True, max_retries=3, default_retry_delay=30)
+def trigger_n8n_workflow(self, workflow_id, payload=None):
+    """Dispara un workflow de n8n sin que nadie espere la respuesta (n8n.dispatch_workflow)"""
+    try:
+        get_client().trigger_workflow(workflow_id, payload)
+    except N8NUnavailable as e:
+        # La petición no llegó a n8n y el cliente ya reintentó; se vuelve a intentar
+        # cuando el circuito haya podido cerrarse
+        raise self.retry(exc=e)
+    except N8NOutcomeUnknown as e:
+        # Reintentar podría ejecutar el workflow dos veces
+        logger.error("n8n no confirmó el workflow %s; no se reintenta: %s", workflow_id, e)
+    except N8NRequestError as e:
+        logger.warning("n8n rechazó el workflow %s: %s", workflow_id, e)
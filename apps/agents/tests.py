@@ -1,8 +1,84 @@
-from django.test import TestCase
-from django.test.utils import override_settings
+import asyncio
+import csv
+import gzip
+import json
+import logging
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+import brotli
+import psycopg
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.exceptions import SynchronousOnlyOperation
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.paginator import Paginator
 from django.db import connection
-from django.test import Client
-from .models import Agent, AgentCategory
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django_redis.cache import RedisCache
+from prometheus_client import REGISTRY
+from psycopg_pool import PoolTimeout
+
+from iacol_project.benchmark import SCENARIOS
+from iacol_project.cache import ResilientRedisCache
+from iacol_project.compression import CompressionMiddleware, variant_cache
+from iacol_project.health import probe_cache, probe_database
+from iacol_project.logging_utils import JSONFormatter, QueueListenerHandler, SamplingFilter
+from iacol_project.page_cache import purge_page_cache
+from iacol_project.pagination import EstimatedCountPaginator
+from iacol_project.postgresql_pool.base import BROKEN_POOL_TIMEOUT, DjangoConnectionPool
+from iacol_project.querybudget import QueryBudgetTestMixin, QueryRecorder
+from iacol_project.ratelimit import TokenBucketLimiter, get_client_ip, limiter
+from iacol_project.sessions import REFRESHED_AT_KEY
+from iacol_project.startup import parse_importtime
+
+from .admin import AgentUsageLogAdmin
+from .archive import archive_usage_logs, archived_usage_stats, historical_usage_stats
+from .events import SUBSCRIBER_QUEUE_SIZE, ExecutionHub, SubscriptionClosed, execution_channel, stream_execution_events
+from .exports import aiter_server_side
+from .models import (
+    AdvancedCatalogModel, AdvancedCatalogProduct, Agent, AgentCategory, AgentConfiguration, AgentUsageLog,
+    AgentUsageLogPayload, Brand, Product, ProductBrand, ProductCategory, Provider, ProviderCategory, UserSubscription,
+)
+from .n8n import N8NClient, N8NOutcomeUnknown, N8NRequestError, N8NUnavailable, dispatch_workflow, reset_client
+from .subscriptions import dashboard_stats_cache_key, process_subscription_lifecycle
+from .tasks import trigger_n8n_workflow
+
+
+class AgentFixtureMixin:
+    """Creates self.user, self.category and self.agent named after `fixture_name`"""
+    fixture_name = None
+    fixture_superuser = False
+    fixture_agent_options = {}
+
+    def setUp(self):
+        super().setUp()
+        name = self.fixture_name
+        create_user = User.objects.create_superuser if self.fixture_superuser else User.objects.create_user
+        self.user = create_user(name, f'{name}@example.com', 'pass')
+        self.category = AgentCategory.objects.create(name=name.title(), description=name.title())
+        self.agent = Agent.objects.create(
+            name=f"Agente {name.title()}", description="Desc", category=self.category, price=100,
+            n8n_workflow_id=name, **self.fixture_agent_options,
+        )
 
 
 class QueryPerformanceTest(TestCase):
@@ -64,8 +140,6 @@ class CacheTest(TestCase):
 
     def test_agent_list_caching(self):
         """Test that agent list is properly cached"""
-        from django.core.cache import cache
-
         # Clear cache
         cache.clear()
 
@@ -76,4 +150,1281 @@ class CacheTest(TestCase):
         # Check cache was populated
         cache_key = 'agent_list_True'  # For admin user
         cached_data = cache.get(cache_key)
-        self.assertIsNotNone(cached_data, "Agent list not cached")
\ No newline at end of file
+        self.assertIsNotNone(cached_data, "Agent list not cached")
+
+
+class RateLimitTest(TestCase):
+    """Test the token bucket rate limiter (in-process fallback without Redis)"""
+
+    def setUp(self):
+        limiter.reset()
+        self.addCleanup(limiter.reset)
+
+    def test_solutions_rate_limit_headers_and_429(self):
+        for remaining in range(9, -1, -1):
+            response = self.client.get('/solutions/', HTTP_X_REAL_IP='203.0.113.7')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['X-RateLimit-Limit'], '10')
+            self.assertEqual(response['X-RateLimit-Remaining'], str(remaining))
+
+        response = self.client.get('/solutions/', HTTP_X_REAL_IP='203.0.113.7')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+
+        # Otra IP tiene su propio bucket
+        response = self.client.get('/solutions/', HTTP_X_REAL_IP='203.0.113.8')
+        self.assertEqual(response.status_code, 200)
+
+    def test_local_fallback_when_redis_fails(self):
+        limiter = TokenBucketLimiter()
+        with mock.patch.object(limiter, '_redis_enabled', return_value=True), \
+                mock.patch.object(limiter, '_get_script', side_effect=ConnectionError('down')):
+            first = limiter.consume('test:fallback', capacity=2, period=60)
+            limiter.consume('test:fallback', capacity=2, period=60)
+            third = limiter.consume('test:fallback', capacity=2, period=60)
+
+        self.assertTrue(first.allowed)
+        self.assertEqual(first.remaining, 1)
+        self.assertFalse(third.allowed)
+        self.assertEqual(third.retry_after, 30)
+
+    def test_real_ip_header_only_from_trusted_proxies(self):
+        factory = RequestFactory()
+        proxied = factory.get('/', REMOTE_ADDR='172.18.0.5', HTTP_X_REAL_IP='203.0.113.7')
+        self.assertEqual(get_client_ip(proxied), '203.0.113.7')
+        direct = factory.get('/', REMOTE_ADDR='198.51.100.4', HTTP_X_REAL_IP='203.0.113.7')
+        self.assertEqual(get_client_ip(direct), '198.51.100.4')
+        with override_settings(RATELIMIT_TRUSTED_PROXIES=[]):
+            self.assertEqual(get_client_ip(proxied), '172.18.0.5')
+
+    def test_local_buckets_evict_least_recently_used(self):
+        limiter = TokenBucketLimiter()
+        with mock.patch('iacol_project.ratelimit.LOCAL_MAX_BUCKETS', 2):
+            limiter._consume_local('a', 5, 1 / 60, 1)
+            limiter._consume_local('b', 5, 1 / 60, 1)
+            limiter._consume_local('a', 5, 1 / 60, 1)
+            limiter._consume_local('c', 5, 1 / 60, 1)
+        self.assertEqual(list(limiter._local_buckets), ['a', 'c'])
+        self.assertEqual(int(limiter._local_buckets['a'][0]), 3)
+
+
+class ResilientCacheTest(TestCase):
+    """Test the Redis cache backend's local fallback and reconnection"""
+
+    def make_cache(self):
+        return ResilientRedisCache('redis://127.0.0.1:1/0', {
+            'OPTIONS': {'SOCKET_CONNECT_TIMEOUT': 0.1, 'FALLBACK_RETRY_INTERVAL': 60},
+        })
+
+    def test_falls_back_to_local_cache_when_redis_is_down(self):
+        cache = self.make_cache()
+        cache.set('agent_list', ['a', 'b'])
+
+        self.assertTrue(cache.degraded)
+        self.assertEqual(cache.get('agent_list'), ['a', 'b'])
+        cache.delete('agent_list')
+        self.assertIsNone(cache.get('agent_list'))
+
+    def test_reconnect_invalidates_keys_written_during_outage(self):
+        cache = self.make_cache()
+        cache.set('stats', {'total': 1})
+        cache._down_until = 1  # Intervalo de reintento vencido
+
+        with mock.patch.object(RedisCache, 'delete_many') as delete_many, \
+                mock.patch.object(RedisCache, 'get', return_value='from-redis') as redis_get:
+            self.assertEqual(cache.get('stats'), 'from-redis')
+
+        delete_many.assert_called_once_with(['stats'], version=None)
+        redis_get.assert_called_once()
+        self.assertFalse(cache.degraded)
+
+    def test_reconnect_after_dirty_overflow_invalidates_whole_cache(self):
+        cache = ResilientRedisCache('redis://127.0.0.1:1/0', {
+            'OPTIONS': {'SOCKET_CONNECT_TIMEOUT': 0.1, 'FALLBACK_RETRY_INTERVAL': 60, 'FALLBACK_MAX_ENTRIES': 2},
+        })
+        cache.set_many({'a': 1, 'b': 2, 'c': 3})
+        self.assertTrue(cache._dirty_overflow)
+        cache._down_until = 1
+
+        redis = mock.Mock()
+        redis.scan_iter.return_value = iter([b':1:a', b':1:b', b':1:c', b':1:other'])
+        with mock.patch.object(cache.client, 'get_client', return_value=redis), \
+                mock.patch.object(RedisCache, 'delete_many') as delete_many, \
+                mock.patch.object(RedisCache, 'get', return_value=None):
+            cache.get('a')
+
+        redis.scan_iter.assert_called_once_with(match=':*:*', count=1000)
+        redis.delete.assert_called_once_with(b':1:a', b':1:b', b':1:c', b':1:other')
+        delete_many.assert_not_called()
+        self.assertFalse(cache._dirty_overflow)
+        self.assertFalse(cache.degraded)
+
+    async def test_aset_sends_relative_ttl(self):
+        class RecordingRedis:
+            """Cliente redis.asyncio mínimo que guarda el vencimiento de cada clave (PTTL)"""
+            def __init__(self):
+                self.expires = {}
+
+            async def set(self, key, value, px=None):
+                self.expires[key] = None if px is None else time.monotonic() + px / 1000
+
+            async def delete(self, *keys):
+                for key in keys:
+                    self.expires.pop(key, None)
+
+            def pttl(self, key):
+                expires = self.expires.get(key)
+                return -1 if expires is None else int((expires - time.monotonic()) * 1000)
+
+        cache = self.make_cache()
+        redis = RecordingRedis()
+        with mock.patch.object(cache, 'get_async_client', return_value=redis):
+            await cache.aset('agents', ['a'], 300)
+            await cache.aset('default', ['a'])
+            await cache.aset('forever', ['a'], None)
+            await cache.aset('agents', ['a'], 0)
+            key = cache.client.make_key
+
+            self.assertNotIn(key('agents'), redis.expires)
+            self.assertAlmostEqual(redis.pttl(key('default')), cache.default_timeout * 1000, delta=1000)
+            self.assertEqual(redis.pttl(key('forever')), -1)
+            await cache.aset('agents', ['a'], 300)
+            self.assertAlmostEqual(redis.pttl(key('agents')), 300000, delta=1000)
+
+
+class ConnectionPoolTest(TestCase):
+    """Test the psycopg_pool backend (iacol_project/postgresql_pool)"""
+
+    def test_pool_fails_fast_while_postgres_refuses_connections(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]  # puerto sin servidor: conexión rechazada
+        pool = DjangoConnectionPool(f'host=127.0.0.1 port={port} connect_timeout=1', min_size=1, timeout=10,
+                                    reconnect_timeout=60, open=False)
+        pool.open(wait=False)
+        self.addCleanup(pool.close)
+
+        with self.assertRaises(PoolTimeout):
+            pool.getconn(timeout=0.5)
+        self.assertTrue(pool.broken)
+        started = time.monotonic()
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+        self.assertLess(time.monotonic() - started, BROKEN_POOL_TIMEOUT + 1)
+
+
+class CompressionMiddlewareTest(TestCase):
+    """Test the response compression policy"""
+
+    def compress(self, response, accept_encoding='br, gzip'):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def setUp(self):
+        variant_cache.clear()
+
+    def test_compresses_large_text_with_brotli_or_gzip(self):
+        body = b'<p>Agentes IA</p>' * 200
+        response = self.compress(HttpResponse(body))
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), body)
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+        response = self.compress(HttpResponse(body), accept_encoding='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), body)
+
+    def test_skips_small_bodies_and_compressed_types(self):
+        self.assertFalse(self.compress(HttpResponse(b'ok')).has_header('Content-Encoding'))
+        image = HttpResponse(b'\x00' * 4096, content_type='image/webp')
+        self.assertFalse(self.compress(image).has_header('Content-Encoding'))
+        events = HttpResponse(b'data: x\n\n' * 500, content_type='text/event-stream')
+        self.assertFalse(self.compress(events).has_header('Content-Encoding'))
+
+    def test_reuses_compressed_variant_of_cacheable_pages(self):
+        body = b'<p>Landing</p>' * 300
+        responses = []
+        with mock.patch('iacol_project.compression.brotli.compress', return_value=b'compressed') as compress:
+            for _ in range(2):
+                response = HttpResponse(body)
+                patch_cache_control(response, public=True, max_age=600)
+                responses.append(self.compress(response))
+            self.compress(HttpResponse(body))  # No cacheable: se comprime de nuevo
+
+        self.assertEqual(compress.call_count, 2)
+        self.assertEqual(responses[1].content, b'compressed')
+
+
+@override_settings(PAGE_CACHE_ENABLED=True)
+class AnonymousPageCacheTest(TestCase):
+    """Test the anonymous full-page cache of the landing pages"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_pages_are_cached_per_language(self):
+        self.assertEqual(self.client.get('/contact/')['X-Page-Cache'], 'MISS')
+        response = self.client.get('/contact/?utm_source=ads')
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+        self.assertIn('public', response['Cache-Control'])
+        self.assertEqual(self.client.get('/en/contact/')['X-Page-Cache'], 'MISS')
+
+        # Cualquier otro parámetro puede cambiar la página: no se usa el cache
+        self.assertFalse(self.client.get('/contact/?page=2').has_header('X-Page-Cache'))
+
+    def test_authenticated_users_bypass_cache(self):
+        self.client.get('/contact/')
+        self.client.force_login(User.objects.create_user('visitor', password='x'))
+        self.assertFalse(self.client.get('/contact/').has_header('X-Page-Cache'))
+
+    def test_purge(self):
+        self.client.get('/contact/')
+        self.client.get('/en/contact/')
+
+        purge_page_cache(['contact'])
+        self.assertEqual(self.client.get('/contact/')['X-Page-Cache'], 'MISS')
+        self.assertEqual(self.client.get('/en/contact/')['X-Page-Cache'], 'MISS')
+
+        purge_page_cache()
+        self.assertEqual(self.client.get('/contact/')['X-Page-Cache'], 'MISS')
+
+    def test_bulk_agent_changes_purge_solutions(self):
+        category = AgentCategory.objects.create(name="Cache", description="Cache")
+        Agent.objects.create(name="Agente Cache", description="Desc", category=category, price=100,
+                             n8n_workflow_id="cache")
+        agents = Agent.objects.filter(category=category)
+        with mock.patch('iacol_project.page_cache.purge_page_cache') as purge:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(agents.update(show_in_solutions=False), 1)
+                Agent.objects.filter(pk=0).update(is_active=False)
+            purge.assert_called_once_with(['solutions'])
+            with self.captureOnCommitCallbacks(execute=True):
+                agents.delete()
+            self.assertEqual(purge.call_count, 2)
+
+    def test_language_switcher_does_not_need_csrf_token(self):
+        response = Client(enforce_csrf_checks=True).post('/i18n/setlang/', {'language': 'en', 'next': '/contact/'})
+        self.assertEqual(response.status_code, 302)
+
+
+class MetricsTest(TestCase):
+    """Test the request metrics middleware and the /metrics endpoint"""
+
+    def test_records_request_queries_and_exports(self):
+        def sample(name, labels):
+            return REGISTRY.get_sample_value(name, labels) or 0
+
+        view = {'view': 'agents:agent_list'}
+        requests_before = sample('iacol_http_requests_total', {**view, 'method': 'GET', 'status': '200'})
+        queries_before = sample('iacol_db_queries_per_request_sum', view)
+
+        self.client.force_login(User.objects.create_user('metrics', password='x'))
+        self.assertEqual(self.client.get('/agents/').status_code, 200)
+
+        self.assertEqual(sample('iacol_http_requests_total', {**view, 'method': 'GET', 'status': '200'}), requests_before + 1)
+        self.assertGreater(sample('iacol_db_queries_per_request_sum', view), queries_before)
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'iacol_http_request_duration_seconds_bucket')
+
+    def test_import_creates_missing_multiprocess_dir(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            multiproc_dir = os.path.join(tmp, 'prometheus')
+            # Proceso nuevo: los gauges leen la variable al crearse (importar metrics)
+            result = subprocess.run(
+                [sys.executable, '-c', 'import iacol_project.metrics'], capture_output=True, text=True,
+                cwd=settings.BASE_DIR, env={**os.environ, 'PROMETHEUS_MULTIPROC_DIR': multiproc_dir},
+            )
+            self.assertEqual(result.returncode, 0, result.stderr)
+            self.assertTrue(any(name.startswith('gauge_livesum_') for name in os.listdir(multiproc_dir)))
+
+    def test_metrics_endpoint_is_not_public(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='8.8.8.8').status_code, 403)
+
+        with override_settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+
+class HealthCheckTest(TestCase):
+    """Test the liveness/readiness endpoints served by HealthCheckMiddleware"""
+
+    def setUp(self):
+        probe_cache.clear()
+        self.addCleanup(probe_cache.clear)
+
+    def test_liveness_skips_dependencies(self):
+        with mock.patch('iacol_project.health.probe_database') as probe:
+            for path in ('/health/', '/health/live/'):
+                response = self.client.get(path, HTTP_HOST='unknown.example')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()['status'], 'alive')
+        probe.assert_not_called()
+
+    def test_readiness_reports_checks_to_internal_clients(self):
+        response = self.client.get('/health/ready/')
+        self.assertEqual(response['Cache-Control'], 'no-store')
+        checks = response.json()['checks']
+        self.assertEqual(checks['database']['status'], 'ok')
+        # Redis no es crítico: caído solo degrada
+        self.assertIn(checks['redis']['status'], ('ok', 'degraded'))
+        self.assertNotEqual(response.status_code, 503)
+
+        self.assertNotIn('checks', self.client.get('/health/ready/', REMOTE_ADDR='8.8.8.8').json())
+
+    def test_critical_probe_failure_returns_503(self):
+        with mock.patch.dict('iacol_project.health.PROBES', {'database': mock.Mock(side_effect=OSError('refused'))}):
+            response = self.client.get('/health/ready/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['checks']['database']['status'], 'down')
+
+    def test_probe_results_are_cached(self):
+        probe = mock.Mock(return_value=('ok', {}))
+        with mock.patch.dict('iacol_project.health.PROBES', {'database': probe}, clear=True):
+            for _ in range(3):
+                self.assertEqual(self.client.get('/health/ready/').status_code, 200)
+        self.assertEqual(probe.call_count, 1)
+
+    def test_database_probe_bypasses_the_pool(self):
+        with mock.patch('iacol_project.postgresql_pool.base.DjangoConnectionPool.getconn',
+                        side_effect=PoolTimeout('agotado')) as getconn:
+            self.assertEqual(probe_database(), ('ok', {}))
+        getconn.assert_not_called()
+
+        with override_settings(HEALTH_PROBE_TIMEOUT=0.2), \
+                mock.patch('iacol_project.health.psycopg.connect', wraps=psycopg.connect) as connect:
+            probe_database()
+        self.assertEqual(connect.call_args.kwargs['connect_timeout'], 1)
+        self.assertIn('-c statement_timeout=200', connect.call_args.kwargs['options'])
+
+    def test_refresh_in_progress_serves_previous_result(self):
+        probe_cache._result, probe_cache._checked_at = {'status': 'ok', 'checks': {}}, 0.0
+        with probe_cache._lock:
+            result, age = probe_cache.get()
+        self.assertEqual(result['status'], 'ok')
+        self.assertGreater(age, 0)
+
+
+class QueryBudgetTest(AgentFixtureMixin, QueryBudgetTestMixin, TestCase):
+    """Test the per-view query budgets declared with @query_budget"""
+    fixture_name = 'budget'
+
+    def setUp(self):
+        super().setUp()
+        caches['template_fragments'].clear()
+        UserSubscription.objects.create(user=self.user, agent=self.agent, end_date=timezone.now() + timedelta(days=30))
+        config = AgentConfiguration.objects.create(
+            user=self.user, agent=self.agent,
+            enable_providers=True, enable_products=True, enable_advanced_catalog=True,
+        )
+        # Varias filas por listado para que un N+1 se note
+        for i in range(8):
+            provider_category = ProviderCategory.objects.create(name=f"Categoría {i}", agent_config=config)
+            provider = Provider.objects.create(
+                name=f"Proveedor {i}", phone="+573001234567", city="Bogotá",
+                category=provider_category, agent_config=config,
+            )
+            provider.brands.add(Brand.objects.create(name=f"Marca {i}", agent_config=config))
+            Product.objects.create(
+                title=f"Producto {i}", description="Desc", price=10, agent_config=config,
+                category=ProductCategory.objects.create(name=f"Categoría {i}", agent_config=config),
+                brand=ProductBrand.objects.create(name=f"Marca {i}", agent_config=config),
+            )
+            catalog_product = AdvancedCatalogProduct.objects.create(name=f"Catálogo {i}", agent_config=config)
+            AdvancedCatalogModel.objects.create(name=f"Modelo {i}", product=catalog_product, price=10)
+        self.client.force_login(self.user)
+
+    def test_agent_configure(self):
+        self.assertQueryBudget(f'/agents/{self.agent.id}/configure/')
+
+    def test_provider_category_list(self):
+        self.assertQueryBudget(f'/agents/{self.agent.id}/provider-categories/')
+
+    def test_dashboard_home(self):
+        self.assertQueryBudget('/dashboard/')
+
+    def test_agent_detail(self):
+        self.assertQueryBudget(f'/agents/{self.agent.id}/')
+
+    def test_detects_repeated_query_shapes(self):
+        with QueryRecorder() as recorder:
+            for agent_id in range(6):
+                list(Agent.objects.filter(pk=agent_id))
+        self.assertEqual(len(recorder.repeated_shapes(threshold=5)), 1)
+
+
+class CollectingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self.threads = set()
+
+    def emit(self, record):
+        self.records.append(record)
+        self.threads.add(threading.get_ident())
+
+
+class LoggingPipelineTest(TestCase):
+    """Handlers con cola, muestreo y formato JSON (iacol_project.logging_utils)"""
+
+    def make_record(self, name='apps.api.views', level=logging.INFO, exc_info=None):
+        return logging.LogRecord(name, level, __file__, 1, 'hola %s', ('mundo',), exc_info)
+
+    def test_json_formatter_is_structured(self):
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            record = self.make_record(level=logging.ERROR, exc_info=sys.exc_info())
+        record.user_id = 7
+        record.request = object()
+
+        entry = json.loads(JSONFormatter().format(record))
+        self.assertEqual(entry['message'], 'hola mundo')
+        self.assertEqual(entry['level'], 'ERROR')
+        self.assertEqual(entry['logger'], 'apps.api.views')
+        self.assertEqual(entry['user_id'], 7)
+        self.assertNotIn('request', entry)
+        self.assertIn('ValueError: boom', entry['exception'])
+
+    def test_sampling_only_affects_app_info(self):
+        sampler = SamplingFilter(rate=0, loggers=['apps.'])
+        self.assertFalse(sampler.filter(self.make_record()))
+        self.assertTrue(sampler.filter(self.make_record(level=logging.WARNING)))
+        self.assertTrue(sampler.filter(self.make_record(name='django.request')))
+
+        record = self.make_record()
+        self.assertTrue(SamplingFilter(rate=1).filter(record))
+        self.assertFalse(hasattr(record, 'sample_rate'))
+
+    def test_queue_handler_writes_in_listener_thread(self):
+        target = CollectingHandler()
+        target.name = 'test_collect'
+        handler = QueueListenerHandler(['test_collect'])
+
+        handler.handle(self.make_record())
+        handler.close()  # vacía la cola
+
+        self.assertEqual([record.getMessage() for record in target.records], ['hola mundo'])
+        self.assertNotIn(threading.get_ident(), target.threads)
+
+    def test_queue_handler_drops_instead_of_blocking(self):
+        target = CollectingHandler()
+        target.name = 'test_collect_full'
+        handler = QueueListenerHandler(['test_collect_full'], queue_size=1)
+        handler._closed = True  # sin listener que vacíe la cola
+
+        handler.handle(self.make_record())
+        handler.handle(self.make_record())
+        self.assertEqual(handler.dropped, 1)
+        handler.close()
+
+    def test_missing_target_is_a_configuration_error(self):
+        with self.assertRaises(ValueError):
+            QueueListenerHandler(['no_existe'])
+
+
+class LoadBenchmarkTest(TestCase):
+    """generate_load_data + run_benchmarks con un volumen mínimo"""
+
+    def test_generate_and_run_all_scenarios(self):
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            call_command('generate_load_data', users=5, agents=4, usage_logs=60, catalog_size=10,
+                         blog_posts=2, batch_size=25, stdout=StringIO())
+            self.assertEqual(AgentUsageLog.objects.count(), 60)
+
+            out = StringIO()
+            call_command('run_benchmarks', iterations=2, warmup=1, stdout=out)
+            results = json.loads(out.getvalue())
+
+            with CaptureQueriesContext(connection) as queries:
+                call_command('generate_load_data', flush=True, stdout=StringIO())
+
+        # Los logs se borran sin cargarlos: el colector haría SELECT de las filas completas
+        self.assertFalse([q['sql'] for q in queries.captured_queries
+                          if q['sql'].startswith('SELECT') and '"agents_agentusagelog"."execution_id"' in q['sql']])
+        self.assertFalse(AgentUsageLog.objects.exists())
+        self.assertEqual(set(results['scenarios']), set(SCENARIOS))
+        for name, result in results['scenarios'].items():
+            self.assertEqual(result['errors'], 0, name)
+            self.assertEqual(result['iterations'], 2)
+        self.assertEqual(results['meta']['dataset']['usage_logs'], 60)
+        # Los escenarios no dejan datos: los logs creados se limpian
+        self.assertEqual(AgentUsageLog.objects.count(), 0)
+
+
+class StartupProfileTest(TestCase):
+    """profile_startup: arranque en frío por proceso y atribución de imports por fase"""
+
+    def test_parse_importtime_groups_top_level_imports_by_phase(self):
+        stderr = "\n".join([
+            "import time: self [us] | cumulative | imported package",
+            "import time:        10 |         10 | encodings",
+            "#startup-phase setup",
+            "import time:       300 |        300 |   django.utils",
+            "import time:       200 |        500 | django",
+            "#startup-phase urlconf",
+            "import time:        50 |         80 | apps.agents.views",
+        ])
+        self.assertEqual(parse_importtime(stderr), {
+            'setup': [('django', 200, 500)],
+            'urlconf': [('apps.agents.views', 50, 80)],
+        })
+
+    def test_profile_and_compare(self):
+        out = StringIO()
+        call_command('profile_startup', processes=['celery'], repeat=1, top=3, stdout=out, stderr=StringIO())
+        results = json.loads(out.getvalue())
+        celery = results['processes']['celery']
+        self.assertEqual(set(celery['phases']), {'setup', 'celery_tasks'})
+        self.assertGreater(celery['total']['median_ms'], 0)
+        self.assertLessEqual(len(celery['slowest_imports']['setup']), 3)
+
+        # Una línea base mucho más rápida hace fallar --max-regression
+        celery['total']['median_ms'] = 1
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as baseline:
+            json.dump(results, baseline)
+            baseline.flush()
+            with self.assertRaises(CommandError):
+                call_command('profile_startup', processes=['celery'], repeat=1, top=3, compare=baseline.name,
+                             max_regression=50, stdout=StringIO(), stderr=StringIO())
+
+
+class AsyncViewsTest(AgentFixtureMixin, TestCase):
+    """Test the native async agent and API views"""
+    fixture_name = 'async'
+    fixture_agent_options = {'show_in_agents': True}
+
+    def setUp(self):
+        super().setUp()
+        limiter.reset()
+        cache.clear()
+
+    def test_agent_list_requires_login(self):
+        response = self.client.get('/agents/')
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('/accounts/login/', response['Location'])
+
+    def test_agent_list_and_detail(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/agents/')
+        self.assertContains(response, 'Agente Async')
+        self.assertIn('X-RateLimit-Remaining', response)
+
+        response = self.client.get(f'/agents/{self.agent.id}/')
+        self.assertContains(response, 'Agente Async')
+
+    def test_agent_card_fragment_is_versioned_by_updated_at(self):
+        caches['template_fragments'].clear()
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get('/agents/'), 'Agente Async')
+        self.assertTrue(caches['template_fragments']._cache)
+
+        self.agent.name = 'Agente Renombrado'
+        self.agent.save()
+        cache.clear()  # Listado de agentes cacheado en Redis
+        response = self.client.get('/agents/')
+        self.assertContains(response, 'Agente Renombrado')
+        self.assertNotContains(response, 'Agente Async')
+
+    def test_private_agent_detail_only_for_allowed_users(self):
+        self.agent.show_in_agents = False
+        self.agent.show_in_solutions = False
+        self.agent.save()
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(f'/agents/{self.agent.id}/').status_code, 404)
+
+        self.agent.allowed_users.add(self.user)
+        self.assertEqual(self.client.get(f'/agents/{self.agent.id}/').status_code, 200)
+
+    def test_log_execution_and_stats_api(self):
+        UserSubscription.objects.create(
+            user=self.user, agent=self.agent, status='active', end_date=timezone.now() + timedelta(days=30)
+        )
+        self.client.force_login(self.user)
+
+        for success in (True, False, True):
+            response = self.client.post('/api/log-execution/', {
+                'agent_id': self.agent.id, 'execution_id': 'exec', 'success': success,
+            }, content_type='application/json')
+            self.assertEqual(response.status_code, 201)
+
+        response = self.client.get(f'/api/agent-stats/{self.agent.id}/')
+        self.assertEqual(response.json()['total_executions'], 3)
+        self.assertEqual(response.json()['failed_executions'], 1)
+
+    def test_api_requires_authentication(self):
+        response = self.client.get(f'/api/agent-stats/{self.agent.id}/')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.client.get('/api/log-execution/').status_code, 405)
+
+
+class UsageLogPayloadTest(AgentFixtureMixin, TestCase):
+    """Test that large usage log payloads are stored compressed outside the log table"""
+    fixture_name = 'payload'
+
+    def setUp(self):
+        super().setUp()
+        self.conversation = {'messages': [{'role': 'user', 'content': 'Necesito una cotización de llantas'}] * 100}
+
+    def create_log(self, **kwargs):
+        return AgentUsageLog.objects.create_log(
+            user=self.user, agent=self.agent, execution_id='exec', execution_time=1.0, **kwargs
+        )
+
+    def test_small_payload_stays_inline(self):
+        log = self.create_log(input_data={'message': 'hola'}, output_data={'response': 'hola'})
+        log.refresh_from_db()
+        self.assertFalse(log.payload_offloaded)
+        self.assertEqual(log.input_data, {'message': 'hola'})
+        self.assertFalse(AgentUsageLogPayload.objects.exists())
+
+    def test_large_payload_is_compressed_and_loaded_lazily(self):
+        log_id = self.create_log(input_data=self.conversation, output_data={'response': 'ok'}).id
+
+        log = AgentUsageLog.objects.get(id=log_id)
+        self.assertTrue(log.payload_offloaded)
+        self.assertTrue(log.input_data['_offloaded'])
+        self.assertEqual(log.input_data['keys'], ['messages'])
+        stored = AgentUsageLogPayload.objects.get(log_id=log_id)
+        self.assertLess(len(stored.data), stored.raw_size / 10)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(log.full_payload['input_data'], self.conversation)
+            self.assertEqual(log.full_payload['output_data'], {'response': 'ok'})
+
+        self.client.force_login(User.objects.create_superuser('payload-admin', 'admin@example.com', 'pass'))
+        response = self.client.get(f'/admin/agents/agentusagelog/{log_id}/change/')
+        self.assertContains(response, 'Necesito una cotización de llantas')
+
+    def test_gzip_codec_round_trip(self):
+        with override_settings(USAGE_LOG_PAYLOAD_CODEC='gzip'):
+            log_id = self.create_log(input_data=self.conversation).id
+        self.assertEqual(self.agent.agentusagelog_set.get().payload.codec, 'gzip')
+        self.assertEqual(AgentUsageLog.objects.get(id=log_id).full_payload['input_data'], self.conversation)
+
+    def test_offload_command_moves_existing_payloads(self):
+        log = AgentUsageLog.objects.create(
+            user=self.user, agent=self.agent, execution_id='legacy', execution_time=1.0, input_data=self.conversation,
+        )
+        call_command('offload_usage_payloads', stdout=StringIO())
+        call_command('offload_usage_payloads', stdout=StringIO())  # idempotente
+
+        log = AgentUsageLog.objects.get(id=log.id)
+        self.assertTrue(log.payload_offloaded)
+        self.assertEqual(log.full_payload['input_data'], self.conversation)
+
+
+class UsageLogArchiveTest(AgentFixtureMixin, TestCase):
+    """Test archiving old usage logs to monthly JSONL files and stats over the archive"""
+    fixture_name = 'archive'
+
+    def setUp(self):
+        super().setUp()
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        settings_override = override_settings(USAGE_LOG_ARCHIVE_DIR=archive_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.archive_dir = archive_dir.name
+
+        self.conversation = {'messages': [{'role': 'user', 'content': 'Factura de marzo'}] * 200}
+        dates = [
+            datetime(2025, 3, 5, tzinfo=dt_timezone.utc),
+            datetime(2025, 3, 20, tzinfo=dt_timezone.utc),
+            datetime(2025, 4, 2, tzinfo=dt_timezone.utc),
+        ]
+        for i, created_at in enumerate(dates):
+            log = AgentUsageLog.objects.create_log(
+                user=self.user, agent=self.agent, execution_id=f'old-{i}', execution_time=2.0, success=i != 1,
+                input_data=self.conversation if i == 0 else {'message': 'hola'},
+            )
+            AgentUsageLog.objects.filter(id=log.id).update(created_at=created_at)
+        self.recent = AgentUsageLog.objects.create_log(
+            user=self.user, agent=self.agent, execution_id='recent', execution_time=1.0,
+        )
+
+    def test_archives_old_logs_by_month_and_deletes_them(self):
+        self.assertEqual(archive_usage_logs(retention_days=30, batch_size=2), 3)
+        self.assertEqual(list(AgentUsageLog.objects.values_list('id', flat=True)), [self.recent.id])
+        self.assertFalse(AgentUsageLogPayload.objects.exists())
+        self.assertEqual(sorted(os.listdir(self.archive_dir)), ['2025-03', '2025-04'])
+
+        march = os.path.join(self.archive_dir, '2025-03')
+        rows = []
+        for name in sorted(os.listdir(march)):
+            with gzip.open(os.path.join(march, name), 'rt') as lines:
+                rows.extend(json.loads(line) for line in lines)
+        self.assertEqual([row['execution_id'] for row in rows], ['old-0', 'old-1'])
+        # El payload comprimido fuera de la tabla se archiva completo
+        self.assertEqual(rows[0]['input_data'], self.conversation)
+        self.assertEqual(rows[0]['username'], 'archive')
+
+    def test_stats_from_archive_and_live_table(self):
+        archive_usage_logs(retention_days=30)
+        # Un lote exportado dos veces (fallo entre escritura y borrado) no se cuenta dos veces
+        part = next(Path(self.archive_dir, '2025-03').glob('part-*'))
+        shutil.copy(part, part.with_name('part-000000000000-999999999999.jsonl.gz'))
+
+        stats = archived_usage_stats(user_id=self.user.id)
+        self.assertEqual((stats['total_executions'], stats['failed_executions']), (3, 1))
+
+        march = archived_usage_stats(datetime(2025, 3, 1, tzinfo=dt_timezone.utc),
+                                     datetime(2025, 4, 1, tzinfo=dt_timezone.utc), agent_id=self.agent.id)
+        self.assertEqual(march['total_executions'], 2)
+        self.assertEqual(archived_usage_stats(user_id=self.user.id + 1)['total_executions'], 0)
+
+        stats = historical_usage_stats(user_id=self.user.id, agent_id=self.agent.id)
+        self.assertEqual(stats['total_executions'], 4)
+        self.assertEqual(stats['successful_executions'], 3)
+        self.assertAlmostEqual(stats['avg_execution_time'], 1.75)
+
+
+class ExecutionExportTest(AgentFixtureMixin, TestCase):
+    """Test the streaming CSV/JSONL export of a user's execution history"""
+    fixture_name = 'export'
+
+    def setUp(self):
+        super().setUp()
+        limiter.reset()
+
+        UserSubscription.objects.create(user=self.user, agent=self.agent, status='cancelled',
+                                        end_date=datetime(2025, 6, 1, tzinfo=dt_timezone.utc))
+        other = User.objects.create_user('other-export', 'other@example.com', 'pass')
+        for i, (user, day) in enumerate([(self.user, 1), (self.user, 2), (self.user, 3), (other, 2)]):
+            log = AgentUsageLog.objects.create(
+                user=user, agent=self.agent, execution_id=f'exec-{i}', execution_time=1.5,
+                success=i != 1, error_message='=HYPERLINK("x")' if i == 1 else '',
+            )
+            AgentUsageLog.objects.filter(id=log.id).update(created_at=datetime(2025, 5, day, 12, tzinfo=dt_timezone.utc))
+        self.url = f'/agents/{self.agent.id}/executions/export/'
+        self.async_client.force_login(self.user)
+
+    async def download(self, query='', **extra):
+        response = await self.async_client.get(self.url + query, **extra)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        return response, b''.join([chunk async for chunk in response.streaming_content])
+
+    async def test_csv_export_streams_only_own_rows(self):
+        response, body = await self.download()
+        self.assertIn('attachment;', response['Content-Disposition'])
+        rows = list(csv.reader(body.decode().splitlines()))
+        self.assertEqual(rows[0], ['created_at', 'execution_id', 'success', 'execution_time', 'error_message'])
+        self.assertEqual([row[1] for row in rows[1:]], ['exec-0', 'exec-1', 'exec-2'])
+        # Sin inyección de fórmulas al abrir el CSV en una hoja de cálculo
+        self.assertEqual(rows[2][4], '\'=HYPERLINK("x")')
+
+    async def test_jsonl_gzip_export_with_date_range(self):
+        response, body = await self.download('?format=jsonl&compress=gzip&start=2025-05-02&end=2025-05-02')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        rows = [json.loads(line) for line in gzip.decompress(body).decode().splitlines()]
+        self.assertEqual([row['execution_id'] for row in rows], ['exec-1'])
+        self.assertIs(rows[0]['success'], False)
+
+    async def test_transparent_gzip_is_a_single_stream(self):
+        response, body = await self.download(headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        decompressor = zlib.decompressobj(wbits=31)
+        self.assertIn(b'exec-2', decompressor.decompress(body))
+        self.assertTrue(decompressor.eof)
+        self.assertEqual(decompressor.unused_data, b'')
+
+    async def test_values_list_aiterator_opens_cursor_on_event_loop(self):
+        # Motivo de aiter_server_side(); si deja de fallar tras actualizar Django, usar aiterator()
+        rows = AgentUsageLog.objects.filter(user=self.user).values_list('execution_id')
+        with self.assertRaises(SynchronousOnlyOperation):
+            [row async for row in rows.aiterator(chunk_size=2)]
+        self.assertEqual(len([row async for row in aiter_server_side(rows, 2)]), 3)
+
+    async def test_rejects_invalid_parameters_and_other_agents(self):
+        self.assertEqual((await self.async_client.get(self.url + '?format=xml')).status_code, 400)
+        self.assertEqual((await self.async_client.get(self.url + '?start=ayer')).status_code, 400)
+        self.assertEqual((await self.async_client.get(f'/agents/{self.agent.id + 1}/executions/export/')).status_code, 404)
+
+
+class UsageLogAdminTest(AgentFixtureMixin, TestCase):
+    """Test the large-table admin for AgentUsageLog (estimated counts and keyset paging)"""
+    fixture_name = 'logs'
+    fixture_superuser = True
+
+    def setUp(self):
+        super().setUp()
+        AgentUsageLog.objects.bulk_create([
+            AgentUsageLog(user=self.user, agent=self.agent, execution_id=f'exec-{i}', execution_time=1.0,
+                          success=i % 3 != 0)
+            for i in range(23)
+        ])
+
+    def test_keyset_pages_match_offset_pages(self):
+        for queryset in (AgentUsageLog.objects.order_by('-id'), AgentUsageLog.objects.filter(success=True).order_by('id')):
+            expected, paginator = Paginator(queryset, 5), EstimatedCountPaginator(queryset, 5)
+            for number in expected.page_range:
+                self.assertEqual(list(paginator.page(number)), list(expected.page(number)))
+
+    def test_large_estimates_skip_exact_count(self):
+        queryset = AgentUsageLog.objects.filter(success=True).order_by('-id')
+        self.assertGreater(EstimatedCountPaginator(queryset, 5).estimated_count(), 0)
+        # Con pocas filas estimadas el conteo es exacto
+        self.assertEqual(EstimatedCountPaginator(queryset, 5).count, 15)
+
+        with mock.patch.object(EstimatedCountPaginator, 'estimated_count', return_value=20_000_000):
+            paginator = EstimatedCountPaginator(queryset, 5)
+            with self.assertNumQueries(0):
+                self.assertEqual(paginator.count, 20_000_000)
+
+    def test_changelist_defaults_to_current_month(self):
+        self.client.force_login(self.user)
+        url = '/admin/agents/agentusagelog/'
+        response = self.client.get(url)
+        today = timezone.localdate()
+        self.assertRedirects(response, f'{url}?created_at__year={today.year}&created_at__month={today.month}')
+
+        with mock.patch.object(AgentUsageLogAdmin, 'list_per_page', 10):
+            response = self.client.get(f'{url}?created_at__year={today.year}&created_at__month={today.month}&p=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([log.execution_id for log in response.context['cl'].result_list],
+                         [f'exec-{i}' for i in range(12, 2, -1)])
+
+
+class SubscriptionLifecycleTest(AgentFixtureMixin, TestCase):
+    """Test the batch renewal/expiry job and that access checks honour end_date"""
+    fixture_name = 'subs'
+
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.now()
+        retired = Agent.objects.create(name="Agente Retirado", description="Desc", category=self.category, price=100,
+                                       n8n_workflow_id="retired", is_active=False)
+
+        def subscribe(name, end_in, auto_renew=True, agent=None):
+            user = User.objects.create_user(name, f'{name}@example.com', 'pass')
+            return UserSubscription.objects.create(user=user, agent=agent or self.agent, auto_renew=auto_renew,
+                                                   end_date=self.now + end_in)
+
+        self.due_expiry = subscribe('due-expiry', -timedelta(hours=1), auto_renew=False)
+        self.due_renewal = subscribe('due-renewal', timedelta(hours=2))
+        self.lapsed_renewal = subscribe('lapsed-renewal', -timedelta(days=40))
+        self.retired_agent = subscribe('retired-agent', -timedelta(hours=1), agent=retired)
+        self.current = subscribe('current', timedelta(days=20), auto_renew=False)
+
+    def run_job(self):
+        with override_settings(SUBSCRIPTION_BATCH_SIZE=1), \
+                mock.patch('apps.agents.subscriptions.send_email_task') as email_task, \
+                self.captureOnCommitCallbacks(execute=True):
+            result = process_subscription_lifecycle(self.now)
+        return result, email_task.delay
+
+    def test_renews_and_expires_in_batches(self):
+        cache.set(dashboard_stats_cache_key(self.due_expiry.user_id, self.agent.id), {'total_executions': 1})
+        result, delay = self.run_job()
+
+        self.assertEqual(result, {'renewed': 2, 'expired': 2})
+        for subscription in (self.due_expiry, self.due_renewal, self.lapsed_renewal, self.retired_agent, self.current):
+            subscription.refresh_from_db()
+        self.assertEqual((self.due_expiry.status, self.retired_agent.status), ('expired', 'expired'))
+        self.assertEqual(self.current.status, 'active')
+        self.assertEqual(self.due_renewal.end_date, self.now + timedelta(hours=2, days=30))
+        # Vencida hace tiempo: el nuevo periodo empieza ahora, no en el end_date antiguo
+        self.assertEqual(self.lapsed_renewal.end_date, self.now + timedelta(days=30))
+
+        recipients = sorted(call.args[2][0] for call in delay.call_args_list)
+        self.assertEqual(recipients, ['due-expiry@example.com', 'due-renewal@example.com',
+                                      'lapsed-renewal@example.com', 'retired-agent@example.com'])
+        self.assertIsNone(cache.get(dashboard_stats_cache_key(self.due_expiry.user_id, self.agent.id)))
+
+        # Idempotente: nada más que hacer
+        self.assertEqual(self.run_job()[0], {'renewed': 0, 'expired': 0})
+
+    def test_access_checks_ignore_lapsed_active_subscriptions(self):
+        self.assertEqual(self.due_expiry.status, 'active')
+        self.assertFalse(UserSubscription.objects.active().filter(id=self.due_expiry.id).exists())
+
+        self.client.force_login(self.due_expiry.user)
+        self.assertEqual(self.client.get(f'/api/agent-stats/{self.agent.id}/').status_code, 403)
+        self.client.force_login(self.current.user)
+        self.assertEqual(self.client.get(f'/api/agent-stats/{self.agent.id}/').status_code, 200)
+
+
+class SessionAuthCacheTest(AgentFixtureMixin, TestCase):
+    """Test the cached_db session engine and the cached authenticated user"""
+    fixture_name = 'session'
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        UserSubscription.objects.create(user=self.user, agent=self.agent, end_date=timezone.now() + timedelta(days=30))
+        self.client.force_login(self.user)
+
+    def session_and_user_queries(self, path):
+        with QueryRecorder() as recorder:
+            response = self.client.get(path)
+        return response, [query.sql for query in recorder.queries
+                          if '"django_session"' in query.sql or '"auth_user"' in query.sql]
+
+    def test_repeat_requests_skip_session_and_user_queries(self):
+        path = f'/agents/{self.agent.id}/'
+        response, queries = self.session_and_user_queries(path)
+        self.assertEqual(response.status_code, 200)
+        # Primera petición: solo el usuario (la sesión ya está en el cache desde el login)
+        self.assertEqual(len(queries), 1)
+        self.assertIn('"auth_user"', queries[0])
+
+        response, queries = self.session_and_user_queries(path)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+
+    def test_user_save_invalidates_cached_user(self):
+        path = f'/agents/{self.agent.id}/'
+        self.client.get(path)
+        self.user.first_name = 'Renombrado'
+        self.user.save()
+        response, queries = self.session_and_user_queries(path)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(response.wsgi_request.user.first_name, 'Renombrado')
+
+    def test_password_change_logs_out_other_sessions(self):
+        path = f'/agents/{self.agent.id}/'
+        self.assertEqual(self.client.get(path).status_code, 200)
+        self.user.set_password('new-pass')
+        self.user.save()
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
+
+    def test_session_refresh_interval(self):
+        path = f'/agents/{self.agent.id}/'
+        self.client.get(path)
+        refreshed_at = self.client.session[REFRESHED_AT_KEY]
+        _, queries = self.session_and_user_queries(path)
+        self.assertEqual(queries, [])
+
+        with mock.patch('iacol_project.sessions.time.time', return_value=time.time() + 3601):
+            _, queries = self.session_and_user_queries(path)
+        self.assertTrue(any(query.startswith('UPDATE "django_session"') for query in queries))
+        self.assertGreater(self.client.session[REFRESHED_AT_KEY], refreshed_at)
+
+
+class StubN8NHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, como n8n
+
+    def do_GET(self):
+        self.server.respond(self)
+
+    do_POST = do_GET
+
+    def log_message(self, *args):
+        pass
+
+
+class StubN8NServer(ThreadingHTTPServer):
+    """
+    Servidor HTTP local que registra las peticiones y responde con `responses`
+    en orden (200 al agotarse): (status, payload) o (status, payload, segundos de espera)
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubN8NHandler)
+        self.responses = []
+        self.requests = []
+        self.url = f'http://127.0.0.1:{self.server_address[1]}'
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def respond(self, handler):
+        length = int(handler.headers.get('Content-Length') or 0)
+        body = handler.rfile.read(length) if length else b''
+        self.requests.append({
+            'method': handler.command, 'path': handler.path, 'body': body,
+            'client_port': handler.client_address[1], 'api_key': handler.headers.get('X-N8N-API-KEY'),
+        })
+        status, payload, *delay = self.responses.pop(0) if self.responses else (200, {'ok': True})
+        if delay:
+            time.sleep(delay[0])
+        data = json.dumps(payload).encode()
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(data)))
+        handler.end_headers()
+        try:
+            handler.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # el cliente dejó de esperar (timeout de lectura)
+
+
+class N8NClientTest(TestCase):
+    """Cliente de n8n (apps/agents/n8n.py) contra un servidor HTTP local"""
+
+    def setUp(self):
+        self.server = StubN8NServer()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def make_client(self, **kwargs):
+        options = {'webhook_url': f'{self.server.url}/webhook/', 'api_url': f'{self.server.url}/api/v1/',
+                   'api_key': 'n8n-key', 'timeout': 2, 'connect_timeout': 1, 'retry_backoff': 0, **kwargs}
+        client = N8NClient(**options)
+        self.addCleanup(client.close)
+        return client
+
+    def test_trigger_reuses_keepalive_connection(self):
+        client = self.make_client()
+        for i in range(3):
+            self.assertEqual(client.trigger_workflow('wf-1', {'message': i}), {'ok': True})
+        self.assertEqual([r['path'] for r in self.server.requests], ['/webhook/wf-1'] * 3)
+        self.assertEqual(json.loads(self.server.requests[2]['body']), {'message': 2})
+        self.assertEqual(len({r['client_port'] for r in self.server.requests}), 1)
+
+    def test_retries_transient_errors_but_not_client_errors(self):
+        client = self.make_client(max_retries=2)
+        self.server.responses = [(503, {}), (429, {}), (200, {'done': True})]
+        self.assertEqual(client.trigger_workflow('wf-1'), {'done': True})
+        self.assertEqual(len(self.server.requests), 3)
+
+        self.server.responses = [(404, {'message': 'webhook not registered'})]
+        with self.assertRaises(N8NRequestError) as raised:
+            client.trigger_workflow('missing')
+        self.assertEqual(raised.exception.status_code, 404)
+        self.assertEqual(len(self.server.requests), 4)
+
+    def test_ambiguous_webhook_failures_are_not_retried(self):
+        client = self.make_client(max_retries=2, timeout=0.2, failure_threshold=10)
+        for response in [(502, {}), (504, {}), (200, {}, 0.5)]:
+            self.server.responses = [response]
+            with self.assertRaises(N8NOutcomeUnknown):
+                client.trigger_workflow('wf-1')
+        self.assertEqual(len(self.server.requests), 3)
+
+        # Las consultas (GET) sí se reintentan
+        self.server.responses = [(502, {}), (200, {'id': '7'}, 0.5), (200, {'id': '7'})]
+        self.assertEqual(client.get_execution('7'), {'id': '7'})
+        self.assertEqual(len(self.server.requests), 6)
+
+    def test_circuit_opens_and_recovers(self):
+        client = self.make_client(max_retries=0, failure_threshold=2, reset_timeout=30)
+        self.server.responses = [(503, {}), (503, {})]
+        for _ in range(2):
+            with self.assertRaises(N8NUnavailable):
+                client.trigger_workflow('wf-1')
+        # Abierto: falla sin salir del proceso
+        with self.assertRaises(N8NUnavailable):
+            client.trigger_workflow('wf-1')
+        self.assertEqual(len(self.server.requests), 2)
+
+        breaker = client.circuit(self.server.url)
+        breaker.open_until = time.monotonic() - 1
+        self.assertEqual(client.trigger_workflow('wf-1'), {'ok': True})
+        self.assertFalse(breaker.is_open)
+        self.assertEqual(breaker.failures, 0)
+
+    def test_connection_refused_is_unavailable(self):
+        port = self.server.server_address[1]
+        self.server.shutdown()
+        self.server.server_close()
+        client = N8NClient(webhook_url=f'http://127.0.0.1:{port}/webhook/', connect_timeout=1, max_retries=1,
+                           retry_backoff=0)
+        with self.assertRaises(N8NUnavailable):
+            client.trigger_workflow('wf-1')
+
+    async def test_async_trigger_and_poll_execution(self):
+        client = self.make_client()
+        self.assertEqual(await client.atrigger_workflow('wf-1', {'a': 1}), {'ok': True})
+
+        self.server.responses = [(200, {'id': '7', 'finished': False, 'status': 'running'}),
+                                 (200, {'id': '7', 'finished': True, 'status': 'success'})]
+        execution = await client.await_execution('7', timeout=5, poll_interval=0)
+        self.assertEqual(execution['status'], 'success')
+        polls = self.server.requests[1:]
+        self.assertEqual([r['path'] for r in polls], ['/api/v1/executions/7?includeData=false'] * 2)
+        self.assertEqual(polls[0]['api_key'], 'n8n-key')
+
+    def test_dispatch_through_celery(self):
+        with mock.patch.object(trigger_n8n_workflow, 'apply_async') as apply_async:
+            self.assertTrue(dispatch_workflow('wf-1', {'a': 1}))
+        apply_async.assert_called_once_with(('wf-1', {'a': 1}), retry=False)
+        with mock.patch.object(trigger_n8n_workflow, 'apply_async', side_effect=OSError('broker down')):
+            self.assertFalse(dispatch_workflow('wf-1'))
+
+        self.addCleanup(reset_client)
+        reset_client()
+        with override_settings(N8N_WEBHOOK_URL=f'{self.server.url}/webhook/'):
+            trigger_n8n_workflow.apply(args=('wf-1', {'a': 1}))
+        self.assertEqual(self.server.requests[0]['path'], '/webhook/wf-1')
+        self.assertEqual(json.loads(self.server.requests[0]['body']), {'a': 1})
+
+        # Sin respuesta válida de n8n el workflow pudo ejecutarse: la tarea no se reintenta
+        reset_client()
+        self.server.responses = [(504, {})]
+        with override_settings(N8N_WEBHOOK_URL=f'{self.server.url}/webhook/'), \
+                mock.patch.object(trigger_n8n_workflow, 'retry') as retry:
+            trigger_n8n_workflow.apply(args=('wf-1', {'a': 1}))
+        retry.assert_not_called()
+        self.assertEqual(len(self.server.requests), 2)
+
+
+class FakePubSub:
+    """PubSub de redis.asyncio en memoria: solo lo que usa ExecutionHub"""
+
+    def __init__(self):
+        self.channels = set()
+        self.messages = asyncio.Queue()
+
+    async def subscribe(self, channel):
+        self.channels.add(channel)
+
+    async def unsubscribe(self, channel):
+        self.channels.discard(channel)
+
+    async def get_message(self, ignore_subscribe_messages=False, timeout=0.0):
+        try:
+            return await asyncio.wait_for(self.messages.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def reset(self):
+        self.channels.clear()
+
+    def publish(self, channel, data):
+        if channel in self.channels:
+            self.messages.put_nowait({'type': 'message', 'channel': channel.encode(), 'data': data})
+
+
+class ExecutionEventsTest(AgentFixtureMixin, TestCase):
+    """Test the live execution feed (Redis pub/sub + SSE) of the agent dashboard"""
+    fixture_name = 'live'
+
+    def setUp(self):
+        super().setUp()
+        limiter.reset()
+
+        self.subscription = UserSubscription.objects.create(
+            user=self.user, agent=self.agent, status='active', end_date=timezone.now() + timedelta(days=30),
+        )
+        self.logs = [
+            AgentUsageLog.objects.create(user=self.user, agent=self.agent, execution_id=f'exec-{i}',
+                                         execution_time=1.0, success=i != 1)
+            for i in range(2)
+        ]
+        self.url = f'/agents/{self.agent.id}/executions/events/'
+        self.client.force_login(self.user)
+        self.async_client.force_login(self.user)
+
+    def test_create_log_publishes_after_commit(self):
+        stats_key = dashboard_stats_cache_key(self.user.id, self.agent.id)
+        cache.set(stats_key, {'total_executions': 2})
+        redis = mock.Mock()
+        with mock.patch('apps.agents.events._redis_backend', return_value=object()), \
+                mock.patch('django_redis.get_redis_connection', return_value=redis):
+            with self.captureOnCommitCallbacks(execute=False) as callbacks:
+                log = AgentUsageLog.objects.create_log(user=self.user, agent=self.agent, execution_id='exec-new',
+                                                       execution_time=0.5, success=False)
+            redis.publish.assert_not_called()  # nada antes del commit
+            callbacks[0]()
+
+        channel, message = redis.publish.call_args.args
+        self.assertEqual(channel, execution_channel(self.user.id, self.agent.id))
+        event = json.loads(message)
+        self.assertEqual((event['id'], event['execution_id'], event['success']), (log.id, 'exec-new', False))
+        self.assertIsNone(cache.get(stats_key))
+
+    def test_dashboard_links_the_stream_and_requires_active_subscription(self):
+        response = self.client.get(f'/agents/{self.agent.id}/dashboard/')
+        self.assertContains(response, f'{self.url}?after={self.logs[-1].id}')
+        self.assertEqual(response.context['total_executions'], 2)
+
+        self.assertEqual(self.client.get(self.url, HTTP_LAST_EVENT_ID='x').status_code, 400)
+        self.subscription.status = 'cancelled'
+        self.subscription.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    async def read_stream(self, response, on_chunk=None):
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        chunks = []
+        async for chunk in response.streaming_content:
+            chunks.append(chunk.decode())
+            if on_chunk:
+                on_chunk(chunks[-1])
+        return ''.join(chunks)
+
+    @override_settings(SSE_MAX_STREAM_SECONDS=1, SSE_HEARTBEAT_SECONDS=1)
+    async def test_stream_catches_up_then_streams_live(self):
+        pubsub = FakePubSub()
+        hub = ExecutionHub(pubsub)
+        channel = execution_channel(self.user.id, self.agent.id)
+        live_id = self.logs[-1].id + 100
+
+        def publish_after_catch_up(chunk):
+            if f'id: {self.logs[1].id}' in chunk:
+                # Un duplicado de lo ya recuperado y una ejecución nueva
+                for event_id in (self.logs[1].id, live_id):
+                    pubsub.publish(channel, json.dumps({'id': event_id, 'execution_id': 'live', 'success': True}))
+
+        with mock.patch('apps.agents.events.get_hub', return_value=hub):
+            response = await self.async_client.get(
+                self.url, headers={'Last-Event-ID': str(self.logs[0].id), 'Accept-Encoding': 'gzip'},
+            )
+            body = await self.read_stream(response, publish_after_catch_up)
+
+        self.assertTrue(body.startswith('retry: 3000\n\n'))
+        self.assertNotIn(f'id: {self.logs[0].id}\n', body)
+        self.assertEqual(body.count(f'id: {self.logs[1].id}\n'), 1)
+        self.assertIn(f'id: {live_id}\nevent: execution\ndata: ', body)
+        # Al cerrar el stream se cancela la suscripción y el lector del hub termina
+        self.assertEqual(pubsub.channels, set())
+        await asyncio.wait_for(hub._reader, 2)
+
+    async def test_stream_without_redis_only_catches_up(self):
+        with mock.patch('apps.agents.events.get_hub', return_value=None):
+            response = await self.async_client.get(f'{self.url}?after=0')
+            body = await self.read_stream(response)
+        self.assertTrue(body.startswith('retry: 30000\n\n'))
+        self.assertEqual(body.count('event: execution'), 2)
+
+    async def test_stream_asks_for_reload_when_too_many_were_missed(self):
+        await AgentUsageLog.objects.abulk_create([
+            AgentUsageLog(user=self.user, agent=self.agent, execution_id=f'missed-{i}', execution_time=1.0)
+            for i in range(2)
+        ])
+        with mock.patch('apps.agents.events.CATCHUP_LIMIT', 3), \
+                mock.patch('apps.agents.events.get_hub', return_value=None):
+            response = await self.async_client.get(f'{self.url}?after=0')
+            body = await self.read_stream(response)
+        self.assertNotIn('event: execution', body)
+        self.assertTrue(body.endswith('event: reload\ndata: {}\n\n'))
+
+        with mock.patch('apps.agents.events.CATCHUP_LIMIT', 4), \
+                mock.patch('apps.agents.events.get_hub', return_value=None):
+            response = await self.async_client.get(f'{self.url}?after=0')
+            body = await self.read_stream(response)
+        self.assertEqual(body.count('event: execution'), 4)
+        self.assertNotIn('event: reload', body)
+
+    @override_settings(SSE_MAX_STREAM_SECONDS=1, SSE_HEARTBEAT_SECONDS=1)
+    async def test_stream_releases_database_connection_before_going_live(self):
+        hub = ExecutionHub(FakePubSub())
+        with mock.patch('apps.agents.events.get_hub', return_value=hub), \
+                mock.patch('apps.agents.events.release_connection') as release:
+            stream = stream_execution_events(self.user.id, self.agent.id, last_id=self.logs[0].id)
+            self.assertTrue((await anext(stream)).startswith('retry:'))
+            self.assertIn(f'id: {self.logs[1].id}\n', await anext(stream))
+            release.assert_not_called()
+            self.assertEqual(await anext(stream), ': keepalive\n\n')
+            release.assert_called_once_with()
+            await stream.aclose()
+        await asyncio.wait_for(hub._reader, 2)
+
+    async def test_slow_subscriber_is_closed(self):
+        hub = ExecutionHub(FakePubSub())
+        slow = await hub.subscribe('channel')
+        other = await hub.subscribe('channel')
+        for i in range(SUBSCRIBER_QUEUE_SIZE + 1):
+            slow.put({'id': i})
+        with self.assertRaises(SubscriptionClosed):
+            await slow.get(1)
+        self.assertEqual(hub.subscriptions['channel'], {other})
+        await other.close()
+        self.assertEqual(hub.pubsub.channels, set())
+        await asyncio.wait_for(hub._reader, 2)
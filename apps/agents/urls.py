@@ -1,5 +1,4 @@
 from django.urls import path
-from django.views.generic import RedirectView
 from . import views
 
 app_name = 'agents'
@@ -8,9 +7,10 @@ urlpatterns = [
     # URLs existentes
     path('', views.agent_list, name='agent_list'),
     path('<int:agent_id>/', views.agent_detail, name='agent_detail'),
-    # Redirigir dashboard a configure
-    path('<int:agent_id>/dashboard/', RedirectView.as_view(pattern_name='agents:agent_configure', permanent=False)),
+    path('<int:agent_id>/dashboard/', views.agent_dashboard, name='agent_dashboard'),
     path('<int:agent_id>/configure/', views.agent_configure, name='agent_configure'),
+    path('<int:agent_id>/executions/export/', views.export_executions, name='export_executions'),
+    path('<int:agent_id>/executions/events/', views.execution_events, name='execution_events'),
     
     # URLs para la gestión de módulos
     path('<int:agent_id>/modules/<str:module_name>/toggle/', views.toggle_module, name='toggle_module'),
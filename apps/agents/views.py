@@ -1,7 +1,7 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse, Http404, HttpResponseRedirect
+from django.http import JsonResponse, Http404, HttpResponseBadRequest, HttpResponseRedirect, StreamingHttpResponse
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
@@ -14,21 +14,29 @@ from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
 from .models import Agent, UserSubscription, AgentConfiguration, AgentUsageLog, Provider, ProviderCategory, Brand, Product, ProductCategory, ProductBrand, AutomotiveCenterInfo, AdvancedCatalogCategory, AdvancedCatalogProduct, AdvancedCatalogModel, AdvancedCatalogImage
 from .forms import AgentConfigurationForm, ProviderForm, ProviderCategoryForm, BrandForm, ProductForm, ProductCategoryForm, ProductBrandForm, AutomotiveCenterInfoForm, AdvancedCatalogCategoryForm, AdvancedCatalogProductForm, AdvancedCatalogModelForm
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django_ratelimit.decorators import ratelimit
+from iacol_project.async_utils import async_login_required
+from iacol_project.ratelimit import rate_limit
+from iacol_project.querybudget import query_budget
 from django.core.cache import cache
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.db.models import Count, Sum, Q
-
-@login_required
-# @ratelimit(key='user', rate='20/m', method='GET')  # Temporarily disabled due to Redis issues
-def agent_list(request):
-    """Lista todos los agentes disponibles con paginación"""
+from datetime import datetime, time, timedelta
+from iacol_project.compression import acompress_sequence
+from .exports import EXPORT_FORMATS, stream_executions
+from .events import stream_execution_events
+from .subscriptions import dashboard_stats_cache_key
+
+@async_login_required
+@rate_limit(key='user', rate='20/m', method='GET')
+async def agent_list(request):
+    """Lista todos los agentes disponibles con paginación (vista async)"""
     # MEDIUM-001: Corrección de cache key para incluir parámetros relevantes
     page = request.GET.get('page', '1')
     search_query = request.GET.get('search', '')
     # Include user permissions and search query in cache key
     cache_key = f'agent_list_{request.user.is_staff or request.user.is_superuser}_page_{page}_search_{search_query}'
-    agents = cache.get(cache_key)
+    agents = await cache.aget(cache_key)
 
     if agents is None:
         query = Agent.objects.filter(is_active=True).select_related('category')
@@ -43,8 +51,8 @@ def agent_list(request):
         if search_query:
             query = query.filter(name__icontains=search_query)
             
-        agents = list(query)
-        cache.set(cache_key, agents, 300)  # Cache for 5 minutes
+        agents = [agent async for agent in query]
+        await cache.aset(cache_key, agents, 300)  # Cache for 5 minutes
 
     # Paginación
     paginator = Paginator(agents, 12)  # 12 agentes por página
@@ -55,30 +63,31 @@ def agent_list(request):
     except EmptyPage:
         agents_page = paginator.page(paginator.num_pages)
 
-    user_subscriptions = UserSubscription.objects.filter(
-        user=request.user,
-        status='active'
+    user_subscriptions = UserSubscription.objects.active().filter(
+        user=request.user
     ).values_list('agent_id', flat=True)
 
     return render(request, 'agents/agent_list.html', {
         'agents': agents_page,
-        'user_subscriptions': list(user_subscriptions)
+        'user_subscriptions': [agent_id async for agent_id in user_subscriptions]
     })
 
-@login_required
-def agent_detail(request, agent_id):
-    """Detalle de un agente específico"""
-    agent = get_object_or_404(Agent.objects.select_related('category'), id=agent_id)
+@async_login_required
+@query_budget(5)
+async def agent_detail(request, agent_id):
+    """Detalle de un agente específico (vista async)"""
+    agent = await Agent.objects.select_related('category').filter(id=agent_id).afirst()
+    if agent is None:
+        raise Http404("Agente no encontrado")
     # Control de visibilidad: admin/staff siempre pueden ver
     if not (request.user.is_staff or request.user.is_superuser):
         is_public = agent.show_in_agents or agent.show_in_solutions
-        if not is_public and request.user not in agent.allowed_users.all():
+        if not is_public and not await agent.allowed_users.filter(pk=request.user.pk).aexists():
             raise Http404("Agente no disponible")
-    has_subscription = UserSubscription.objects.filter(
+    has_subscription = await UserSubscription.objects.active().filter(
         user=request.user,
-        agent=agent,
-        status='active'
-    ).exists()
+        agent=agent
+    ).aexists()
     
     return render(request, 'agents/agent_detail.html', {
         'agent': agent,
@@ -90,14 +99,13 @@ def agent_dashboard(request, agent_id):
     """Dashboard de estadísticas para un agente"""
     agent = get_object_or_404(Agent.objects.select_related('category'), id=agent_id)
     subscription = get_object_or_404(
-        UserSubscription,
+        UserSubscription.objects.active(),
         user=request.user,
-        agent=agent,
-        status='active'
+        agent=agent
     )
     
     # CRITICAL-001: Optimización crítica - Usar annotate para agregaciones en una sola query
-    cache_key = f'agent_dashboard_stats_{request.user.id}_{agent_id}'
+    cache_key = dashboard_stats_cache_key(request.user.id, agent_id)
     stats = cache.get(cache_key)
     
     if stats is None:
@@ -128,9 +136,9 @@ def agent_dashboard(request, agent_id):
         cache.set(cache_key, stats, 300)
     
     # Últimas ejecuciones con select_related para mejor performance
-    recent_executions = AgentUsageLog.objects.filter(
+    recent_executions = list(AgentUsageLog.objects.filter(
         user=request.user, agent=agent
-    ).select_related('agent').order_by('-created_at')[:10]
+    ).select_related('agent').defer('input_data', 'output_data').order_by('-created_at')[:10])
     
     # Configuración actual
     try:
@@ -149,18 +157,98 @@ def agent_dashboard(request, agent_id):
         'failed_executions': stats['failed_executions'],
         'success_rate': stats['success_rate'],
         'recent_executions': recent_executions,
+        # El stream en vivo recupera lo creado después de renderizar la página
+        'last_execution_id': max((execution.id for execution in recent_executions), default=0),
         'configuration': configuration,
     })
 
+def _export_date_range(request):
+    """(desde, hasta) aware a partir de ?start=/?end= (YYYY-MM-DD, ambos inclusive); ValueError si no son válidos"""
+    bounds = []
+    for name, offset in (('start', 0), ('end', 1)):
+        value = request.GET.get(name)
+        if not value:
+            bounds.append(None)
+            continue
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(name)
+        bounds.append(timezone.make_aware(datetime.combine(day + timedelta(days=offset), time.min)))
+    return bounds
+
+
+@async_login_required
+@rate_limit(key='user', rate='10/m', method='GET')
+async def export_executions(request, agent_id):
+    """Descarga en streaming (CSV o JSONL, opcionalmente .gz) del historial de ejecuciones del usuario (vista async)"""
+    agent = await Agent.objects.filter(id=agent_id).afirst()
+    if agent is None:
+        raise Http404("Agente no encontrado")
+    # También con la suscripción vencida: el historial sigue siendo del usuario
+    if not (request.user.is_staff or request.user.is_superuser
+            or await UserSubscription.objects.filter(user=request.user, agent=agent).aexists()):
+        raise Http404("Agente no disponible")
+
+    encoder_class = EXPORT_FORMATS.get(request.GET.get('format', 'csv'))
+    if encoder_class is None:
+        return HttpResponseBadRequest(f"Formato no soportado; usa {', '.join(EXPORT_FORMATS)}")
+    try:
+        start, end = _export_date_range(request)
+    except ValueError as e:
+        return HttpResponseBadRequest(f"Fecha inválida en '{e}': usa AAAA-MM-DD")
+
+    queryset = AgentUsageLog.objects.filter(user=request.user, agent=agent)
+    if start is not None:
+        queryset = queryset.filter(created_at__gte=start)
+    if end is not None:
+        queryset = queryset.filter(created_at__lt=end)
+
+    encoder = encoder_class()
+    content = stream_executions(queryset, encoder)
+    filename = f"ejecuciones-{agent.id}-{timezone.localdate():%Y%m%d}.{encoder.extension}"
+    if request.GET.get('compress') == 'gzip':
+        content = acompress_sequence(content)
+        content_type, filename = 'application/gzip', f'{filename}.gz'
+    else:
+        # Sin ?compress el CompressionMiddleware puede aplicar Content-Encoding gzip
+        content_type = encoder.content_type
+
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['Cache-Control'] = 'private, no-store'
+    # Que nginx no acumule la respuesta antes de enviarla
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@async_login_required
+@rate_limit(key='user', rate='30/m', method='GET')
+async def execution_events(request, agent_id):
+    """Stream SSE con las ejecuciones nuevas del usuario en el agente (dashboard en vivo, vista async)"""
+    if not await UserSubscription.objects.active().filter(user=request.user, agent_id=agent_id).aexists():
+        raise Http404("Agente no disponible")
+    # Last-Event-ID lo envía el navegador al reconectar; ?after= en la primera conexión
+    last_id = request.headers.get('Last-Event-ID') or request.GET.get('after')
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        return HttpResponseBadRequest("Last-Event-ID inválido")
+
+    response = StreamingHttpResponse(
+        stream_execution_events(request.user.id, agent_id, last_id), content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @login_required
+@query_budget(12)
 def agent_configure(request, agent_id):
     """Configuración de un agente"""
     agent = get_object_or_404(Agent.objects.select_related('category'), id=agent_id)
     subscription = get_object_or_404(
-        UserSubscription,
+        UserSubscription.objects.active(),
         user=request.user,
-        agent=agent,
-        status='active'
+        agent=agent
     )
 
     # Get or create configuration
@@ -357,6 +445,7 @@ class ProviderDeleteView(LoginRequiredMixin, DeleteView):
         context['agent'] = self.agent
         return context
 
+@query_budget(5)
 class ProviderCategoryListView(LoginRequiredMixin, ListView):
     model = ProviderCategory
     template_name = 'agents/provider_category_list.html'
@@ -366,11 +455,13 @@ class ProviderCategoryListView(LoginRequiredMixin, ListView):
         return super().dispatch(request, *args, **kwargs)
     
     def get_queryset(self):
-        return ProviderCategory.objects.filter(agent_config__agent=self.agent)
+        # Conteo en la misma consulta: la plantilla lo muestra por fila
+        return ProviderCategory.objects.filter(agent_config__agent=self.agent).annotate(providers_count=Count('providers'))
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['agent'] = self.agent
+        context['title'] = _("Categorías de Proveedores")
         return context
 
 class ProductCategoryListView(LoginRequiredMixin, ListView):
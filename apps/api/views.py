@@ -1,29 +1,37 @@
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
-from rest_framework.response import Response
 from django.contrib.auth.models import User
-from django.http import HttpResponse, Http404
+from django.db.models import Count, Q
+from django.http import HttpResponse, Http404, JsonResponse
 from django.conf import settings
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 import json
+import logging
 import os
 import re
 from datetime import datetime
-from django_ratelimit.decorators import ratelimit
 
 from apps.agents.models import Agent, AgentUsageLog, UserSubscription
+from iacol_project.async_utils import async_api_view
+from iacol_project.ratelimit import rate_limit
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-@ratelimit(key='user', rate='100/m', method='POST')
-def log_agent_execution(request):
-    """Registra la ejecución de un agente desde N8N"""
+logger = logging.getLogger(__name__)
+
+def parse_request_data(request):
+    """Datos del cuerpo como JSON o formulario (equivalente a request.data de DRF)"""
+    if request.content_type == 'application/json':
+        return json.loads(request.body or b'{}')
+    return request.POST.dict()
+
+
+@async_api_view(['POST'])
+@rate_limit(key='api_key', rate='100/m', method='POST')
+async def log_agent_execution(request):
+    """Registra la ejecución de un agente desde N8N (vista async)"""
     try:
-        data = request.data
+        data = parse_request_data(request)
         user_id = data.get('user_id')
         agent_id = data.get('agent_id')
         execution_id = data.get('execution_id')
@@ -35,21 +43,21 @@ def log_agent_execution(request):
 
         # Usar siempre el usuario autenticado; si viene user_id debe coincidir
         if user_id and int(user_id) != request.user.id:
-            return Response({'status': 'error', 'message': 'Invalid user'}, status=status.HTTP_403_FORBIDDEN)
+            return JsonResponse({'status': 'error', 'message': 'Invalid user'}, status=status.HTTP_403_FORBIDDEN)
 
         user = request.user
-        agent = Agent.objects.filter(id=agent_id, is_active=True).first()
+        agent = await Agent.objects.filter(id=agent_id, is_active=True).afirst()
         if agent is None:
-            return Response({'status': 'error', 'message': 'Agent not found'}, status=status.HTTP_404_NOT_FOUND)
+            return JsonResponse({'status': 'error', 'message': 'Agent not found'}, status=status.HTTP_404_NOT_FOUND)
 
         # Validar que el usuario tenga acceso al agente (suscripción o staff)
-        has_access = request.user.is_staff or request.user.is_superuser or UserSubscription.objects.filter(
-            user=user, agent=agent, status='active'
-        ).exists()
+        has_access = request.user.is_staff or request.user.is_superuser or await UserSubscription.objects.active().filter(
+            user=user, agent=agent
+        ).aexists()
         if not has_access:
-            return Response({'status': 'error', 'message': 'No subscription for this agent'}, status=status.HTTP_403_FORBIDDEN)
+            return JsonResponse({'status': 'error', 'message': 'No subscription for this agent'}, status=status.HTTP_403_FORBIDDEN)
 
-        usage_log = AgentUsageLog.objects.create(
+        usage_log = await AgentUsageLog.objects.acreate_log(
             user=user,
             agent=agent,
             execution_id=execution_id,
@@ -60,60 +68,52 @@ def log_agent_execution(request):
             error_message=error_message
         )
 
-        return Response({
+        return JsonResponse({
             'status': 'success',
             'log_id': usage_log.id
         }, status=status.HTTP_201_CREATED)
 
     except Exception as e:
-        return Response({
+        return JsonResponse({
             'status': 'error',
             'message': str(e)
         }, status=status.HTTP_400_BAD_REQUEST)
 
-@api_view(['GET'])
-@permission_classes([IsAuthenticated])
-@ratelimit(key='user', rate='60/m', method='GET')
-def get_agent_stats(request, agent_id):
-    """Obtiene estadísticas de un agente para un usuario"""
-    try:
-        agent = Agent.objects.filter(id=agent_id, is_active=True).first()
-        if agent is None:
-            return Response({'error': 'Agent not found'}, status=status.HTTP_404_NOT_FOUND)
+@async_api_view(['GET'])
+@rate_limit(key='user', rate='60/m', method='GET')
+async def get_agent_stats(request, agent_id):
+    """Obtiene estadísticas de un agente para un usuario (vista async)"""
+    agent = await Agent.objects.filter(id=agent_id, is_active=True).afirst()
+    if agent is None:
+        return JsonResponse({'error': 'Agent not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        has_access = request.user.is_staff or request.user.is_superuser or UserSubscription.objects.filter(
-            user=request.user, agent=agent, status='active'
-        ).exists()
-        if not has_access:
-            return Response({'error': 'No subscription for this agent'}, status=status.HTTP_403_FORBIDDEN)
-
-        logs = AgentUsageLog.objects.filter(user=request.user, agent=agent)
-        
-        total = logs.count()
-        successful = logs.filter(success=True).count()
-        failed = logs.filter(success=False).count()
-        
-        return Response({
-            'total_executions': total,
-            'successful_executions': successful,
-            'failed_executions': failed,
-            'success_rate': (successful / total * 100) if total > 0 else 0
-        })
-        
-    except Agent.DoesNotExist:
-        return Response({
-            'error': 'Agent not found'
-        }, status=status.HTTP_404_NOT_FOUND)
+    has_access = request.user.is_staff or request.user.is_superuser or await UserSubscription.objects.active().filter(
+        user=request.user, agent=agent
+    ).aexists()
+    if not has_access:
+        return JsonResponse({'error': 'No subscription for this agent'}, status=status.HTTP_403_FORBIDDEN)
+
+    # Una sola consulta de agregación en lugar de tres count()
+    stats = await AgentUsageLog.objects.filter(user=request.user, agent=agent).aaggregate(
+        total=Count('id'),
+        successful=Count('id', filter=Q(success=True)),
+    )
+    total = stats['total']
+    successful = stats['successful']
+
+    return JsonResponse({
+        'total_executions': total,
+        'successful_executions': successful,
+        'failed_executions': total - successful,
+        'success_rate': (successful / total * 100) if total > 0 else 0
+    })
 
 @csrf_exempt
-@ratelimit(key='ip', rate='20/m', method='GET')
+@rate_limit(key='ip', rate='20/m', method='GET')
 def serve_media(request, path):
     """CRITICAL-002: Sirve archivos de media de forma segura con validaciones estrictas"""
     
-    # Logging para debugging
-    import logging
-    logger = logging.getLogger(__name__)
-    logger.info(f"Intentando servir archivo: {path}")
+    logger.debug("Intentando servir archivo: %s", path)
     
     # CRITICAL-002: Validación estricta de parámetros
     if not path or not isinstance(path, str):
@@ -136,13 +136,13 @@ def serve_media(request, path):
     # Validar que el archivo tiene una extensión permitida
     file_ext = os.path.splitext(normalized_path)[1].lower()
     if file_ext not in ALLOWED_EXTENSIONS:
-        logger.warning(f"Extensión no permitida: {file_ext}")
+        logger.warning("Extensión no permitida: %s", file_ext)
         raise Http404("Tipo de archivo no permitido")
     
     # Validar que el path no contiene caracteres peligrosos
     dangerous_patterns = ['..', '//', '\\\\', ':', '*', '?', '"', '<', '>', '|']
     if any(pattern in normalized_path for pattern in dangerous_patterns):
-        logger.warning(f"Path contiene caracteres peligrosos: {path}")
+        logger.warning("Path contiene caracteres peligrosos: %s", path)
         raise Http404("Path inválido")
     
     # Construir el path completo de forma segura
@@ -153,18 +153,17 @@ def serve_media(request, path):
         abs_media_root = os.path.abspath(settings.MEDIA_ROOT)
         abs_file_path = os.path.abspath(file_path)
         if not abs_file_path.startswith(abs_media_root):
-            logger.warning(f"Intento de acceso fuera del directorio permitido: {file_path}")
+            logger.warning("Intento de acceso fuera del directorio permitido: %s", file_path)
             raise Http404("Archivo no encontrado")
     except (TypeError, ValueError) as e:
-        logger.error(f"Error en validación de paths: {e}")
+        logger.error("Error en validación de paths: %s", e)
         raise Http404("Archivo no encontrado")
     
-    logger.info(f"Path validado: {file_path}")
-    logger.info(f"Archivo existe: {os.path.exists(file_path)}")
-    
+    logger.debug("Path validado: %s", file_path)
+
     # Verificar que el archivo existe y es accesible
-    if not os.path.exists(file_path) or not os.path.isfile(file_path):
-        logger.warning(f"Archivo no encontrado: {file_path}")
+    if not os.path.isfile(file_path):
+        logger.warning("Archivo no encontrado: %s", file_path)
         raise Http404("Archivo no encontrado")
     
     # Determinar tipo MIME basado en extensión de forma segura
@@ -206,12 +205,12 @@ def serve_media(request, path):
             file_obj.close()
             return response
         else:
-            logger.warning(f"Archivo no encontrado en storage: {normalized_path}")
+            logger.warning("Archivo no encontrado en storage: %s", normalized_path)
             raise Http404("Archivo no encontrado")
             
     except IOError as e:
-        logger.error(f"Error al leer archivo {file_path}: {e}")
+        logger.error("Error al leer archivo %s: %s", file_path, e)
         raise Http404("Error al leer el archivo")
     except Exception as e:
-        logger.error(f"Error inesperado al servir archivo {file_path}: {e}")
+        logger.exception("Error inesperado al servir archivo %s: %s", file_path, e)
         raise Http404("Error interno del servidor")
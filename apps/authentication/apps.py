@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class AuthenticationConfig(AppConfig):
+    name = 'apps.authentication'
+    verbose_name = 'Autenticación'
+
+    def ready(self):
+        # En todos los procesos (web, Celery, comandos): guardar un usuario invalida su copia en cache
+        from iacol_project.auth_cache import connect_signals
+        connect_signals()
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from iacol_project.page_cache import purge_page_cache
+
+
+class Command(BaseCommand):
+    help = 'Purga el cache de páginas anónimas (todas, o las URLs indicadas por nombre). Ejecutar en cada despliegue.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('url_names', nargs='*', help="Nombres de URL, p. ej. 'home' 'resources'")
+
+    def handle(self, *args, **options):
+        url_names = options['url_names']
+        generation = purge_page_cache(url_names or None)
+        if url_names:
+            self.stdout.write(self.style.SUCCESS(f'Páginas purgadas: {", ".join(url_names)}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Cache de páginas purgado (generación {generation})'))
@@ -2,29 +2,35 @@ from django.shortcuts import render
 from django.http import HttpResponse
 from apps.agents.models import Agent, UserSubscription
 from blog.models import BlogPost
-# from django_ratelimit.decorators import ratelimit  # Temporarily disabled
-from django.views.decorators.cache import cache_page
+from iacol_project.page_cache import anonymous_page_cache
+from iacol_project.ratelimit import rate_limit
+from django.utils.cache import add_never_cache_headers
 from django.urls import reverse
 
 
+@anonymous_page_cache()
 def home(request):
     """Página principal del sitio"""
     return render(request, 'home.html')
 
 
+@anonymous_page_cache()
 def about(request):
     """Página sobre nosotros"""
     return render(request, 'about.html')
 
 
+@anonymous_page_cache()
 def contact(request):
     """Página de contacto"""
     return render(request, 'contact.html')
 
 
-# @ratelimit(key='ip', rate='10/m', method='GET')  # Temporarily disabled due to Redis issues
+@rate_limit(key='ip', rate='10/m', method='GET')
+@anonymous_page_cache()
 def solutions(request):
     """Página pública de Soluciones con listado de agentes"""
+    db_error = False
     try:
         if request.user.is_authenticated and (request.user.is_staff or request.user.is_superuser):
             # Admines ven todos los agentes activos sin importar flags
@@ -34,21 +40,26 @@ def solutions(request):
         user_subscriptions = []
         if request.user.is_authenticated:
             user_subscriptions = list(
-                UserSubscription.objects.filter(user=request.user, status='active')
+                UserSubscription.objects.active().filter(user=request.user)
                 .values_list('agent_id', flat=True)
             )
     except Exception as e:
         # Si hay error de base de datos, mostrar página sin datos
         agents = []
         user_subscriptions = []
+        db_error = True
         print(f"Database error in solutions view: {e}")  # Para debugging
 
-    return render(request, 'solutions.html', {
+    response = render(request, 'solutions.html', {
         'agents': agents,
         'user_subscriptions': user_subscriptions,
     })
+    if db_error:
+        add_never_cache_headers(response)  # No cachear la página vacía
+    return response
 
 
+@anonymous_page_cache()
 def resources(request):
     """Página pública de Recursos"""
     blog_posts = BlogPost.objects.filter(is_published=True).order_by('-published_date')[:6]  # Últimos 6 posts
@@ -57,73 +68,88 @@ def resources(request):
     })
 
 
+@anonymous_page_cache()
 def findpartai_landing(request):
     """Página de landing para FindPartAi"""
     return render(request, 'findpartai_landing.html')
 
+@anonymous_page_cache()
 def mechai_landing(request):
     """Página de landing para MechAI"""
     return render(request, 'mechai_landing.html')
 
+@anonymous_page_cache()
 def automotive(request):
     """Página de landing para el sector automotriz"""
     return render(request, 'automotive.html')
 
+@anonymous_page_cache()
 def masterclass_auto_ai(request):
     """Página Masterclass en Implementación de IA para Centros Automotrices"""
     return render(request, 'masterclass_auto_ai.html')
 
 
+@anonymous_page_cache()
 def custom_service(request):
     """Página de Servicio de Atención al Cliente con IA"""
     return render(request, 'custom_service.html')
 
 
+@anonymous_page_cache()
 def lucid_team(request):
     """Página del equipo de expertos en Lucid Bot"""
     return render(request, 'lucid_team.html')
 
 
+@anonymous_page_cache()
 def dental_ai_landing(request):
     """Página de landing para Dental AI"""
     return render(request, 'dental_ai_landing.html')
 
 
+@anonymous_page_cache()
 def ibague_ai_landing(request):
     """Página de landing para Agencia de IA en Ibagué"""
     return render(request, 'ibague_ai_landing.html')
 
 
+@anonymous_page_cache()
 def bogota_ai_landing(request):
     """Página de landing para Agencia de IA en Bogotá"""
     return render(request, 'bogota_ai_landing.html')
 
 
+@anonymous_page_cache()
 def cali_ai_landing(request):
     """Página de landing para Agencia de IA en Cali"""
     return render(request, 'cali_ai_landing.html')
 
 
+@anonymous_page_cache()
 def medellin_ai_landing(request):
     """Página de landing para Agencia de IA en Medellín"""
     return render(request, 'medellin_ai_landing.html')
 
 
+@anonymous_page_cache()
 def barranquilla_ai_landing(request):
     """Página de landing para Agencia de IA en Barranquilla"""
     return render(request, 'barranquilla_ai_landing.html')
 
 
+@anonymous_page_cache()
 def cartagena_ai_landing(request):
     """Página de landing para Agencia de IA en Cartagena"""
     return render(request, 'cartagena_ai_landing.html')
 
 
+@anonymous_page_cache()
 def privacy_policy(request):
     """Página de Política de Privacidad"""
     return render(request, 'privacy_policy.html')
 
 
+@anonymous_page_cache()
 def terms_of_service(request):
     """Página de Condiciones del Servicio"""
     return render(request, 'terms_of_service.html')
@@ -0,0 +1,267 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.agents.models import (
+    AdvancedCatalogCategory, AdvancedCatalogModel, AdvancedCatalogProduct, Agent, AgentCategory,
+    AgentConfiguration, AgentUsageLog, AgentUsageLogPayload, Brand, Product, ProductBrand, ProductCategory,
+    Provider, ProviderCategory, UserSubscription,
+)
+from blog.models import BlogPost
+from iacol_project.benchmark import BENCH_MEDIA_PATH, BENCH_USERNAME, LOADTEST_PREFIX as PREFIX
+
+# Todo lo generado lleva el prefijo para poder borrarlo con --flush sin tocar datos reales
+BENCH_PASSWORD = 'loadtest-password'
+
+CITIES = ['Bogotá', 'Medellín', 'Cali', 'Barranquilla', 'Cartagena', 'Bucaramanga', 'Pereira', 'Manizales']
+AGENT_CATEGORIES = ['Atención al cliente', 'Ventas', 'Marketing', 'Automotriz', 'Finanzas', 'Recursos humanos']
+ERRORS = ['Timeout esperando respuesta de N8N', 'Credenciales inválidas del proveedor', 'Límite de tokens excedido']
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera datos sintéticos de carga (usuarios, agentes, suscripciones, catálogos, millones de '
+        'AgentUsageLog) para run_benchmarks. Todo usa el prefijo "loadtest"; --flush lo elimina.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5000)
+        parser.add_argument('--agents', type=int, default=1000)
+        parser.add_argument('--usage-logs', type=int, default=2_000_000)
+        parser.add_argument('--catalog-size', type=int, default=2000,
+                            help='Proveedores, productos y modelos de catálogo del usuario de benchmark')
+        parser.add_argument('--blog-posts', type=int, default=500)
+        parser.add_argument('--days', type=int, default=365, help='Antigüedad máxima de los logs de uso')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42, help='Misma semilla, mismos datos')
+        parser.add_argument('--flush', action='store_true', help='Elimina los datos de carga y termina')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.random = random.Random(options['seed'])
+        self.now = timezone.now()
+
+        if options['flush']:
+            self.flush()
+            return
+        if User.objects.filter(username=BENCH_USERNAME).exists():
+            raise CommandError('Ya existen datos de carga; ejecuta primero con --flush')
+
+        start = time.monotonic()
+        categories = self.create_agent_categories()
+        agents = self.create_agents(options['agents'], categories)
+        users = self.create_users(options['users'])
+        bench_user = users[0]
+        subscriptions = self.create_subscriptions(users, agents)
+        bench_agents = [agent_id for user_id, agent_id in subscriptions if user_id == bench_user.id]
+        self.create_bench_catalog(bench_user, bench_agents[0], options['catalog_size'])
+        self.create_usage_logs(options['usage_logs'], subscriptions, bench_user.id, options['days'])
+        self.create_blog_posts(options['blog_posts'])
+        self.create_media_file()
+        self.stdout.write(self.style.SUCCESS(f'Datos de carga generados en {time.monotonic() - start:.1f}s'))
+
+    def log(self, message):
+        self.stdout.write(f'  {message}')
+
+    def create_agent_categories(self):
+        return AgentCategory.objects.bulk_create([
+            AgentCategory(name=f'{PREFIX} {name}', description=f'Categoría de carga: {name}')
+            for name in AGENT_CATEGORIES
+        ])
+
+    def create_agents(self, count, categories):
+        agents = [
+            Agent(
+                name=f'{PREFIX} Agente {i}',
+                description='Agente sintético para pruebas de carga. ' * 5,
+                category=self.random.choice(categories),
+                price=Decimal(self.random.randint(10, 500)),
+                pricing_type=self.random.choice(['monthly', 'usage', 'enterprise']),
+                n8n_workflow_id=f'{PREFIX}-{i}',
+                features=[f'Funcionalidad {n}' for n in range(self.random.randint(2, 6))],
+                show_in_solutions=self.random.random() < 0.5,
+            )
+            for i in range(max(count, 1))
+        ]
+        agents = Agent.objects.bulk_create(agents, batch_size=self.batch_size)
+        self.log(f'{len(agents)} agentes')
+        return agents
+
+    def create_users(self, count):
+        # Un solo hash para todos: make_password por usuario tardaría minutos
+        password = make_password(BENCH_PASSWORD)
+        users = [User(username=BENCH_USERNAME, email=f'{BENCH_USERNAME}@example.com', password=password)]
+        users += [
+            User(username=f'{PREFIX}_user_{i:06d}', email=f'{PREFIX}_user_{i:06d}@example.com', password=password)
+            for i in range(1, count)
+        ]
+        users = User.objects.bulk_create(users, batch_size=self.batch_size)
+        self.log(f'{len(users)} usuarios (usuario de benchmark: {BENCH_USERNAME})')
+        return users
+
+    def create_subscriptions(self, users, agents):
+        """Cada usuario se suscribe a 1-5 agentes; el de benchmark a 20"""
+        subscriptions = []
+        configurations = []
+        for index, user in enumerate(users):
+            subscribed = self.random.sample(agents, min(len(agents), 20 if index == 0 else self.random.randint(1, 5)))
+            for agent in subscribed:
+                status = 'active' if self.random.random() < 0.85 else self.random.choice(['expired', 'cancelled'])
+                end_date = self.now + timedelta(days=self.random.randint(-30, 60))
+                if index == 0:
+                    # Las vistas de los escenarios exigen una suscripción vigente
+                    status, end_date = 'active', self.now + timedelta(days=365)
+                subscriptions.append(UserSubscription(
+                    user=user, agent=agent, status=status,
+                    start_date=self.now - timedelta(days=self.random.randint(1, 300)),
+                    end_date=end_date,
+                ))
+                if index == 0 or self.random.random() < 0.3:
+                    configurations.append(AgentConfiguration(user=user, agent=agent, configuration_data={'tone': 'formal'}))
+        # El usuario de benchmark siempre tiene sus suscripciones activas
+        for subscription in subscriptions:
+            if subscription.user_id == users[0].id:
+                subscription.status = 'active'
+                subscription.end_date = self.now + timedelta(days=30)
+
+        with transaction.atomic():
+            UserSubscription.objects.bulk_create(subscriptions, batch_size=self.batch_size)
+            AgentConfiguration.objects.bulk_create(configurations, batch_size=self.batch_size)
+        self.log(f'{len(subscriptions)} suscripciones, {len(configurations)} configuraciones')
+        return [(subscription.user_id, subscription.agent_id) for subscription in subscriptions]
+
+    def create_bench_catalog(self, user, agent_id, size):
+        """Catálogos grandes en la configuración que mide el escenario agent_configure"""
+        config = AgentConfiguration.objects.get(user=user, agent_id=agent_id)
+        AgentConfiguration.objects.filter(pk=config.pk).update(
+            enable_providers=True, enable_products=True, enable_advanced_catalog=True,
+        )
+        groups = max(size // 50, 1)
+
+        with transaction.atomic():
+            provider_categories = ProviderCategory.objects.bulk_create(
+                [ProviderCategory(name=f'Categoría {i}', agent_config=config) for i in range(groups)])
+            brands = Brand.objects.bulk_create([Brand(name=f'Marca {i}', agent_config=config) for i in range(groups)])
+            providers = Provider.objects.bulk_create([
+                Provider(
+                    name=f'Proveedor {i}', phone=f'+57300{i:07d}', city=self.random.choice(CITIES),
+                    category=self.random.choice(provider_categories), agent_config=config,
+                )
+                for i in range(size)
+            ], batch_size=self.batch_size)
+            Provider.brands.through.objects.bulk_create([
+                Provider.brands.through(provider_id=provider.id, brand_id=brand.id)
+                for provider in providers
+                for brand in self.random.sample(brands, min(len(brands), 3))
+            ], batch_size=self.batch_size)
+
+            product_categories = ProductCategory.objects.bulk_create(
+                [ProductCategory(name=f'Categoría {i}', agent_config=config) for i in range(groups)])
+            product_brands = ProductBrand.objects.bulk_create(
+                [ProductBrand(name=f'Marca {i}', agent_config=config) for i in range(groups)])
+            Product.objects.bulk_create([
+                Product(
+                    title=f'Producto {i}', description='Descripción del producto de carga. ' * 3,
+                    price=Decimal(self.random.randint(1000, 900000)) / 100, image_upload_method='url',
+                    category=self.random.choice(product_categories), brand=self.random.choice(product_brands),
+                    agent_config=config,
+                )
+                for i in range(size)
+            ], batch_size=self.batch_size)
+
+            catalog_categories = AdvancedCatalogCategory.objects.bulk_create(
+                [AdvancedCatalogCategory(name=f'Categoría {i}', agent_config=config) for i in range(groups)])
+            catalog_products = AdvancedCatalogProduct.objects.bulk_create([
+                AdvancedCatalogProduct(name=f'Producto {i}', category=self.random.choice(catalog_categories), agent_config=config)
+                for i in range(max(size // 4, 1))
+            ], batch_size=self.batch_size)
+            AdvancedCatalogModel.objects.bulk_create([
+                AdvancedCatalogModel(name=f'Modelo {i}', product=self.random.choice(catalog_products),
+                                     price=Decimal(self.random.randint(1000, 900000)) / 100)
+                for i in range(size)
+            ], batch_size=self.batch_size)
+        self.log(f'Catálogo de benchmark: {size} proveedores, productos y modelos')
+
+    def create_usage_logs(self, count, subscriptions, bench_user_id, days):
+        """
+        Logs por lotes, cada uno en su transacción. El usuario de benchmark recibe
+        ~1% para que get_agent_stats y el dashboard agreguen volúmenes reales.
+        """
+        bench_subscriptions = [pair for pair in subscriptions if pair[0] == bench_user_id]
+        max_age = days * 86400
+        created = 0
+        while created < count:
+            batch = []
+            for _ in range(min(self.batch_size, count - created)):
+                user_id, agent_id = self.random.choice(
+                    bench_subscriptions if self.random.random() < 0.01 else subscriptions)
+                success = self.random.random() < 0.92
+                batch.append(AgentUsageLog(
+                    user_id=user_id, agent_id=agent_id,
+                    execution_id=f'{PREFIX}-{created + len(batch)}',
+                    input_data={'message': 'Hola, necesito una cotización', 'channel': 'whatsapp',
+                                'customer_id': self.random.randint(1, 100000)},
+                    output_data={'response': 'Con gusto, estos son los precios disponibles... ' * 4,
+                                 'tokens': self.random.randint(50, 2000)} if success else {},
+                    execution_time=round(self.random.lognormvariate(0, 0.8), 3),
+                    success=success,
+                    error_message=None if success else self.random.choice(ERRORS),
+                ))
+            with transaction.atomic():
+                logs = AgentUsageLog.objects.bulk_create(batch)
+                # created_at es auto_now_add: se reparte en el tiempo con un único UPDATE
+                # por lote (bulk_update generaría un CASE con una rama por fila)
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f'UPDATE {AgentUsageLog._meta.db_table} AS log SET created_at = v.created_at '
+                        'FROM unnest(%s::bigint[], %s::timestamptz[]) AS v(id, created_at) WHERE log.id = v.id',
+                        [[log.id for log in logs],
+                         [self.now - timedelta(seconds=self.random.randint(0, max_age)) for _ in logs]],
+                    )
+            created += len(batch)
+            self.log(f'{created}/{count} logs de uso')
+
+    def create_blog_posts(self, count):
+        sections = {
+            field: f'Texto de carga para {field}. ' * 20
+            for field in ('problem_section', 'why_automate_section', 'sales_angle_section', 'how_it_works_section',
+                          'benefits_section', 'hypothetical_case_section', 'final_cta_section')
+        }
+        BlogPost.objects.bulk_create([
+            BlogPost(title=f'{PREFIX} Entrada {i}', slug=f'{PREFIX}-entrada-{i}', is_published=True,
+                     excerpt='Resumen de una entrada de carga.', **sections)
+            for i in range(count)
+        ], batch_size=self.batch_size)
+        self.log(f'{count} entradas del blog')
+
+    def create_media_file(self):
+        if not default_storage.exists(BENCH_MEDIA_PATH):
+            default_storage.save(BENCH_MEDIA_PATH, ContentFile(self.random.randbytes(64 * 1024)))
+        self.log(f'Archivo de media: {BENCH_MEDIA_PATH}')
+
+    def flush(self):
+        # Los logs primero con DELETE directos: el borrado en cascada de millones de filas
+        # desde User/Agent cargaría cada objeto en memoria. QuerySet.delete() de los logs
+        # también los cargaría (el colector sigue la cascada a AgentUsageLogPayload), así
+        # que se borran antes los payloads (sin relaciones: un solo DELETE) y luego los
+        # logs con _raw_delete, sin colector ni señales
+        logs = AgentUsageLog.objects.filter(agent__n8n_workflow_id__startswith=f'{PREFIX}-')
+        AgentUsageLogPayload.objects.filter(log__in=logs).delete()
+        deleted = logs._raw_delete(logs.db)
+        self.log(f'{deleted} logs de uso eliminados')
+        User.objects.filter(username__startswith=f'{PREFIX}_').delete()
+        Agent.objects.filter(n8n_workflow_id__startswith=f'{PREFIX}-').delete()
+        AgentCategory.objects.filter(name__startswith=f'{PREFIX} ').delete()
+        BlogPost.objects.filter(slug__startswith=f'{PREFIX}-').delete()
+        if default_storage.exists(BENCH_MEDIA_PATH):
+            default_storage.delete(BENCH_MEDIA_PATH)
+        self.stdout.write(self.style.SUCCESS('Datos de carga eliminados'))
@@ -0,0 +1,58 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from iacol_project.startup import PROCESSES, StartupProbeError, compare_startup, profile_startup
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide el arranque en frío de los procesos web (django.setup() + URLconf) y celery (django.setup() + '
+        'módulos de tareas) en intérpretes nuevos y lista los imports más lentos de cada fase '
+        '(python -X importtime). Emite el resultado en JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--process', action='append', choices=list(PROCESSES), dest='processes',
+                            help='Proceso a medir (repetible); por defecto todos')
+        parser.add_argument('--repeat', type=int, default=5, help='Arranques medidos por proceso (se usa la mediana)')
+        parser.add_argument('--top', type=int, default=15, help='Imports por fase en el resultado')
+        parser.add_argument('--output', help='Fichero JSON de resultados (por defecto la salida estándar)')
+        parser.add_argument('--compare', metavar='BASELINE', help='JSON de una ejecución anterior')
+        parser.add_argument('--max-regression', type=float,
+                            help='Falla si el arranque de un proceso empeora más de este porcentaje respecto a --compare')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat debe ser al menos 1')
+        try:
+            results = profile_startup(options['processes'], options['repeat'], options['top'])
+        except StartupProbeError as e:
+            raise CommandError(f'El arranque falló: {e}')
+
+        for process, result in results['processes'].items():
+            self.stderr.write(f'{process:<10} {result["total"]["median_ms"]:>8.1f} ms')
+            for phase, timing in result['phases'].items():
+                self.stderr.write(f'  {phase:<14} {timing["median_ms"]:>8.1f} ms')
+                for entry in result['slowest_imports'].get(phase, [])[:5]:
+                    self.stderr.write(f'      {entry["module"]:<40} {entry["cumulative_ms"]:>8.1f} ms')
+
+        output = json.dumps(results, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.stderr.write(f'Resultados en {options["output"]}')
+        else:
+            self.stdout.write(output)
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+            regressions = []
+            for process, old, new, change in compare_startup(baseline, results):
+                line = f'{process:<10} {old:>8} -> {new:<8} {change:+.1f}%'
+                self.stderr.write(self.style.ERROR(line) if change > 0 else line)
+                if options['max_regression'] is not None and change > options['max_regression']:
+                    regressions.append(f'{process} ({change:+.1f}%)')
+            if regressions:
+                raise CommandError(f'Arranque por encima del {options["max_regression"]}%: {", ".join(regressions)}')
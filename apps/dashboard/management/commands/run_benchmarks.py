@@ -0,0 +1,52 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from iacol_project.benchmark import SCENARIOS, BenchmarkSetupError, compare_results, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        'Ejecuta la suite de benchmarks sobre los datos de generate_load_data y emite el resultado en JSON. '
+        'Con --compare muestra la diferencia con una ejecución anterior.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', action='append', choices=list(SCENARIOS), dest='scenarios',
+                            help='Escenario a ejecutar (repetible); por defecto todos')
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--output', help='Fichero JSON de resultados (por defecto la salida estándar)')
+        parser.add_argument('--compare', metavar='BASELINE', help='JSON de una ejecución anterior')
+        parser.add_argument('--max-regression', type=float,
+                            help='Falla si p95 empeora más de este porcentaje respecto a --compare')
+
+    def handle(self, *args, **options):
+        try:
+            results = run_benchmarks(options['scenarios'], options['iterations'], options['warmup'])
+        except BenchmarkSetupError as e:
+            raise CommandError(str(e))
+
+        failed = [name for name, result in results['scenarios'].items() if result['errors']]
+        output = json.dumps(results, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.stderr.write(f'Resultados en {options["output"]}')
+        else:
+            self.stdout.write(output)
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+            regressions = []
+            for name, metric, old, new, change in compare_results(baseline, results):
+                line = f'{name:<24} {metric:<14} {old:>10} -> {new:<10} {change:+.1f}%'
+                self.stderr.write(self.style.ERROR(line) if change > 0 else line)
+                if metric == 'p95_ms' and options['max_regression'] is not None and change > options['max_regression']:
+                    regressions.append(f'{name} ({change:+.1f}%)')
+            if regressions:
+                raise CommandError(f'Regresión de p95 por encima del {options["max_regression"]}%: {", ".join(regressions)}')
+
+        if failed:
+            raise CommandError(f'Escenarios con respuestas inesperadas: {", ".join(failed)}')
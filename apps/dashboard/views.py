@@ -8,14 +8,16 @@ import logging
 import traceback
 
 from apps.agents.models import UserSubscription, AgentUsageLog, Agent, AgentConfiguration
+from iacol_project.querybudget import query_budget
 
 logger = logging.getLogger(__name__)
 
 @login_required
+@query_budget(8)
 def dashboard_home(request):
     """Dashboard principal del usuario"""
     try:
-        logger.info(f"[DASHBOARD] Iniciando dashboard para usuario: {request.user.email}")
+        logger.debug("[DASHBOARD] Iniciando dashboard para usuario: %s", request.user.pk)
         
         # Verificar si el usuario está autenticado correctamente
         if not request.user.is_authenticated:
@@ -26,18 +28,18 @@ def dashboard_home(request):
         # CRITICAL-001: Optimización - Una sola consulta con select_related y annotate
         try:
             # Query optimizada que combina todas las estadísticas en una sola consulta
-            dashboard_data = UserSubscription.objects.filter(
+            dashboard_data = UserSubscription.objects.active().filter(
                 user=request.user,
-                status='active',
                 agent__is_active=True
-            ).select_related('agent').prefetch_related('agent__agentusagelog_set')
+            ).select_related('agent')
 
             user_subscriptions = list(dashboard_data)
-            logger.info(f"[DASHBOARD] Suscripciones encontradas: {len(user_subscriptions)}")
+            logger.debug("[DASHBOARD] Suscripciones encontradas: %d", len(user_subscriptions))
 
-            # Debug: Log all subscriptions for this user
-            all_subs = UserSubscription.objects.filter(user=request.user).values('agent__name', 'status', 'agent__is_active')
-            logger.info(f"[DASHBOARD] Todas las suscripciones del usuario: {list(all_subs)}")
+            # Debug: Log all subscriptions for this user (consulta extra solo con DEBUG)
+            if logger.isEnabledFor(logging.DEBUG):
+                all_subs = UserSubscription.objects.filter(user=request.user).values('agent__name', 'status', 'agent__is_active')
+                logger.debug("[DASHBOARD] Todas las suscripciones del usuario: %s", list(all_subs))
             
             # Obtener configuraciones de una sola vez
             if user_subscriptions:
@@ -54,7 +56,7 @@ def dashboard_home(request):
                 existing_configs = set()
                 
         except Exception as e:
-            logger.error(f"[DASHBOARD] Error al obtener suscripciones: {str(e)}\n{traceback.format_exc()}")
+            logger.exception("[DASHBOARD] Error al obtener suscripciones: %s", e)
             user_subscriptions = []
             existing_configs = set()
             
@@ -62,11 +64,11 @@ def dashboard_home(request):
         try:
             recent_logs = AgentUsageLog.objects.filter(
                 user=request.user
-            ).select_related('agent').order_by('-created_at')[:5]
+            ).select_related('agent').defer('input_data', 'output_data').order_by('-created_at')[:5]
             total_executions = AgentUsageLog.objects.filter(user=request.user).count()
-            logger.info(f"[DASHBOARD] Total de ejecuciones: {total_executions}")
+            logger.debug("[DASHBOARD] Total de ejecuciones: %d", total_executions)
         except Exception as e:
-            logger.error(f"[DASHBOARD] Error al obtener estadísticas: {str(e)}\n{traceback.format_exc()}")
+            logger.exception("[DASHBOARD] Error al obtener estadísticas: %s", e)
             total_executions = 0
             recent_logs = []
         
@@ -77,7 +79,7 @@ def dashboard_home(request):
             'recent_logs': recent_logs,
         }
         
-        logger.info("[DASHBOARD] Renderizando plantilla dashboard")
+        logger.debug("[DASHBOARD] Renderizando plantilla dashboard")
         return render(request, 'dashboard/home.html', context)
         
     except DatabaseError as e:
@@ -1,5 +1,7 @@
 from django.contrib import admin
+from django.db import transaction
 from django.utils.html import format_html
+from functools import partial
 from .models import BlogPost, APIKey
 
 
@@ -77,6 +79,13 @@ class BlogPostAdmin(admin.ModelAdmin):
         # Personalizar widgets si es necesario
         return form
 
+    def save_model(self, request, obj, form, change):
+        """Encola la copia local optimizada de imágenes nuevas o URLs externas cambiadas"""
+        super().save_model(request, obj, form, change)
+        if obj.needs_image_ingestion():
+            from .tasks import queue_image_ingestion  # Pillow/requests solo al guardar, no al cargar el admin
+            transaction.on_commit(partial(queue_image_ingestion, obj.pk))
+
     # Mostrar preview de imágenes en el admin
     def hero_image_preview(self, obj):
         if obj.hero_image:
@@ -93,10 +102,10 @@ class APIKeyAdmin(admin.ModelAdmin):
     """
     Admin interface for API keys management.
     """
-    list_display = ('name', 'key_preview', 'is_active', 'created_by', 'created_at')
+    list_display = ('name', 'key_preview', 'is_active', 'created_by', 'created_at', 'last_used_at')
     list_filter = ('is_active', 'created_at', 'created_by')
     search_fields = ('name', 'key', 'created_by__username')
-    readonly_fields = ('key', 'created_at')
+    readonly_fields = ('key', 'created_at', 'last_used_at')
 
     fieldsets = (
         ('Información Básica', {
@@ -107,7 +116,7 @@ class APIKeyAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
         ('Fechas', {
-            'fields': ('created_at',),
+            'fields': ('created_at', 'last_used_at'),
             'classes': ('collapse',)
         }),
     )
@@ -119,6 +128,14 @@ class APIKeyAdmin(admin.ModelAdmin):
         return '-'
     key_preview.short_description = 'Clave API'
 
+    actions = ['revoke_keys']
+
+    def revoke_keys(self, request, queryset):
+        """Desactiva las claves seleccionadas (APIKeyQuerySet.update las invalida en cache)"""
+        updated = queryset.update(is_active=False)
+        self.message_user(request, f'{updated} claves API revocadas.')
+    revoke_keys.short_description = 'Revocar claves seleccionadas'
+
     def get_queryset(self, request):
         """Only show API keys created by the current user, unless superuser"""
         qs = super().get_queryset(request)
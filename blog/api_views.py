@@ -3,16 +3,35 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
-from django_ratelimit.decorators import ratelimit
+from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
+from django.conf import settings
+from django.db import IntegrityError, transaction
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from .serializers import BlogPostSerializer
 from .authentication import APIKeyAuthentication
+from iacol_project.ratelimit import rate_limit
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def serialize_created_post(request, blog_post):
+    """Datos de respuesta para un post recién creado"""
+    # Construct URL manually to avoid reverse issues
+    blog_url = f"/blog/{blog_post.slug}/"
+    return {
+        'id': blog_post.id,
+        'title': blog_post.title,
+        'slug': blog_post.slug,
+        'url': request.build_absolute_uri(blog_url),
+        'is_published': blog_post.is_published,
+        'category': blog_post.category,
+        'created_at': blog_post.published_date.isoformat(),
+    }
+
+
 class BlogPostCreateAPIView(APIView):
     """
     API endpoint for creating blog posts from external services (N8N).
@@ -23,12 +42,14 @@ class BlogPostCreateAPIView(APIView):
 
     authentication_classes = [APIKeyAuthentication]
     permission_classes = [IsAuthenticated]
+    parser_classes = [JSONParser, MultiPartParser, FormParser]
 
-    @method_decorator(ratelimit(key='user', rate='10/m', method='POST'))
     @method_decorator(csrf_exempt)
     def dispatch(self, *args, **kwargs):
         return super().dispatch(*args, **kwargs)
 
+    # Se limita en post() y no en dispatch() para que request.auth ya tenga la API key
+    @method_decorator(rate_limit(key='api_key', rate='10/m'))
     def post(self, request):
         """
         Create a new blog post.
@@ -51,6 +72,7 @@ class BlogPostCreateAPIView(APIView):
             // Image options (choose one per image type):
             "hero_image_url": "https://example.com/image.jpg",
             "hero_image_base64": "data:image/jpeg;base64,...",
+            // or multipart/form-data with a binary "hero_image_file" part
 
             "problem_image_url": "https://example.com/image.jpg",
             "agent_diagram_image_url": "https://example.com/diagram.jpg",
@@ -71,22 +93,10 @@ class BlogPostCreateAPIView(APIView):
                 # Log successful creation
                 logger.info(f"Blog post created successfully: {blog_post.title} (ID: {blog_post.id})")
 
-                # Construct URL manually to avoid reverse issues
-                blog_url = f"/blog/{blog_post.slug}/"
-                absolute_url = request.build_absolute_uri(blog_url)
-
                 response_data = {
                     'success': True,
                     'message': 'Blog post created successfully',
-                    'data': {
-                        'id': blog_post.id,
-                        'title': blog_post.title,
-                        'slug': blog_post.slug,
-                        'url': absolute_url,
-                        'is_published': blog_post.is_published,
-                        'category': blog_post.category,
-                        'created_at': blog_post.published_date.isoformat(),
-                    }
+                    'data': serialize_created_post(request, blog_post),
                 }
 
                 return Response(response_data, status=status.HTTP_201_CREATED)
@@ -112,6 +122,114 @@ class BlogPostCreateAPIView(APIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class BlogPostBulkCreateAPIView(APIView):
+    """
+    API endpoint for creating several blog posts in one request (N8N batches).
+
+    Authentication: API Key via X-API-Key header or Authorization: Bearer <key>
+    Rate limiting: 10 requests per minute per API key
+    All posts are validated first and created in a single transaction.
+    """
+
+    authentication_classes = [APIKeyAuthentication]
+    permission_classes = [IsAuthenticated]
+    parser_classes = [JSONParser, MultiPartParser, FormParser]
+
+    @method_decorator(csrf_exempt)
+    def dispatch(self, *args, **kwargs):
+        return super().dispatch(*args, **kwargs)
+
+    def get_posts_data(self, request):
+        """
+        Accepts {"posts": [...]} or a bare list as JSON. With multipart/form-data,
+        "posts" is a JSON string and files are sent as "<field>[<index>]",
+        e.g. "hero_image_file[0]".
+        """
+        data = request.data
+        if isinstance(data, list):
+            return data
+
+        posts = data.get('posts')
+        if isinstance(posts, str):
+            posts = json.loads(posts)
+        if not isinstance(posts, list):
+            return None
+
+        for index, post in enumerate(posts):
+            if not isinstance(post, dict):
+                continue
+            for field_name in ('hero_image_file', 'problem_image_file'):
+                uploaded = request.FILES.get(f'{field_name}[{index}]')
+                if uploaded:
+                    post[field_name] = uploaded
+        return posts
+
+    @method_decorator(rate_limit(key='api_key', rate='10/m'))
+    def post(self, request):
+        """
+        Create several blog posts.
+
+        Expected JSON payload:
+        {
+            "posts": [
+                {"title": "...", "category": "guias", ...},
+                {"title": "...", "category": "casos", "hero_image_base64": "data:image/png;base64,..."}
+            ]
+        }
+        """
+        try:
+            posts_data = self.get_posts_data(request)
+        except (TypeError, ValueError):
+            posts_data = None
+        if posts_data is None:
+            return Response({
+                'success': False,
+                'message': 'Validation failed',
+                'errors': {'posts': ['Se esperaba una lista de posts']}
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = BlogPostSerializer(
+            data=posts_data,
+            many=True,
+            allow_empty=False,
+            max_length=settings.BLOG_API_BULK_MAX_POSTS,
+        )
+        if not serializer.is_valid():
+            logger.warning("Bulk blog post validation failed: %s", serializer.errors)
+            return Response({
+                'success': False,
+                'message': 'Validation failed',
+                'errors': serializer.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            with transaction.atomic():
+                blog_posts = serializer.save()
+        except IntegrityError as e:
+            # Carrera con otra petición que creó el mismo slug
+            logger.warning("Bulk blog post creation conflict: %s", e)
+            return Response({
+                'success': False,
+                'message': 'Conflict creating posts',
+                'error': 'Uno o más posts ya existen'
+            }, status=status.HTTP_409_CONFLICT)
+        except Exception as e:
+            logger.error("Unexpected error creating blog posts in bulk: %s", e, exc_info=True)
+            return Response({
+                'success': False,
+                'message': 'Internal server error',
+                'error': str(e) if request.user.is_staff else 'An unexpected error occurred'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        logger.info("%s blog posts created in bulk by API user: %s", len(blog_posts), request.user.username)
+
+        return Response({
+            'success': True,
+            'message': f'{len(blog_posts)} blog posts created successfully',
+            'data': [serialize_created_post(request, blog_post) for blog_post in blog_posts],
+        }, status=status.HTTP_201_CREATED)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def api_status(request):
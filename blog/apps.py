@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class BlogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'blog'
+
+    def ready(self):
+        # En todos los procesos: revocar o borrar una API key la invalida en la cache de autenticación
+        from .authentication import connect_signals
+        connect_signals()
@@ -1,12 +1,168 @@
+import logging
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import request_finished
+from django.db.models import Case, DateTimeField, Q, Value, When
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
 from rest_framework import authentication, exceptions
-from django.db import models
+
 from .models import APIKey
 
+logger = logging.getLogger(__name__)
+
+CACHE_KEY_PREFIX = 'blog:apikey:'
+DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+
+# Cache en memoria del proceso: digest -> (APIKey con created_by, expira en)
+_local_cache = {}
+_local_lock = threading.Lock()
+
+# Uso pendiente de registrar: APIKey.pk -> último uso
+_pending_usage = {}
+_usage_lock = threading.Lock()
+_last_usage_flush = time.monotonic()
+
+
+def _cache_key(digest):
+    return f"{CACHE_KEY_PREFIX}{digest}"
+
+
+def invalidate_api_keys(digests):
+    """
+    Elimina las claves de ambas caches. Se llama desde las señales de APIKey y
+    desde APIKeyQuerySet.update(); los demás procesos las descartan de su
+    memoria al vencer BLOG_API_KEY_LOCAL_CACHE_TIMEOUT.
+    """
+    digests = [digest for digest in digests if digest]
+    if not digests:
+        return
+    with _local_lock:
+        for digest in digests:
+            _local_cache.pop(digest, None)
+    try:
+        cache.delete_many([_cache_key(digest) for digest in digests])
+    except Exception as e:
+        logger.warning("No se pudo invalidar la API key en cache: %s", e)
+
+
+def invalidate_api_key_cache(digest):
+    invalidate_api_keys([digest])
+
+
+def _invalidate_instance(sender, instance, **kwargs):
+    invalidate_api_key_cache(instance.key)
+
+
+def _invalidate_user_keys(sender, instance, created=False, update_fields=None, **kwargs):
+    # Las claves en cache llevan su created_by: un cambio del usuario (is_staff,
+    # is_active...) no debe esperar al timeout. El login solo toca last_login.
+    if created or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    invalidate_api_keys(APIKey.objects.filter(created_by=instance).values_list('key', flat=True))
+
+
+def connect_signals():
+    """
+    Desde BlogConfig.ready(). post_delete también se envía en los borrados en
+    cascada (al borrar el usuario) y en la acción "eliminar seleccionados" del admin.
+    El uso de las claves se escribe al terminar las peticiones.
+    """
+    post_save.connect(_invalidate_instance, sender=APIKey, dispatch_uid='blog_apikey_saved')
+    post_delete.connect(_invalidate_instance, sender=APIKey, dispatch_uid='blog_apikey_deleted')
+    post_save.connect(_invalidate_user_keys, sender='auth.User', dispatch_uid='blog_apikey_user_saved')
+    # El uso pendiente al apagar un worker lo escribe gunicorn.conf.py (worker_exit)
+    request_finished.connect(flush_api_key_usage_if_due, dispatch_uid='blog_apikey_usage_flush')
+
+
+def get_api_key_by_digest(digest, raw_key=None):
+    """
+    Resuelve una API key activa a partir de su SHA-256 (memoria del proceso,
+    luego Redis, luego la base de datos por el índice único de `key`).
+
+    Con `raw_key` también acepta una clave guardada en claro, mientras la
+    migración 0008_hash_plaintext_api_keys no se haya aplicado. Nunca para un
+    valor con forma de digest: enviar el digest guardado no autentica.
+    """
+    now = time.monotonic()
+    with _local_lock:
+        entry = _local_cache.get(digest)
+    if entry and entry[1] > now:
+        return entry[0]
+
+    key_obj = None
+    try:
+        key_obj = cache.get(_cache_key(digest))
+    except Exception as e:
+        logger.warning("Cache no disponible para autenticar API key: %s", e)
+
+    if key_obj is None:
+        lookup = Q(key=digest)
+        if raw_key and not DIGEST_RE.match(raw_key):
+            lookup |= Q(key=raw_key)
+        key_obj = APIKey.objects.select_related('created_by').filter(lookup, is_active=True).first()
+        if key_obj is None:
+            return None
+        try:
+            cache.set(_cache_key(digest), key_obj, settings.BLOG_API_KEY_CACHE_TIMEOUT)
+        except Exception as e:
+            logger.warning("No se pudo guardar la API key en cache: %s", e)
+
+    with _local_lock:
+        _local_cache[digest] = (key_obj, now + settings.BLOG_API_KEY_LOCAL_CACHE_TIMEOUT)
+    return key_obj
+
+
+def record_api_key_usage(key_obj):
+    """
+    Acumula el último uso de la clave; se escribe en lote al terminar una
+    petición cada BLOG_API_KEY_USAGE_FLUSH_INTERVAL segundos, no en cada una.
+    """
+    with _usage_lock:
+        _pending_usage[key_obj.pk] = timezone.now()
+
+
+def flush_api_key_usage_if_due(**kwargs):
+    """Receptor de request_finished: escribe el uso pendiente si venció el intervalo"""
+    global _last_usage_flush
+    now = time.monotonic()
+    with _usage_lock:
+        if not _pending_usage or now - _last_usage_flush < settings.BLOG_API_KEY_USAGE_FLUSH_INTERVAL:
+            return
+        _last_usage_flush = now
+    flush_api_key_usage()
+
+
+def flush_api_key_usage():
+    """Escribe en un solo UPDATE el último uso acumulado de las API keys"""
+    with _usage_lock:
+        pending = dict(_pending_usage)
+        _pending_usage.clear()
+    if not pending:
+        return 0
+
+    try:
+        return APIKey.objects.filter(pk__in=pending).update(last_used_at=Case(
+            *[When(pk=pk, then=Value(used_at)) for pk, used_at in pending.items()],
+            output_field=DateTimeField(),
+        ))
+    except Exception as e:
+        logger.warning("No se pudo registrar el uso de %d API keys: %s", len(pending), e)
+        return 0
+
 
 class APIKeyAuthentication(authentication.BaseAuthentication):
     """
     Custom authentication class for API key authentication.
     Expects 'X-API-Key' header with the API key.
+
+    Keys are looked up by their SHA-256 digest (plaintext legacy keys only until
+    migration 0008 hashes them), and the resolved key is cached so repeated
+    calls don't hit the database.
     """
 
     def authenticate(self, request):
@@ -15,18 +171,12 @@ class APIKeyAuthentication(authentication.BaseAuthentication):
         if not api_key:
             return None  # No authentication attempted
 
-        try:
-            hashed = APIKey._hash_key(api_key)
-            key_obj = APIKey.objects.select_related('created_by').filter(
-                is_active=True
-            ).filter(
-                models.Q(key=api_key) | models.Q(key=hashed)
-            ).first()
-            if not key_obj:
-                raise APIKey.DoesNotExist
-        except APIKey.DoesNotExist:
+        key_obj = get_api_key_by_digest(APIKey._hash_key(api_key), raw_key=api_key)
+        if key_obj is None:
             raise exceptions.AuthenticationFailed('Invalid API key')
 
+        record_api_key_usage(key_obj)
+
         # Return (user, auth) tuple
         return (key_obj.created_by, key_obj)
 
@@ -0,0 +1,276 @@
+"""
+Utilidades de imágenes del blog.
+
+La API solo hace validaciones baratas (tamaño, tipo declarado) y deja el payload
+en un área de staging; la decodificación, validación con Pillow y normalización
+se ejecutan en segundo plano desde blog.tasks.
+"""
+import base64
+import binascii
+import hashlib
+import io
+import ipaddress
+import os
+import socket
+import uuid
+from urllib.parse import urlparse
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+# Campos de imagen de BlogPost que se procesan en segundo plano
+IMAGE_FIELDS = ('hero_image', 'problem_image')
+
+# Formatos aceptados (formato Pillow -> extensión)
+ALLOWED_FORMATS = {
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'GIF': 'gif',
+    'WEBP': 'webp',
+}
+ALLOWED_CONTENT_TYPES = {'image/jpeg', 'image/jpg', 'image/png', 'image/gif', 'image/webp'}
+
+STAGING_DIR = 'blog/incoming'
+BASE64_SUFFIX = '.b64'
+REMOTE_DIR = 'blog/remote'
+VARIANTS_DIR = 'blog/variants'
+
+
+class ImageProcessingError(ValueError):
+    """La imagen recibida no es válida o no se pudo procesar"""
+
+
+def stage_image_payload(payload):
+    """
+    Guarda el payload sin procesar (string base64 o archivo subido) en el staging
+    y retorna su nombre en el storage.
+    """
+    if isinstance(payload, str):
+        name = f"{STAGING_DIR}/{uuid.uuid4().hex}{BASE64_SUFFIX}"
+        return default_storage.save(name, ContentFile(payload.encode()))
+
+    ext = os.path.splitext(payload.name or '')[1].lower() or '.bin'
+    name = f"{STAGING_DIR}/{uuid.uuid4().hex}{ext}"
+    return default_storage.save(name, payload)
+
+
+def read_staged_image(staged_name):
+    """Lee un payload del staging y retorna los bytes de la imagen"""
+    with default_storage.open(staged_name, 'rb') as staged_file:
+        raw = staged_file.read()
+    if staged_name.endswith(BASE64_SUFFIX):
+        return decode_base64_image(raw.decode('ascii', errors='ignore'))
+    return raw
+
+
+def decode_base64_image(base64_string):
+    """Decodifica un string base64 (con o sin prefijo data URL)"""
+    if ',' in base64_string:
+        base64_string = base64_string.split(',', 1)[1]
+    try:
+        return base64.b64decode(base64_string)
+    except (ValueError, binascii.Error) as e:
+        raise ImageProcessingError(f"Base64 inválido: {e}")
+
+
+def base64_content_type(base64_string):
+    """Retorna el content type declarado en un data URL, o None si no trae cabecera"""
+    if not base64_string.startswith('data:') or ',' not in base64_string:
+        return None
+    return base64_string[5:].split(',', 1)[0].split(';', 1)[0].lower()
+
+
+def normalize_image(data, max_bytes=None, max_dimension=None):
+    """
+    Valida los bytes de una imagen con Pillow y la reduce si excede la dimensión
+    máxima. Retorna (bytes, extensión).
+    """
+    # Pillow se importa al procesar, no al cargar las tareas en cada worker de Celery
+    from PIL import Image, UnidentifiedImageError
+
+    max_bytes = max_bytes or settings.BLOG_IMAGE_MAX_BYTES
+    max_dimension = max_dimension or settings.BLOG_IMAGE_MAX_DIMENSION
+
+    if not data:
+        raise ImageProcessingError("La imagen está vacía")
+    if len(data) > max_bytes:
+        raise ImageProcessingError(f"La imagen supera el tamaño permitido ({max_bytes // (1024 * 1024)}MB)")
+
+    try:
+        # verify() detecta archivos corruptos pero deja la imagen inutilizable, por eso se reabre
+        with Image.open(io.BytesIO(data)) as probe:
+            probe.verify()
+        image = Image.open(io.BytesIO(data))
+        image_format = image.format
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise ImageProcessingError(f"Archivo de imagen inválido: {e}")
+
+    if image_format not in ALLOWED_FORMATS:
+        raise ImageProcessingError(f"Formato de imagen no permitido: {image_format}")
+
+    ext = ALLOWED_FORMATS[image_format]
+    if max(image.size) <= max_dimension or getattr(image, 'is_animated', False):
+        return data, ext
+
+    image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+
+    output = io.BytesIO()
+    save_kwargs = {'optimize': True}
+    if image_format in ('JPEG', 'WEBP'):
+        save_kwargs['quality'] = 85
+    image.save(output, image_format, **save_kwargs)
+    return output.getvalue(), ext
+
+
+def _public_address(hostname):
+    """
+    IP a la que conectar para descargar de `hostname`, o None si alguna de sus
+    direcciones no es pública: evita alcanzar servicios internos (SSRF)
+    """
+    try:
+        addresses = [info[4][0].split('%', 1)[0] for info in socket.getaddrinfo(hostname, None)]
+    except socket.gaierror:
+        return None
+    if not addresses or not all(ipaddress.ip_address(address).is_global for address in addresses):
+        return None
+    return addresses[0]
+
+
+class PinnedHostAdapter(HTTPAdapter):
+    """Conecta a una IP ya validada y verifica TLS (SNI y certificado) contra el nombre original"""
+
+    def __init__(self, hostname, **kwargs):
+        self.hostname = hostname
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs.update(server_hostname=self.hostname, assert_hostname=self.hostname)
+        super().init_poolmanager(*args, **kwargs)
+
+
+def _get_pinned(url, address, timeout):
+    """
+    GET de `url` conectando a `address` con la cabecera Host original. Sin
+    volver a resolver el nombre, un DNS que cambie de respuesta tras la
+    validación (DNS rebinding) no puede redirigir la conexión a una IP interna.
+    """
+    parsed = urlparse(url)
+    host = f'[{address}]' if ':' in address else address
+    pinned_url = parsed._replace(netloc=f'{host}:{parsed.port}' if parsed.port else host).geturl()
+    session = requests.Session()
+    session.mount(f'{parsed.scheme}://', PinnedHostAdapter(parsed.hostname))
+    return session.get(pinned_url, timeout=timeout, stream=True, allow_redirects=False, headers={
+        'Host': parsed.netloc.rsplit('@', 1)[-1],
+        'User-Agent': 'IACOL-ImageFetcher/1.0',
+        'Accept': 'image/*',
+    })
+
+
+def fetch_remote_image(url, max_bytes=None, timeout=10, max_redirects=3):
+    """
+    Descarga una imagen remota en streaming con límite de tamaño.
+    Lanza ImageProcessingError si la URL o el contenido no son válidos y
+    requests.RequestException ante errores de red (reintentables).
+    """
+    max_bytes = max_bytes or settings.BLOG_IMAGE_MAX_BYTES
+
+    # Las redirecciones se siguen manualmente para validar cada host
+    for _ in range(max_redirects + 1):
+        parsed = urlparse(url)
+        if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+            raise ImageProcessingError(f"URL de imagen no soportada: {url}")
+        address = _public_address(parsed.hostname)
+        if address is None:
+            raise ImageProcessingError(f"Host de imagen no permitido: {parsed.hostname}")
+
+        response = _get_pinned(url, address, timeout)
+        if not response.is_redirect:
+            break
+        url = requests.compat.urljoin(url, response.headers['location'])
+        response.close()
+    else:
+        raise ImageProcessingError("Demasiadas redirecciones al descargar la imagen")
+
+    with response:
+        if 400 <= response.status_code < 500:
+            raise ImageProcessingError(f"La URL de imagen respondió {response.status_code}")
+        response.raise_for_status()
+
+        content_type = response.headers.get('content-type', '').split(';', 1)[0].strip().lower()
+        if content_type and content_type not in ALLOWED_CONTENT_TYPES:
+            raise ImageProcessingError(f"Tipo de imagen no permitido: {content_type}")
+
+        content_length = response.headers.get('content-length')
+        if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+            raise ImageProcessingError("La imagen remota supera el tamaño permitido")
+
+        buffer = io.BytesIO()
+        for chunk in response.iter_content(chunk_size=8192):
+            buffer.write(chunk)
+            if buffer.tell() > max_bytes:
+                raise ImageProcessingError("La imagen remota supera el tamaño permitido")
+        return buffer.getvalue()
+
+
+def store_image_file(data, directory, ext, suffix=''):
+    """
+    Guarda bytes en el storage. Con BLOG_IMAGE_DEDUPLICATE el nombre es el
+    SHA-256 del contenido y un archivo ya existente se reutiliza.
+    """
+    if settings.BLOG_IMAGE_DEDUPLICATE:
+        digest = hashlib.sha256(data).hexdigest()
+        name = f"{directory}/{digest[:2]}/{digest}{suffix}.{ext}"
+        if default_storage.exists(name):
+            return name
+    else:
+        name = f"{directory}/{uuid.uuid4().hex}{suffix}.{ext}"
+    return default_storage.save(name, ContentFile(data))
+
+
+def build_image_variants(data, source, original=None):
+    """
+    Valida la imagen, guarda una copia local del original (si no se indica uno
+    ya almacenado) y genera variantes WebP responsivas. Retorna la entrada
+    para BlogPost.image_variants.
+    """
+    from PIL import Image
+
+    data, ext = normalize_image(data)
+    if original is None:
+        original = store_image_file(data, REMOTE_DIR, ext)
+
+    image = Image.open(io.BytesIO(data))
+    if getattr(image, 'is_animated', False):
+        # Los GIF animados se sirven tal cual desde la copia local
+        return {'source': source, 'original': original, 'src': original, 'variants': {}}
+
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if image.has_transparency_data else 'RGB')
+
+    # Nunca se amplía: anchos configurados menores al original, más el mayor posible
+    width = image.size[0]
+    configured = settings.BLOG_IMAGE_VARIANT_WIDTHS
+    widths = sorted({w for w in configured if w < width} | {min(width, max(configured))})
+
+    variants = {}
+    for variant_width in widths:
+        variant = image
+        if variant_width < width:
+            variant_height = max(1, round(image.size[1] * variant_width / width))
+            variant = image.resize((variant_width, variant_height), Image.Resampling.LANCZOS)
+        output = io.BytesIO()
+        variant.save(output, 'WEBP', quality=80, method=6)
+        # Con deduplicación el nombre ya depende del contenido de la variante
+        variants[str(variant_width)] = store_image_file(output.getvalue(), VARIANTS_DIR, 'webp', suffix=f'-{variant_width}')
+
+    return {
+        'source': source,
+        'original': original,
+        'src': variants[str(widths[-1])],
+        'variants': variants,
+    }
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from blog.models import BlogPost
+from blog.tasks import ingest_blog_post_images
+
+
+class Command(BaseCommand):
+    help = 'Crea copias locales optimizadas de las imágenes de los posts que aún no las tienen'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sync', action='store_true', help='Procesar en este proceso en lugar de encolar en Celery')
+
+    def handle(self, *args, **options):
+        pending = [post for post in BlogPost.objects.iterator() if post.needs_image_ingestion()]
+        self.stdout.write(f'Posts con imágenes pendientes: {len(pending)}')
+
+        for post in pending:
+            if options['sync']:
+                result = ingest_blog_post_images.apply(args=(post.pk,))
+                if result.failed():
+                    self.stdout.write(self.style.ERROR(f'  {post.slug}: {result.result}'))
+                else:
+                    self.stdout.write(f'  {post.slug}: {", ".join(result.result) or "sin cambios"}')
+            else:
+                ingest_blog_post_images.delay(post.pk)
+
+        self.stdout.write(self.style.SUCCESS('Proceso completado'))
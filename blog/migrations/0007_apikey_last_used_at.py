@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0006_blogpost_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apikey',
+            name='last_used_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Último uso'),
+        ),
+    ]
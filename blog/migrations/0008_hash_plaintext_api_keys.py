@@ -0,0 +1,30 @@
+import hashlib
+import re
+
+from django.db import migrations
+
+DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+def hash_plaintext_keys(apps, schema_editor):
+    """
+    Sustituye por su SHA-256 las claves guardadas en claro (creadas a mano, no
+    por APIKey.save()). Una clave con forma de digest (64 hex en minúsculas) no
+    se distingue de uno y se deja como está.
+    """
+    APIKey = apps.get_model('blog', 'APIKey')
+    for api_key in APIKey.objects.only('pk', 'key').iterator():
+        if api_key.key and not DIGEST_RE.match(api_key.key):
+            digest = hashlib.sha256(api_key.key.encode()).hexdigest()
+            APIKey.objects.filter(pk=api_key.pk).update(key=digest)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_apikey_last_used_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(hash_plaintext_keys, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,4 @@
+from django.core.files.storage import default_storage
 from django.db import models
 from django.urls import reverse
 from django.utils.text import slugify
@@ -5,6 +6,23 @@ import uuid
 import hashlib
 
 
+class APIKeyQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        """
+        update() no envía señales: invalida en la cache de autenticación las
+        claves afectadas (p. ej. .update(is_active=False) para revocarlas)
+        """
+        if set(kwargs) <= {'last_used_at'}:
+            # Registro de uso en lote (flush_api_key_usage): no cambia la autenticación
+            return super().update(**kwargs)
+        digests = list(self.values_list('key', flat=True))
+        updated = super().update(**kwargs)
+        # Import local: authentication importa este módulo
+        from .authentication import invalidate_api_keys
+        invalidate_api_keys(digests)
+        return updated
+
+
 class APIKey(models.Model):
     """
     API Key model for external service authentication (N8N, etc.)
@@ -12,9 +30,14 @@ class APIKey(models.Model):
     name = models.CharField("Nombre", max_length=100, help_text="Nombre descriptivo para la clave API")
     key = models.CharField("Clave API", max_length=64, unique=True, blank=True)
     created_at = models.DateTimeField("Creada", auto_now_add=True)
+    last_used_at = models.DateTimeField("Último uso", null=True, blank=True, editable=False)
     is_active = models.BooleanField("Activa", default=True)
     created_by = models.ForeignKey('auth.User', on_delete=models.CASCADE, related_name='api_keys')
 
+    # Guardar o borrar (también en cascada o desde el admin) invalida la cache de
+    # autenticación con señales; ver blog.authentication.connect_signals()
+    objects = APIKeyQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Clave API"
         verbose_name_plural = "Claves API"
@@ -37,6 +60,29 @@ class APIKey(models.Model):
         return f"{self.name} ({'Activa' if self.is_active else 'Inactiva'})"
 
 
+class BlogPostQuerySet(models.QuerySet):
+    """
+    update()/delete() en bloque (tareas de imágenes, acciones del admin) no pasan
+    por save()/delete() del modelo: también purgan el listado cacheado
+    """
+
+    def update(self, **kwargs):
+        updated = super().update(**kwargs)
+        if updated:
+            BlogPost._purge_page_cache()
+        return updated
+
+    def delete(self):
+        result = super().delete()
+        if result[0]:
+            BlogPost._purge_page_cache()
+        return result
+
+    update.alters_data = True
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
 class BlogPost(models.Model):
     # Basic fields
     title = models.CharField("Título (H1)", max_length=200)
@@ -62,6 +108,9 @@ class BlogPost(models.Model):
 
     final_cta_section = models.TextField("CTA Final", help_text="Llamado a la acción final")
 
+    # Copias locales optimizadas (WebP responsivas) generadas en segundo plano por blog.tasks
+    image_variants = models.JSONField("Variantes de imagen", default=dict, blank=True, editable=False)
+
     # Metadata
     excerpt = models.TextField("Resumen breve", max_length=300, help_text="Para mostrar en listados y SEO")
     meta_description = models.CharField("Meta descripción", max_length=160, blank=True)
@@ -71,6 +120,8 @@ class BlogPost(models.Model):
         ('faq', 'Preguntas frecuentes'),
     ], default='guias')
 
+    objects = BlogPostQuerySet.as_manager()
+
     class Meta:
         ordering = ['-published_date']
         verbose_name = "Entrada del Blog"
@@ -81,24 +132,86 @@ class BlogPost(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = slugify(self.title)
+            self.slug = self.slug_for(self.title)
         super().save(*args, **kwargs)
+        self._purge_page_cache()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        self._purge_page_cache()
+        return result
+
+    @classmethod
+    def slug_for(cls, title):
+        """slugify(title) recortado al tamaño de la columna (el título admite el doble)"""
+        return slugify(title)[:cls._meta.get_field('slug').max_length].rstrip('-')
+
+    @staticmethod
+    def _purge_page_cache():
+        # Import diferido: page_cache usa URLs y settings de todo el proyecto
+        from iacol_project.page_cache import purge_page_cache_on_commit
+        purge_page_cache_on_commit(['resources'])
 
     def get_absolute_url(self):
         return reverse('blog:blog_detail', kwargs={'slug': self.slug})
 
+    def get_image_source(self, field_name):
+        """Fuente actual de una imagen: nombre del archivo subido o URL externa"""
+        image = getattr(self, field_name)
+        if image:
+            return image.name
+        return getattr(self, f'{field_name}_url') or None
+
+    def get_optimized_image(self, field_name):
+        """Variantes locales de la imagen, solo si corresponden a la fuente actual"""
+        source = self.get_image_source(field_name)
+        entry = (self.image_variants or {}).get(field_name)
+        if source and entry and entry.get('source') == source:
+            return entry
+        return None
+
+    def needs_image_ingestion(self):
+        """True si alguna imagen no tiene copia local optimizada para su fuente actual"""
+        return any(
+            self.get_image_source(field_name) and not self.get_optimized_image(field_name)
+            for field_name in ('hero_image', 'problem_image')
+        )
+
+    def _get_image_srcset(self, field_name):
+        optimized = self.get_optimized_image(field_name)
+        if not optimized:
+            return ''
+        return ', '.join(
+            f"{default_storage.url(name)} {width}w"
+            for width, name in sorted(optimized['variants'].items(), key=lambda item: int(item[0]))
+        )
+
     def get_hero_image_url(self):
-        """Retorna la URL de la imagen hero, priorizando archivo sobre URL externa"""
+        """Retorna la URL de la imagen hero, priorizando la copia local optimizada, luego archivo y URL externa"""
+        optimized = self.get_optimized_image('hero_image')
+        if optimized:
+            return default_storage.url(optimized['src'])
         if self.hero_image:
             return self.hero_image.url
         elif self.hero_image_url:
             return self.hero_image_url
         return None
 
+    def get_hero_image_srcset(self):
+        """srcset de las variantes WebP de la imagen hero (vacío si aún no existen)"""
+        return self._get_image_srcset('hero_image')
+
     def get_problem_image_url(self):
-        """Retorna la URL de la imagen del problema, priorizando archivo sobre URL externa"""
+        """Retorna la URL de la imagen del problema, priorizando la copia local optimizada, luego archivo y URL externa"""
+        optimized = self.get_optimized_image('problem_image')
+        if optimized:
+            return default_storage.url(optimized['src'])
         if self.problem_image:
             return self.problem_image.url
         elif self.problem_image_url:
             return self.problem_image_url
         return None
+
+    def get_problem_image_srcset(self):
+        """srcset de las variantes WebP de la imagen del problema (vacío si aún no existen)"""
+        return self._get_image_srcset('problem_image')
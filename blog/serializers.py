@@ -1,13 +1,47 @@
 from rest_framework import serializers
 from .models import BlogPost
-from django.core.files.base import ContentFile
-import base64
-import os
+from django.conf import settings
+from django.db import transaction
+from functools import partial
+
+
+class BlogPostBulkSerializer(serializers.ListSerializer):
+    """
+    List serializer for bulk creation: validates every post and inserts them
+    with a single bulk_create inside the caller's transaction.
+    """
+
+    def validate(self, attrs):
+        slugs = [BlogPost.slug_for(item['title']) for item in attrs]
+        duplicated = sorted({slug for slug in slugs if slugs.count(slug) > 1})
+        if duplicated:
+            raise serializers.ValidationError(f"Títulos duplicados en el lote: {', '.join(duplicated)}")
+
+        existing = sorted(BlogPost.objects.filter(slug__in=slugs).values_list('slug', flat=True))
+        if existing:
+            raise serializers.ValidationError(f"Ya existen posts con slug: {', '.join(existing)}")
+        return attrs
+
+    def create(self, validated_data):
+        image_payloads = [self.child.pop_image_payloads(item) for item in validated_data]
+        posts = [BlogPost(**item) for item in validated_data]
+        for post in posts:
+            post.slug = post.slug or BlogPost.slug_for(post.title)
+
+        # bulk_create no pasa por BlogPost.save(): la purga del listado se hace aquí
+        posts = BlogPost.objects.bulk_create(posts)
+        BlogPost._purge_page_cache()
+
+        # Las imágenes se procesan en segundo plano una vez confirmada la transacción
+        for post, payloads in zip(posts, image_payloads):
+            self.child.schedule_image_tasks(post, payloads)
+        return posts
 
 
 class BlogPostSerializer(serializers.ModelSerializer):
     """
-    Serializer for BlogPost model with support for image URLs and base64 uploads.
+    Serializer for BlogPost model with support for image URLs, base64 and
+    multipart uploads. Images are decoded and validated by a Celery task.
     """
 
     # Custom fields for image handling (URLs are now model fields)
@@ -18,6 +52,10 @@ class BlogPostSerializer(serializers.ModelSerializer):
     hero_image_base64 = serializers.CharField(write_only=True, required=False, allow_blank=True)
     problem_image_base64 = serializers.CharField(write_only=True, required=False, allow_blank=True)
 
+    # Multipart binary uploads (alternative to base64)
+    hero_image_file = serializers.FileField(write_only=True, required=False)
+    problem_image_file = serializers.FileField(write_only=True, required=False)
+
     class Meta:
         model = BlogPost
         fields = [
@@ -32,13 +70,15 @@ class BlogPostSerializer(serializers.ModelSerializer):
             # Image URLs (model fields)
             'hero_image_url', 'problem_image_url',
 
-            # Base64 images (for input)
+            # Base64 images / multipart files (for input)
             'hero_image_base64', 'problem_image_base64',
+            'hero_image_file', 'problem_image_file',
 
             # Read-only fields
             'published_date', 'updated_date',
         ]
         read_only_fields = ['slug', 'published_date', 'updated_date']
+        list_serializer_class = BlogPostBulkSerializer
 
     def validate_category(self, value):
         """
@@ -59,68 +99,94 @@ class BlogPostSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("El título debe tener al menos 5 caracteres")
         return value.strip()
 
-    def decode_base64_image(self, base64_string, filename_prefix, max_bytes=5 * 1024 * 1024):
-        """
-        Decode base64 image and return a Django File object with basic limits to avoid DoS.
-        """
-        try:
-            header = ''
-            # Remove data URL prefix if present
-            if ',' in base64_string:
-                header, base64_string = base64_string.split(',', 1)
-
-            # Basic size guard before decoding
-            if len(base64_string) > (max_bytes * 1.4):  # base64 adds ~33%
-                raise serializers.ValidationError("La imagen en base64 es demasiado grande")
+    def validate_hero_image_base64(self, value):
+        return self._validate_base64_image(value)
 
-            # Decode base64
-            image_data = base64.b64decode(base64_string)
+    def validate_problem_image_base64(self, value):
+        return self._validate_base64_image(value)
 
-            if len(image_data) > max_bytes:
-                raise serializers.ValidationError("La imagen en base64 supera el tamaño permitido (5MB)")
+    def validate_hero_image_file(self, value):
+        return self._validate_image_file(value)
 
-            # Determine file extension from header or default to png
-            ext = 'png'  # Default
-            if 'data:image/' in header:
-                ext = header.split('data:image/')[1].split(';')[0]
+    def validate_problem_image_file(self, value):
+        return self._validate_image_file(value)
 
-            filename = f"{filename_prefix}_{self._get_timestamp()}.{ext}"
+    def validate(self, attrs):
+        """
+        Each image can come as base64 or as a multipart file, not both.
+        """
+        # blog.images / blog.tasks cargan Pillow y requests: se importan al usarse, no al arrancar
+        from .images import IMAGE_FIELDS
+        for field_name in IMAGE_FIELDS:
+            if attrs.get(f'{field_name}_base64') and attrs.get(f'{field_name}_file'):
+                raise serializers.ValidationError({
+                    f'{field_name}_file': "Envíe la imagen como base64 o como archivo, no ambos"
+                })
+        return attrs
+
+    def _validate_base64_image(self, value):
+        """
+        Cheap checks only (size and declared type); decoding happens in the Celery task.
+        """
+        from .images import ALLOWED_CONTENT_TYPES, base64_content_type
+        value = value.strip()
+        if not value:
+            return value
+
+        max_bytes = settings.BLOG_IMAGE_MAX_BYTES
+        if len(value) > max_bytes * 1.4:  # base64 adds ~33%
+            raise serializers.ValidationError("La imagen en base64 es demasiado grande")
+
+        content_type = base64_content_type(value)
+        if content_type and content_type not in ALLOWED_CONTENT_TYPES:
+            raise serializers.ValidationError(f"Tipo de imagen no permitido: {content_type}")
+        return value
 
-            return ContentFile(image_data, name=filename)
+    def _validate_image_file(self, value):
+        from .images import ALLOWED_CONTENT_TYPES
+        max_bytes = settings.BLOG_IMAGE_MAX_BYTES
+        if value.size > max_bytes:
+            raise serializers.ValidationError(f"La imagen supera el tamaño permitido ({max_bytes // (1024 * 1024)}MB)")
 
-        except Exception as e:
-            raise serializers.ValidationError(f"Error procesando imagen base64: {str(e)}")
+        content_type = (getattr(value, 'content_type', '') or '').lower()
+        if content_type and content_type not in ALLOWED_CONTENT_TYPES:
+            raise serializers.ValidationError(f"Tipo de imagen no permitido: {content_type}")
+        return value
 
-    def _get_timestamp(self):
+    def pop_image_payloads(self, validated_data):
+        """
+        Remove image inputs from validated_data and return {field_name: payload}.
         """
-        Get current timestamp for unique filenames.
+        from .images import IMAGE_FIELDS
+        payloads = {}
+        for field_name in IMAGE_FIELDS:
+            base64_data = validated_data.pop(f'{field_name}_base64', '')
+            image_file = validated_data.pop(f'{field_name}_file', None)
+            if image_file or base64_data:
+                payloads[field_name] = image_file or base64_data
+        return payloads
+
+    def schedule_image_tasks(self, blog_post, image_payloads):
         """
-        from django.utils import timezone
-        return timezone.now().strftime('%Y%m%d_%H%M%S')
+        Queue background image work once the transaction commits: uploaded payloads
+        are decoded first (which then creates local copies); external URLs only
+        need the local optimized copies.
+        """
+        from .tasks import queue_image_ingestion, queue_image_processing
+        if image_payloads:
+            transaction.on_commit(partial(queue_image_processing, blog_post.pk, image_payloads))
+        elif blog_post.needs_image_ingestion():
+            transaction.on_commit(partial(queue_image_ingestion, blog_post.pk))
 
     def create(self, validated_data):
         """
-        Create BlogPost instance with image handling.
+        Create BlogPost instance with a single INSERT; images are processed after commit.
         """
-        # Extra fields that are not model fields
-        hero_image_base64 = validated_data.pop('hero_image_base64', '').strip()
-        problem_image_base64 = validated_data.pop('problem_image_base64', '').strip()
+        image_payloads = self.pop_image_payloads(validated_data)
 
         # Crear el post con los campos simples (incluyendo las URLs, que se almacenan en texto)
         blog_post = BlogPost.objects.create(**validated_data)
 
-        # Procesar imágenes en base64 si vienen en la petición
-        base64_images = {
-            'hero_image': hero_image_base64,
-            'problem_image': problem_image_base64,
-        }
-
-        for field_name, base64_data in base64_images.items():
-            if base64_data:
-                image_file = self.decode_base64_image(base64_data, f"{field_name}_{blog_post.id}")
-                setattr(blog_post, field_name, image_file)
-
-        # Guardar con archivos si aplica
-        blog_post.save()
+        self.schedule_image_tasks(blog_post, image_payloads)
 
         return blog_post
@@ -0,0 +1,140 @@
+import logging
+
+import requests
+from celery import shared_task
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from .images import (
+    IMAGE_FIELDS, ImageProcessingError, build_image_variants, fetch_remote_image,
+    normalize_image, read_staged_image, stage_image_payload,
+)
+from .models import BlogPost
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, ignore_result=True, max_retries=3, default_retry_delay=30)
+def process_blog_post_images(self, post_id, staged_images):
+    """
+    Decodifica, valida y normaliza las imágenes de un post creado por la API.
+
+    staged_images: {'hero_image': '<nombre en staging>', ...}
+    """
+    processed = {}
+    for field_name, staged_name in staged_images.items():
+        if field_name not in IMAGE_FIELDS:
+            continue
+        try:
+            data, ext = normalize_image(read_staged_image(staged_name))
+        except FileNotFoundError:
+            logger.warning("Imagen en staging no encontrada para el post %s: %s", post_id, staged_name)
+            continue
+        except ImageProcessingError as e:
+            logger.warning("Imagen %s descartada para el post %s: %s", field_name, post_id, e)
+            default_storage.delete(staged_name)
+            continue
+        except OSError as e:
+            raise self.retry(exc=e)
+
+        upload_to = BlogPost._meta.get_field(field_name).upload_to
+        timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
+        processed[field_name] = default_storage.save(
+            f"{upload_to}{field_name}_{post_id}_{timestamp}.{ext}", ContentFile(data)
+        )
+        default_storage.delete(staged_name)
+
+    if processed:
+        # update() evita un segundo save() completo del post
+        updated = BlogPost.objects.filter(pk=post_id).update(updated_date=timezone.now(), **processed)
+        if not updated:
+            logger.warning("Post %s eliminado antes de procesar sus imágenes", post_id)
+            for name in processed.values():
+                default_storage.delete(name)
+            return {}
+        logger.info("Imágenes procesadas para el post %s: %s", post_id, ', '.join(processed))
+    else:
+        # Ninguna subida válida: las demás imágenes (p. ej. problem_image_url) se copian igualmente
+        post = BlogPost.objects.filter(pk=post_id).first()
+        if post is None or not post.needs_image_ingestion():
+            return {}
+
+    queue_image_ingestion(post_id)
+    return processed
+
+
+@shared_task(bind=True, ignore_result=True, max_retries=3, default_retry_delay=60)
+def ingest_blog_post_images(self, post_id):
+    """
+    Crea copias locales optimizadas (WebP responsivas) de las imágenes de un post.
+    Las URLs externas se descargan una sola vez; luego get_hero_image_url /
+    get_problem_image_url sirven la copia local.
+    """
+    post = BlogPost.objects.filter(pk=post_id).first()
+    if post is None:
+        return {}
+
+    variants = dict(post.image_variants or {})
+    changed = []
+    for field_name in IMAGE_FIELDS:
+        source = post.get_image_source(field_name)
+        if not source:
+            if variants.pop(field_name, None):
+                changed.append(field_name)
+            continue
+        if post.get_optimized_image(field_name):
+            continue
+
+        image = getattr(post, field_name)
+        try:
+            if image:
+                with default_storage.open(image.name, 'rb') as image_file:
+                    variants[field_name] = build_image_variants(image_file.read(), source, original=image.name)
+            else:
+                variants[field_name] = build_image_variants(fetch_remote_image(source), source)
+        except ImageProcessingError as e:
+            logger.warning("No se pudo optimizar %s del post %s (%s): %s", field_name, post_id, source, e)
+            continue
+        except (requests.RequestException, OSError) as e:
+            raise self.retry(exc=e)
+        changed.append(field_name)
+
+    if changed:
+        BlogPost.objects.filter(pk=post_id).update(image_variants=variants)
+        logger.info("Copias locales de imágenes actualizadas para el post %s: %s", post_id, ', '.join(changed))
+    return {field_name: variants.get(field_name) for field_name in changed}
+
+
+def queue_image_ingestion(post_id):
+    """
+    Encola la creación de copias locales de las imágenes de un post.
+    Pensado para ejecutarse con transaction.on_commit tras guardar desde admin o API.
+    """
+    try:
+        ingest_blog_post_images.apply_async((post_id,), retry=False)
+    except Exception as e:
+        # Sin broker no se descarga en línea para no bloquear la petición; se reintenta al volver a guardar
+        logger.warning("Broker no disponible (%s), copias locales pendientes para el post %s", e, post_id)
+
+
+def queue_image_processing(post_id, payloads):
+    """
+    Guarda los payloads de imagen en staging y encola su procesamiento.
+    Pensado para ejecutarse con transaction.on_commit.
+    """
+    staged = {}
+    for field_name, payload in payloads.items():
+        try:
+            staged[field_name] = stage_image_payload(payload)
+        except OSError as e:
+            logger.error("No se pudo guardar la imagen %s del post %s: %s", field_name, post_id, e)
+    if not staged:
+        return
+
+    try:
+        process_blog_post_images.apply_async((post_id, staged), retry=False)
+    except Exception as e:
+        # Broker no disponible: procesar en línea para no perder las imágenes
+        logger.warning("Broker no disponible (%s), procesando imágenes del post %s en línea", e, post_id)
+        process_blog_post_images.apply(args=(post_id, staged))
@@ -1,3 +1,354 @@
-from django.test import TestCase
+import base64
+import importlib
+import io
+import shutil
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.test import RequestFactory, TestCase, override_settings
+from PIL import Image
+from rest_framework.exceptions import AuthenticationFailed
+
+from .authentication import APIKeyAuthentication, flush_api_key_usage, invalidate_api_keys
+from .images import ImageProcessingError, PinnedHostAdapter, fetch_remote_image
+from .models import APIKey, BlogPost
+from .tasks import ingest_blog_post_images, process_blog_post_images, queue_image_processing
+
+TEST_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def tearDownModule():
+    shutil.rmtree(TEST_MEDIA_ROOT, ignore_errors=True)
+
+
+def make_png_bytes(size=(20, 10)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color='red').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def make_post_payload(title, **extra):
+    payload = {
+        'title': title,
+        'category': 'guias',
+        'excerpt': 'Resumen de prueba',
+        'problem_section': 'Problema',
+        'why_automate_section': 'Por qué',
+        'sales_angle_section': 'Ángulo',
+        'how_it_works_section': 'Cómo',
+        'benefits_section': 'Beneficios',
+        'hypothetical_case_section': 'Caso',
+        'final_cta_section': 'CTA',
+    }
+    payload.update(extra)
+    return payload
+
+
+class APIKeyAuthenticationTest(TestCase):
+    """Tests for the cached, digest-only API key authentication"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('n8n', 'n8n@example.com', 'pass')
+        self.api_key = APIKey.objects.create(name='n8n', created_by=self.user)
+        self.auth = APIKeyAuthentication()
+        self.factory = RequestFactory()
+
+    def authenticate(self, raw_key):
+        return self.auth.authenticate(self.factory.post('/', HTTP_X_API_KEY=raw_key))
+
+    def test_repeated_calls_are_served_from_cache(self):
+        user, key_obj = self.authenticate(self.api_key._plain_key)
+        self.assertEqual((user, key_obj), (self.user, self.api_key))
+
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate(self.api_key._plain_key)
+        self.assertEqual(user.username, 'n8n')
+
+    def test_stored_digest_is_not_accepted_as_key(self):
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(self.api_key.key)
+
+    def test_deactivating_key_invalidates_cache(self):
+        self.authenticate(self.api_key._plain_key)
+        self.api_key.is_active = False
+        self.api_key.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(self.api_key._plain_key)
+
+    def test_bulk_revocation_and_cascades_invalidate_cache(self):
+        other = APIKey.objects.create(name='otra', created_by=self.user)
+        third = APIKey.objects.create(name='tercera', created_by=self.user)
+        for key in (self.api_key, other, third):
+            self.authenticate(key._plain_key)
+
+        # Sin pasar por save()/delete(): update en bloque, borrado del queryset y cascada del usuario
+        APIKey.objects.filter(pk=self.api_key.pk).update(is_active=False)
+        APIKey.objects.filter(pk=other.pk).delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(self.api_key._plain_key)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(other._plain_key)
+
+        self.user.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(third._plain_key)
+
+    def test_user_changes_invalidate_cached_keys(self):
+        self.authenticate(self.api_key._plain_key)
+        self.user.is_staff = True
+        self.user.save()
+        user, _ = self.authenticate(self.api_key._plain_key)
+        self.assertTrue(user.is_staff)
+
+        # El login (solo last_login) no invalida
+        self.user.save(update_fields=['last_login'])
+        with self.assertNumQueries(0):
+            self.authenticate(self.api_key._plain_key)
+
+    def test_plaintext_keys_until_migrated(self):
+        migration = importlib.import_module('blog.migrations.0008_hash_plaintext_api_keys')
+        legacy = APIKey.objects.create(name='legacy', key='clave-en-claro', created_by=self.user)
+        self.assertEqual(self.authenticate('clave-en-claro')[1], legacy)
+
+        migration.hash_plaintext_keys(django_apps, None)
+        legacy.refresh_from_db()
+        self.assertEqual(legacy.key, APIKey._hash_key('clave-en-claro'))
+        self.api_key.refresh_from_db()
+        self.assertEqual(self.api_key.key, APIKey._hash_key(self.api_key._plain_key))
+        invalidate_api_keys([legacy.key])
+        self.assertEqual(self.authenticate('clave-en-claro')[1], legacy)
+
+    @override_settings(BLOG_API_KEY_USAGE_FLUSH_INTERVAL=3600)
+    def test_last_used_at_is_written_in_batches(self):
+        for _ in range(3):
+            self.authenticate(self.api_key._plain_key)
+        self.api_key.refresh_from_db()
+        self.assertIsNone(self.api_key.last_used_at)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(flush_api_key_usage(), 1)
+        self.api_key.refresh_from_db()
+        self.assertIsNotNone(self.api_key.last_used_at)
+
+    @override_settings(BLOG_API_KEY_USAGE_FLUSH_INTERVAL=0)
+    def test_usage_is_flushed_when_request_finishes(self):
+        # Cualquier respuesta sirve: la autenticación ocurre antes de validar el cuerpo
+        self.client.post('/blog/api/create-posts/bulk/', [], content_type='application/json',
+                         HTTP_X_API_KEY=self.api_key._plain_key)
+        self.api_key.refresh_from_db()
+        self.assertIsNotNone(self.api_key.last_used_at)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class BlogPostAPITest(TestCase):
+    """Tests for the single and bulk blog post creation endpoints"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('n8n', 'n8n@example.com', 'pass')
+        api_key = APIKey.objects.create(name='n8n', created_by=self.user)
+        self.headers = {'HTTP_X_API_KEY': api_key._plain_key}
+
+    def test_create_post_queues_base64_image_without_second_save(self):
+        image_b64 = 'data:image/png;base64,' + base64.b64encode(make_png_bytes()).decode()
+        with mock.patch('blog.tasks.process_blog_post_images.apply_async') as apply_async, \
+                mock.patch.object(BlogPost, 'save', autospec=True, side_effect=BlogPost.save) as save, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/blog/api/create-post/',
+                make_post_payload('Post con imagen', hero_image_base64=image_b64),
+                content_type='application/json',
+                **self.headers
+            )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(save.call_count, 1)
+        post_id, staged = apply_async.call_args[0][0]
+        self.assertEqual(post_id, response.json()['data']['id'])
+        self.assertEqual(list(staged), ['hero_image'])
+        self.assertTrue(default_storage.exists(staged['hero_image']))
+
+    def test_bulk_create_posts_in_single_request(self):
+        payload = {'posts': [make_post_payload(f'Post masivo {i}') for i in range(3)]}
+        response = self.client.post(
+            '/blog/api/create-posts/bulk/', payload, content_type='application/json', **self.headers
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['data']), 3)
+        self.assertEqual(BlogPost.objects.count(), 3)
+        self.assertTrue(BlogPost.objects.filter(slug='post-masivo-0').exists())
+
+    def test_bulk_create_purges_resources_and_fits_long_titles(self):
+        title = 'Automatización ' + 'x' * 180
+        payload = {'posts': [make_post_payload(title), make_post_payload('Post masivo corto')]}
+        with mock.patch('iacol_project.page_cache.purge_page_cache') as purge, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/blog/api/create-posts/bulk/', payload, content_type='application/json', **self.headers
+            )
+
+        self.assertEqual(response.status_code, 201)
+        purge.assert_called_once_with(['resources'])
+        slug = BlogPost.objects.get(title=title).slug
+        self.assertEqual(len(slug), BlogPost._meta.get_field('slug').max_length)
+        self.assertTrue(slug.startswith('automatizacion-xxx'))
+
+    def test_bulk_updates_and_deletes_purge_resources(self):
+        post = BlogPost.objects.create(**make_post_payload('Post con variantes'))
+        with mock.patch('iacol_project.page_cache.purge_page_cache') as purge, \
+                self.captureOnCommitCallbacks(execute=True):
+            # Como las tareas de imágenes y las acciones del admin
+            BlogPost.objects.filter(pk=post.pk).update(image_variants={'hero_image': {}})
+            BlogPost.objects.filter(pk=post.pk + 1).update(is_published=True)  # ninguna fila: sin purga
+            BlogPost.objects.filter(pk=post.pk).delete()
+        self.assertEqual(purge.call_args_list, [mock.call(['resources'])] * 2)
+
+    def test_bulk_create_rejects_whole_batch_on_duplicate_titles(self):
+        payload = {'posts': [make_post_payload('Post repetido'), make_post_payload('Post repetido')]}
+        response = self.client.post(
+            '/blog/api/create-posts/bulk/', payload, content_type='application/json', **self.headers
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(BlogPost.objects.count(), 0)
+
+    @override_settings(BLOG_API_BULK_MAX_POSTS=2)
+    def test_bulk_create_enforces_batch_limit(self):
+        payload = {'posts': [make_post_payload(f'Post límite {i}') for i in range(3)]}
+        response = self.client.post(
+            '/blog/api/create-posts/bulk/', payload, content_type='application/json', **self.headers
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(BlogPost.objects.count(), 0)
+
+    def test_image_task_validates_and_stores_image(self):
+        post = BlogPost.objects.create(**make_post_payload('Post para tarea'))
+        with mock.patch('blog.tasks.process_blog_post_images.apply_async',
+                        side_effect=lambda args, **kwargs: process_blog_post_images.apply(args=args)), \
+                mock.patch('blog.tasks.queue_image_ingestion') as queue_ingestion:
+            queue_image_processing(post.pk, {
+                'hero_image': base64.b64encode(make_png_bytes()).decode(),
+                'problem_image': base64.b64encode(b'not an image').decode(),
+            })
+
+        post.refresh_from_db()
+        self.assertTrue(post.hero_image.name.startswith('blog/hero/hero_image_'))
+        self.assertTrue(post.hero_image.name.endswith('.png'))
+        self.assertFalse(post.problem_image)
+        queue_ingestion.assert_called_once_with(post.pk)
+
+    def test_failed_upload_still_ingests_other_images(self):
+        post = BlogPost.objects.create(**make_post_payload(
+            'Post con subida inválida', problem_image_url='https://images.example.com/problema.png',
+        ))
+        with mock.patch('blog.tasks.process_blog_post_images.apply_async',
+                        side_effect=lambda args, **kwargs: process_blog_post_images.apply(args=args)), \
+                mock.patch('blog.tasks.queue_image_ingestion') as queue_ingestion:
+            queue_image_processing(post.pk, {'hero_image': base64.b64encode(b'not an image').decode()})
+
+        post.refresh_from_db()
+        self.assertFalse(post.hero_image)
+        queue_ingestion.assert_called_once_with(post.pk)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class RemoteImageIngestionTest(TestCase):
+    """Tests for local optimized copies of blog images"""
+
+    def make_response(self, data, content_type='image/png'):
+        response = mock.MagicMock(is_redirect=False, status_code=200, headers={'content-type': content_type})
+        response.iter_content.return_value = [data]
+        response.__enter__.return_value = response
+        return response
+
+    def test_remote_image_is_cached_with_webp_variants(self):
+        post = BlogPost.objects.create(**make_post_payload(
+            'Post remoto', hero_image_url='https://cdn.example.com/hero.png'
+        ))
+        self.assertTrue(post.needs_image_ingestion())
+        self.assertEqual(post.get_hero_image_url(), 'https://cdn.example.com/hero.png')
+
+        with mock.patch('blog.images._public_address', return_value='93.184.216.34'), \
+                mock.patch('blog.images.requests.Session.get', return_value=self.make_response(make_png_bytes((1200, 600)))):
+            ingest_blog_post_images.apply(args=(post.pk,))
+
+        post.refresh_from_db()
+        optimized = post.get_optimized_image('hero_image')
+        self.assertEqual(sorted(optimized['variants'], key=int), ['480', '960', '1200'])
+        self.assertTrue(post.get_hero_image_url().endswith('-1200.webp'))
+        self.assertIn(' 480w', post.get_hero_image_srcset())
+        self.assertFalse(post.needs_image_ingestion())
+
+        # Changing the external URL invalidates the local copy
+        post.hero_image_url = 'https://cdn.example.com/other.png'
+        self.assertEqual(post.get_hero_image_url(), 'https://cdn.example.com/other.png')
+        self.assertTrue(post.needs_image_ingestion())
+
+    def test_identical_remote_images_are_deduplicated(self):
+        posts = [
+            BlogPost.objects.create(**make_post_payload(f'Post duplicado {i}', hero_image_url=f'https://cdn.example.com/{i}.png'))
+            for i in range(2)
+        ]
+        with mock.patch('blog.images._public_address', return_value='93.184.216.34'), \
+                mock.patch('blog.images.requests.Session.get', side_effect=lambda *a, **kw: self.make_response(make_png_bytes())):
+            for post in posts:
+                ingest_blog_post_images.apply(args=(post.pk,))
+
+        first, second = [BlogPost.objects.get(pk=post.pk).image_variants['hero_image'] for post in posts]
+        self.assertEqual(first['original'], second['original'])
+        self.assertEqual(first['variants'], second['variants'])
+
+    def test_private_hosts_are_rejected(self):
+        with self.assertRaises(ImageProcessingError):
+            fetch_remote_image('http://127.0.0.1/internal.png')
+
+    def test_connects_to_the_validated_address_with_the_original_host(self):
+        png = make_png_bytes()
+        hosts = []
+
+        class ImageHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                hosts.append(self.headers['Host'])
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/png')
+                self.send_header('Content-Length', str(len(png)))
+                self.end_headers()
+                self.wfile.write(png)
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(('127.0.0.1', 0), ImageHandler)
+        self.addCleanup(server.server_close)
+        threading.Thread(target=server.handle_request, daemon=True).start()
+        port = server.server_address[1]
+
+        # images.invalid no resuelve: solo se llega al servidor por la IP ya validada
+        with mock.patch('blog.images._public_address', return_value='127.0.0.1') as resolve:
+            self.assertEqual(fetch_remote_image(f'http://images.invalid:{port}/photo.png'), png)
+        resolve.assert_called_once_with('images.invalid')
+        self.assertEqual(hosts, [f'images.invalid:{port}'])
+
+    def test_tls_is_verified_against_the_original_hostname(self):
+        pool = PinnedHostAdapter('cdn.example.com').poolmanager.connection_from_url('https://93.184.216.34/')
+        self.assertEqual(pool.assert_hostname, 'cdn.example.com')
+        self.assertEqual(pool.conn_kw['server_hostname'], 'cdn.example.com')
+
+
+class BlogDetailViewTest(TestCase):
+    """Tests for the async blog detail view"""
+
+    def test_only_published_posts_are_visible(self):
+        post = BlogPost.objects.create(**make_post_payload('Post publicado', is_published=True))
+        draft = BlogPost.objects.create(**make_post_payload('Post borrador'))
+
+        response = self.client.get(f'/blog/{post.slug}/')
+        self.assertContains(response, 'Post publicado')
+        self.assertEqual(self.client.get(f'/blog/{draft.slug}/').status_code, 404)
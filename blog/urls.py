@@ -1,6 +1,6 @@
 from django.urls import path
 from . import views
-from .api_views import BlogPostCreateAPIView, api_status
+from .api_views import BlogPostCreateAPIView, BlogPostBulkCreateAPIView, api_status
 
 app_name = 'blog'
 
@@ -10,5 +10,6 @@ urlpatterns = [
 
     # API endpoints
     path('api/create-post/', BlogPostCreateAPIView.as_view(), name='api_create_post'),
+    path('api/create-posts/bulk/', BlogPostBulkCreateAPIView.as_view(), name='api_bulk_create_posts'),
     path('api/status/', api_status, name='api_status'),
 ]
\ No newline at end of file
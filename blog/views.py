@@ -1,18 +1,20 @@
-from django.shortcuts import render, get_object_or_404
+from django.shortcuts import render
 from django.http import Http404
+from iacol_project.async_utils import aget_user
 from .models import BlogPost
 
 
-def blog_detail(request, slug):
+async def blog_detail(request, slug):
     """
-    Vista de detalle de un post del blog
+    Vista de detalle de un post del blog (vista async)
     """
-    try:
-        post = get_object_or_404(BlogPost, slug=slug, is_published=True)
-    except Http404:
-        # Si no encuentra el post, redirigir a 404
+    post = await BlogPost.objects.filter(slug=slug, is_published=True).afirst()
+    if post is None:
         raise Http404("Post no encontrado")
 
+    # base.html usa user.is_authenticated: resolver el usuario antes de renderizar
+    await aget_user(request)
+
     # Contexto para el template
     context = {
         'post': post,
@@ -90,6 +90,11 @@ print_status "Running database migrations..."
 python manage.py migrate --no-color
 print_status "Database migrations completed ✓"
 
+# Invalidate cached anonymous pages rendered by the previous release
+print_status "Purging page cache..."
+python manage.py purge_page_cache --no-color
+print_status "Page cache purged ✓"
+
 # Create superuser if it doesn't exist (optional)
 if [ "$CREATE_SUPERUSER" = "True" ]; then
     print_status "Creating superuser..."
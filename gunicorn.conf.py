@@ -0,0 +1,33 @@
+"""
+Configuración de gunicorn (se carga automáticamente desde el directorio de trabajo).
+
+Con PROMETHEUS_MULTIPROC_DIR cada worker escribe sus métricas en ese
+directorio; se vacía al arrancar el master y se marcan como muertos los
+workers que terminan, para que los gauges en curso no sumen procesos viejos.
+
+Al salir, cada worker escribe el uso de API keys que tenga pendiente.
+"""
+import os
+import shutil
+import sys
+
+
+def on_starting(server):
+    multiproc_dir = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if multiproc_dir:
+        shutil.rmtree(multiproc_dir, ignore_errors=True)
+        os.makedirs(multiproc_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def worker_exit(server, worker):
+    # En el proceso del worker, con Django ya cargado; no en atexit, que también
+    # correría en los tests después de destruir la base de datos de pruebas
+    if 'blog.authentication' in sys.modules:
+        from blog.authentication import flush_api_key_usage
+        flush_api_key_usage()
@@ -0,0 +1,58 @@
+"""
+Utilidades para vistas async nativas bajo ASGI (gunicorn + UvicornWorker).
+
+Django 4.2 no trae request.auser() ni decoradores async (login_required,
+require_http_methods, csrf_exempt envuelven la vista en una función síncrona),
+así que las vistas async usan estos equivalentes.
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.http import JsonResponse
+from django.utils.functional import SimpleLazyObject, empty
+
+
+async def aget_user(request):
+    """
+    Resuelve request.user (sesión + consulta del usuario) en un único salto a
+    un hilo; a partir de ahí request.user es seguro de usar en código async y
+    en las plantillas (context processor auth).
+    """
+    user = request.user
+    if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+        await sync_to_async(user._setup)()
+    return request.user
+
+
+def async_login_required(view_func):
+    """login_required para vistas async: redirige a LOGIN_URL si no hay sesión"""
+    @functools.wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        user = await aget_user(request)
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path(), settings.LOGIN_URL)
+        return await view_func(request, *args, **kwargs)
+    return wrapper
+
+
+def async_api_view(methods):
+    """
+    Equivalente async de @api_view + IsAuthenticated con SessionAuthentication:
+    405 para métodos no permitidos y 403 JSON sin usuario autenticado. La
+    protección CSRF de los POST la aplica CsrfViewMiddleware.
+    """
+    def decorator(view_func):
+        @functools.wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                response = JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+                response['Allow'] = ', '.join(methods)
+                return response
+            user = await aget_user(request)
+            if not user.is_authenticated:
+                return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=403)
+            return await view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,96 @@
+"""
+Usuario autenticado desde el cache en lugar de un SELECT de auth_user por
+petición.
+
+CachedAuthenticationMiddleware sustituye a AuthenticationMiddleware (es una
+subclase, así que las comprobaciones del admin la aceptan). Resuelve el
+usuario igual que django.contrib.auth.get_user() —backend de la sesión,
+verificación del hash de sesión y SECRET_KEY_FALLBACKS— pero guarda en el cache
+el resultado de backend.get_user() durante AUTH_USER_CACHE_TIMEOUT segundos.
+Guardar o borrar el usuario invalida la entrada (post_save/post_delete, conectadas
+en AuthenticationConfig.ready());
+los cambios con QuerySet.update() se ven al vencer el timeout. Con
+AUTH_USER_CACHE_TIMEOUT = 0 se usa get_user() de Django.
+"""
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model, load_backend
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models.signals import post_delete, post_save
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+
+def user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def invalidate_cached_user(sender, instance, **kwargs):
+    cache.delete(user_cache_key(instance.pk))
+
+
+def connect_signals():
+    """Desde AuthenticationConfig.ready()"""
+    user_model = get_user_model()
+    post_save.connect(invalidate_cached_user, sender=user_model, dispatch_uid='auth_cache_user_saved')
+    post_delete.connect(invalidate_cached_user, sender=user_model, dispatch_uid='auth_cache_user_deleted')
+
+
+def _verify_session_hash(request, user):
+    """Misma verificación que auth.get_user(): False si la sesión ya no es válida"""
+    session_hash = request.session.get(HASH_SESSION_KEY)
+    session_auth_hash = user.get_session_auth_hash()
+    if session_hash and constant_time_compare(session_hash, session_auth_hash):
+        return True
+    if session_hash and any(
+        constant_time_compare(session_hash, fallback_auth_hash)
+        for fallback_auth_hash in user.get_session_auth_fallback_hash()
+    ):
+        request.session.cycle_key()
+        request.session[HASH_SESSION_KEY] = session_auth_hash
+        return True
+    request.session.flush()
+    return False
+
+
+def get_cached_user(request):
+    timeout = settings.AUTH_USER_CACHE_TIMEOUT
+    if not timeout:
+        return auth.get_user(request)
+    try:
+        user_id = get_user_model()._meta.pk.to_python(request.session[SESSION_KEY])
+        backend_path = request.session[BACKEND_SESSION_KEY]
+    except KeyError:
+        return AnonymousUser()
+    if backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return AnonymousUser()
+
+    key = user_cache_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        # get_user() del backend aplica también user_can_authenticate (is_active)
+        user = load_backend(backend_path).get_user(user_id)
+        if user is None:
+            return AnonymousUser()
+        cache.set(key, user, timeout)
+    if hasattr(user, 'get_session_auth_hash') and not _verify_session_hash(request, user):
+        return AnonymousUser()
+    return user
+
+
+def get_user(request):
+    if not hasattr(request, '_cached_user'):
+        request._cached_user = get_cached_user(request)
+    return request._cached_user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    def process_request(self, request):
+        if not hasattr(request, 'session'):
+            raise ImproperlyConfigured(
+                "CachedAuthenticationMiddleware requiere SessionMiddleware antes en MIDDLEWARE."
+            )
+        request.user = SimpleLazyObject(lambda: get_user(request))
@@ -0,0 +1,266 @@
+"""
+Suite de benchmarks reproducible sobre los datos de `manage.py generate_load_data`.
+
+Cada escenario lanza peticiones en proceso con el cliente de pruebas de Django
+contra la base de datos configurada (toda la pila de middleware, sin red), tras
+unas iteraciones de calentamiento. Por escenario se mide latencia (media y
+percentiles), consultas SQL y bytes por petición y errores; el resultado es
+JSON para comparar una ejecución con otra:
+
+    manage.py run_benchmarks --output before.json
+    manage.py run_benchmarks --compare before.json --max-regression 15
+
+El rate limiting se desactiva durante la ejecución; los logs de uso, entradas
+del blog y la API key que crean los escenarios se eliminan al terminar.
+"""
+import json
+import math
+import platform
+import statistics
+import subprocess
+import time
+import uuid
+from datetime import datetime, timezone as dt_timezone
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from iacol_project.querybudget import QueryRecorder
+
+LOADTEST_PREFIX = 'loadtest'
+BENCH_USERNAME = f'{LOADTEST_PREFIX}_bench'
+BENCH_MEDIA_PATH = f'{LOADTEST_PREFIX}/bench.png'
+
+RESULTS_VERSION = 1
+# Métricas que se comparan entre ejecuciones (menor es mejor)
+COMPARED_METRICS = ('p50_ms', 'p95_ms', 'queries_mean')
+
+
+class BenchmarkSetupError(Exception):
+    pass
+
+
+class BenchmarkContext:
+    """Usuario, agente y credenciales que usan los escenarios"""
+
+    def __init__(self, client, user, agent_id, api_key, run_id):
+        self.client = client
+        self.user = user
+        self.agent_id = agent_id
+        self.api_key = api_key
+        self.run_id = run_id
+
+
+def _json_post(payload, **extra):
+    return {'data': json.dumps(payload), 'content_type': 'application/json', **extra}
+
+
+def scenario_log_agent_execution(ctx, i):
+    payload = {
+        'agent_id': ctx.agent_id,
+        'execution_id': f'bench-{ctx.run_id}-{i}',
+        'input_data': {'message': 'Hola, necesito una cotización', 'channel': 'whatsapp'},
+        'output_data': {'response': 'Con gusto, estos son los precios disponibles... ' * 4},
+        'execution_time': 1.25,
+        'success': True,
+    }
+    return 'post', reverse('api:log_execution'), _json_post(payload), 201
+
+
+def scenario_get_agent_stats(ctx, i):
+    return 'get', reverse('api:agent_stats', args=[ctx.agent_id]), {}, 200
+
+
+def scenario_agent_configure(ctx, i):
+    return 'get', reverse('agents:agent_configure', args=[ctx.agent_id]), {}, 200
+
+
+def scenario_dashboard_home(ctx, i):
+    return 'get', reverse('dashboard:home'), {}, 200
+
+
+def scenario_serve_media(ctx, i):
+    return 'get', reverse('api:serve_media', args=[BENCH_MEDIA_PATH]), {}, 200
+
+
+def scenario_blog_api_status(ctx, i):
+    return 'get', reverse('blog:api_status'), {'HTTP_X_API_KEY': ctx.api_key}, 200
+
+
+def scenario_blog_api_create_post(ctx, i):
+    payload = {
+        'title': f'{LOADTEST_PREFIX} bench {ctx.run_id} {i}',
+        'category': 'guias',
+        'excerpt': 'Entrada creada por run_benchmarks',
+        'is_published': False,
+    }
+    for field in ('problem_section', 'why_automate_section', 'sales_angle_section', 'how_it_works_section',
+                  'benefits_section', 'hypothetical_case_section', 'final_cta_section'):
+        payload[field] = f'Texto de benchmark para {field}. ' * 10
+    return 'post', reverse('blog:api_create_post'), _json_post(payload, HTTP_X_API_KEY=ctx.api_key), 201
+
+
+SCENARIOS = {
+    'log_agent_execution': scenario_log_agent_execution,
+    'get_agent_stats': scenario_get_agent_stats,
+    'agent_configure': scenario_agent_configure,
+    'dashboard_home': scenario_dashboard_home,
+    'serve_media': scenario_serve_media,
+    'blog_api_status': scenario_blog_api_status,
+    'blog_api_create_post': scenario_blog_api_create_post,
+}
+
+
+def percentile(sorted_values, pct):
+    """Percentil por rango más cercano sobre una lista ordenada"""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(pct / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(timings, queries, sizes, errors):
+    timings_ms = sorted(t * 1000 for t in timings)
+    total = sum(timings)
+    return {
+        'iterations': len(timings),
+        'errors': errors,
+        'mean_ms': round(statistics.fmean(timings_ms), 3),
+        'min_ms': round(timings_ms[0], 3),
+        'p50_ms': round(percentile(timings_ms, 50), 3),
+        'p90_ms': round(percentile(timings_ms, 90), 3),
+        'p95_ms': round(percentile(timings_ms, 95), 3),
+        'p99_ms': round(percentile(timings_ms, 99), 3),
+        'max_ms': round(timings_ms[-1], 3),
+        'requests_per_second': round(len(timings) / total, 2) if total else None,
+        'queries_mean': round(statistics.fmean(queries), 2),
+        'queries_max': max(queries),
+        'bytes_mean': round(statistics.fmean(sizes)) if sizes else None,
+    }
+
+
+def run_scenario(ctx, build, iterations, warmup):
+    timings, queries, sizes = [], [], []
+    errors = 0
+    for i in range(warmup + iterations):
+        method, path, kwargs, expected_status = build(ctx, i)
+        with QueryRecorder() as recorder:
+            start = time.perf_counter()
+            response = getattr(ctx.client, method)(path, secure=True, **kwargs)
+            elapsed = time.perf_counter() - start
+        if i < warmup:
+            continue
+        if response.status_code != expected_status:
+            errors += 1
+        timings.append(elapsed)
+        queries.append(recorder.count)
+        if not response.streaming:
+            sizes.append(len(response.content))
+    return summarize(timings, queries, sizes, errors)
+
+
+def _client_host():
+    for host in settings.ALLOWED_HOSTS:
+        if host and host != '*':
+            return host.lstrip('.')
+    return 'localhost'
+
+
+def _git_commit():
+    try:
+        result = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, timeout=5,
+                                cwd=settings.BASE_DIR)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def dataset_summary():
+    from apps.agents.models import Agent, AgentUsageLog, Product, Provider
+    return {
+        'users': User.objects.count(),
+        'agents': Agent.objects.count(),
+        'usage_logs': AgentUsageLog.objects.count(),
+        'providers': Provider.objects.count(),
+        'products': Product.objects.count(),
+    }
+
+
+def prepare_context(run_id):
+    from apps.agents.models import AgentConfiguration
+    from blog.models import APIKey
+
+    user = User.objects.filter(username=BENCH_USERNAME).first()
+    if user is None:
+        raise BenchmarkSetupError('No hay datos de carga: ejecuta `manage.py generate_load_data`')
+    config = AgentConfiguration.objects.filter(user=user, enable_providers=True).first()
+    if config is None:
+        raise BenchmarkSetupError(f'{BENCH_USERNAME} no tiene una configuración con catálogo')
+
+    api_key = APIKey(name=f'{LOADTEST_PREFIX} bench {run_id}', created_by=user)
+    api_key.save()
+    client = Client(HTTP_HOST=_client_host())
+    client.force_login(user)
+    return BenchmarkContext(client, user, config.agent_id, api_key._plain_key, run_id)
+
+
+def cleanup_context(ctx):
+    from apps.agents.models import AgentUsageLog
+    from blog.authentication import flush_api_key_usage
+    from blog.models import APIKey, BlogPost
+
+    ctx.client.logout()
+    flush_api_key_usage()
+    AgentUsageLog.objects.filter(execution_id__startswith=f'bench-{ctx.run_id}-').delete()
+    BlogPost.objects.filter(slug__startswith=f'{LOADTEST_PREFIX}-bench-{ctx.run_id}').delete()
+    APIKey.objects.filter(created_by=ctx.user, name__startswith=f'{LOADTEST_PREFIX} bench').delete()
+
+
+def run_benchmarks(scenarios=None, iterations=50, warmup=5):
+    """Ejecuta los escenarios indicados (todos por defecto) y devuelve el resultado serializable"""
+    names = scenarios or list(SCENARIOS)
+    run_id = uuid.uuid4().hex[:8]
+    results = {}
+    with override_settings(RATELIMIT_ENABLE=False):
+        ctx = prepare_context(run_id)
+        try:
+            for name in names:
+                results[name] = run_scenario(ctx, SCENARIOS[name], iterations, warmup)
+        finally:
+            cleanup_context(ctx)
+
+    return {
+        'version': RESULTS_VERSION,
+        'meta': {
+            'timestamp': datetime.now(dt_timezone.utc).isoformat(),
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'debug': settings.DEBUG,
+            'iterations': iterations,
+            'warmup': warmup,
+            'dataset': dataset_summary(),
+        },
+        'scenarios': results,
+    }
+
+
+def compare_results(baseline, current):
+    """[(escenario, métrica, antes, ahora, % de cambio)] de los escenarios presentes en ambos"""
+    rows = []
+    for name, result in current['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if before is None:
+            continue
+        for metric in COMPARED_METRICS:
+            old, new = before.get(metric), result.get(metric)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old * 100 if old else 0.0
+            rows.append((name, metric, old, new, round(change, 1)))
+    return rows
@@ -0,0 +1,341 @@
+"""
+Backend de cache Redis resiliente.
+
+La conexión a Redis es perezosa (no se hace ping al importar settings). Si
+una operación falla por conexión, el backend pasa a un cache local en memoria
+durante FALLBACK_RETRY_INTERVAL segundos y luego vuelve a intentar Redis; al
+reconectar borra de Redis las claves escritas o invalidadas durante el corte,
+para que ningún worker lea valores obsoletos. Si durante el corte se
+modificaron más claves de las que caben en el registro (FALLBACK_MAX_ENTRIES)
+o se vació el cache, al reconectar se borran todas las claves del cache.
+
+aget/aset/adelete usan redis.asyncio directamente, de modo que las vistas
+async no pasan por sync_to_async para leer o escribir el cache.
+
+    CACHES = {'default': {
+        'BACKEND': 'iacol_project.cache.ResilientRedisCache',
+        'LOCATION': REDIS_URL,
+        'OPTIONS': {'FALLBACK_RETRY_INTERVAL': 5, ...},
+    }}
+"""
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from collections import defaultdict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.locmem import LocMemCache
+from django_redis.cache import RedisCache
+from django_redis.client.default import glob_escape
+from django_redis.exceptions import ConnectionInterrupted
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import TimeoutError as RedisTimeoutError
+
+from .metrics import record_cache_read
+
+logger = logging.getLogger(__name__)
+
+REDIS_ERRORS = (ConnectionInterrupted, RedisConnectionError, RedisTimeoutError)
+SCAN_BATCH_SIZE = 1000
+
+
+class ResilientRedisCache(RedisCache):
+    """RedisCache con respaldo local por operación y reconexión automática"""
+
+    def __init__(self, server, params):
+        params = dict(params)
+        options = dict(params.get('OPTIONS', {}))
+        self.retry_interval = options.pop('FALLBACK_RETRY_INTERVAL', 5)
+        local_max_entries = options.pop('FALLBACK_MAX_ENTRIES', 1000)
+        params['OPTIONS'] = options
+        super().__init__(server, params)
+
+        self._local = LocMemCache(f'resilient-{server}', {
+            'TIMEOUT': params.get('TIMEOUT', 300),
+            'KEY_PREFIX': params.get('KEY_PREFIX', ''),
+            'VERSION': params.get('VERSION', 1),
+            'OPTIONS': {'MAX_ENTRIES': local_max_entries},
+        })
+        self._local_max_entries = local_max_entries
+        self._down_until = 0
+        self._dirty = set()
+        self._dirty_overflow = False  # se perdieron claves modificadas: invalidar todo
+        self._state_lock = threading.Lock()
+        self._redis_options = options
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    @property
+    def degraded(self):
+        """True mientras las operaciones se resuelven en el cache local"""
+        return bool(self._down_until)
+
+    def _degrade(self, error):
+        with self._state_lock:
+            if not self._down_until:
+                logger.warning("Redis no disponible, usando cache local durante %ss: %s", self.retry_interval, error)
+            self._down_until = time.monotonic() + self.retry_interval
+
+    def _mark_dirty(self, keys, version):
+        with self._state_lock:
+            if not keys or self._dirty_overflow:
+                return
+            if len(self._dirty) + len(keys) <= self._local_max_entries:
+                self._dirty.update((key, version) for key in keys)
+                return
+        logger.warning("Más de %d claves modificadas sin Redis; al reconectar se invalidará todo el cache",
+                       self._local_max_entries)
+        self._mark_overflow()
+
+    def _mark_overflow(self):
+        """Registro de claves desbordado o cache vaciado durante el corte"""
+        with self._state_lock:
+            self._dirty_overflow = True
+            self._dirty = set()
+
+    def _take_dirty(self):
+        with self._state_lock:
+            dirty, overflow = self._dirty, self._dirty_overflow
+            self._dirty, self._dirty_overflow = set(), False
+        return dirty, overflow
+
+    def _restore_dirty(self, dirty, overflow):
+        with self._state_lock:
+            self._dirty |= dirty
+            self._dirty_overflow |= overflow
+
+    def _recovered(self, count):
+        self._local.clear()
+        self._down_until = 0
+        logger.info("Conexión a Redis restablecida (%d claves invalidadas)", count)
+
+    def _all_keys_pattern(self):
+        """Patrón SCAN de las claves de este cache en cualquier versión (no toca las de Celery)"""
+        return self.key_func('*', glob_escape(self.key_prefix), '*')
+
+    def _recover(self):
+        """Invalida en Redis lo modificado durante el corte y vuelve al modo normal"""
+        dirty, overflow = self._take_dirty()
+        by_version = defaultdict(list)
+        for key, version in dirty:
+            by_version[version].append(key)
+        try:
+            if overflow:
+                client = self.client.get_client(write=True)
+                keys = list(client.scan_iter(match=self._all_keys_pattern(), count=SCAN_BATCH_SIZE))
+                for i in range(0, len(keys), SCAN_BATCH_SIZE):
+                    client.delete(*keys[i:i + SCAN_BATCH_SIZE])
+            else:
+                keys = dirty
+                for version, version_keys in by_version.items():
+                    super().delete_many(version_keys, version=version)
+        except REDIS_ERRORS:
+            self._restore_dirty(dirty, overflow)
+            raise
+        self._recovered(len(keys))
+
+    async def _arecover(self):
+        dirty, overflow = self._take_dirty()
+        client = self.get_async_client()
+        try:
+            if overflow:
+                keys = [key async for key in client.scan_iter(match=self._all_keys_pattern(), count=SCAN_BATCH_SIZE)]
+            else:
+                keys = [self.client.make_key(key, version=version) for key, version in dirty]
+            for i in range(0, len(keys), SCAN_BATCH_SIZE):
+                await client.delete(*keys[i:i + SCAN_BATCH_SIZE])
+        except REDIS_ERRORS:
+            self._restore_dirty(dirty, overflow)
+            raise
+        self._recovered(len(keys))
+
+    def _run(self, redis_op, local_op, keys=(), version=None):
+        if self._down_until:
+            if time.monotonic() < self._down_until:
+                self._mark_dirty(keys, version)
+                return local_op()
+            try:
+                self._recover()
+            except REDIS_ERRORS as e:
+                self._degrade(e)
+                self._mark_dirty(keys, version)
+                return local_op()
+
+        try:
+            return redis_op()
+        except REDIS_ERRORS as e:
+            self._degrade(e)
+            self._mark_dirty(keys, version)
+            return local_op()
+
+    async def _arun(self, redis_op, local_op, keys=(), version=None):
+        if self._down_until:
+            if time.monotonic() < self._down_until:
+                self._mark_dirty(keys, version)
+                return local_op()
+            try:
+                await self._arecover()
+            except REDIS_ERRORS as e:
+                self._degrade(e)
+                self._mark_dirty(keys, version)
+                return local_op()
+
+        try:
+            return await redis_op()
+        except REDIS_ERRORS as e:
+            self._degrade(e)
+            self._mark_dirty(keys, version)
+            return local_op()
+
+    def get_async_client(self):
+        """
+        Cliente redis.asyncio para el event loop actual (un pool asyncio no puede
+        compartirse entre loops). Usa la misma URL y timeouts que el cliente síncrono.
+        """
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            # redis.asyncio solo en procesos con vistas async: los workers de Celery no lo cargan
+            from redis.asyncio import Redis as AsyncRedis
+            location = self._server if isinstance(self._server, str) else self._server[0]
+            options = self._redis_options
+            client = AsyncRedis.from_url(
+                location.split(',')[0],
+                max_connections=options.get('CONNECTION_POOL_KWARGS', {}).get('max_connections'),
+                socket_connect_timeout=options.get('SOCKET_CONNECT_TIMEOUT'),
+                socket_timeout=options.get('SOCKET_TIMEOUT'),
+            )
+            self._async_clients[loop] = client
+        return client
+
+    # API de cache de Django
+
+    def _record_read(self, hit):
+        record_cache_read(hit, 'local' if self._down_until else 'redis')
+
+    def get(self, key, default=None, version=None, client=None):
+        value = self._run(
+            lambda: super(ResilientRedisCache, self).get(key, default, version, client),
+            lambda: self._local.get(key, default, version),
+        )
+        self._record_read(value is not default)
+        return value
+
+    def get_many(self, keys, version=None, client=None):
+        values = self._run(
+            lambda: super(ResilientRedisCache, self).get_many(keys, version=version, client=client),
+            lambda: self._local.get_many(keys, version=version),
+        )
+        for key in keys:
+            self._record_read(key in values)
+        return values
+
+    def has_key(self, key, version=None, client=None):
+        return self._run(
+            lambda: super(ResilientRedisCache, self).has_key(key, version=version, client=client),
+            lambda: self._local.has_key(key, version=version),
+        )
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, client=None, nx=False, xx=False):
+        def local_set():
+            if nx:
+                return self._local.add(key, value, timeout, version)
+            if xx and not self._local.has_key(key, version):
+                return False
+            self._local.set(key, value, timeout, version)
+            return True
+
+        return self._run(
+            lambda: super(ResilientRedisCache, self).set(
+                key, value, timeout, version=version, client=client, nx=nx, xx=xx
+            ),
+            local_set, keys=[key], version=version,
+        )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, client=None):
+        return self._run(
+            lambda: super(ResilientRedisCache, self).add(key, value, timeout, version=version, client=client),
+            lambda: self._local.add(key, value, timeout, version),
+            keys=[key], version=version,
+        )
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None, client=None):
+        return self._run(
+            lambda: super(ResilientRedisCache, self).set_many(data, timeout, version=version, client=client),
+            lambda: self._local.set_many(data, timeout, version),
+            keys=list(data), version=version,
+        )
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None, client=None):
+        return self._run(
+            lambda: super(ResilientRedisCache, self).touch(key, timeout, version=version, client=client),
+            lambda: self._local.touch(key, timeout, version),
+        )
+
+    def incr(self, key, delta=1, version=None, client=None):
+        return self._run(
+            lambda: super(ResilientRedisCache, self).incr(key, delta, version=version, client=client),
+            lambda: self._local.incr(key, delta, version),
+            keys=[key], version=version,
+        )
+
+    def decr(self, key, delta=1, version=None, client=None):
+        return self._run(
+            lambda: super(ResilientRedisCache, self).decr(key, delta, version=version, client=client),
+            lambda: self._local.decr(key, delta, version),
+            keys=[key], version=version,
+        )
+
+    def delete(self, key, version=None, client=None):
+        return self._run(
+            lambda: super(ResilientRedisCache, self).delete(key, version=version, client=client),
+            lambda: self._local.delete(key, version),
+            keys=[key], version=version,
+        )
+
+    def delete_many(self, keys, version=None, client=None):
+        keys = list(keys)
+        return self._run(
+            lambda: super(ResilientRedisCache, self).delete_many(keys, version=version, client=client),
+            lambda: self._local.delete_many(keys, version),
+            keys=keys, version=version,
+        )
+
+    def clear(self):
+        self._local.clear()
+        return self._run(lambda: super(ResilientRedisCache, self).clear(), self._mark_overflow)
+
+    # API async nativa (redis.asyncio): sin saltos a hilos en las vistas async
+
+    async def aget(self, key, default=None, version=None):
+        async def redis_get():
+            value = await self.get_async_client().get(self.client.make_key(key, version=version))
+            return default if value is None else self.client.decode(value)
+
+        value = await self._arun(redis_get, lambda: self._local.get(key, default, version))
+        self._record_read(value is not default)
+        return value
+
+    async def aset(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        async def redis_set():
+            nkey = self.client.make_key(key, version=version)
+            # TTL relativo, como DefaultClient.set (get_backend_timeout devuelve un instante absoluto)
+            ttl = self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+            if ttl is not None and ttl <= 0:
+                await self.get_async_client().delete(nkey)
+                return
+            px = None if ttl is None else int(ttl * 1000)
+            await self.get_async_client().set(nkey, self.client.encode(value), px=px)
+
+        return await self._arun(
+            redis_set, lambda: self._local.set(key, value, timeout, version), keys=[key], version=version,
+        )
+
+    async def adelete(self, key, version=None):
+        async def redis_delete():
+            return bool(await self.get_async_client().delete(self.client.make_key(key, version=version)))
+
+        return await self._arun(
+            redis_delete, lambda: self._local.delete(key, version), keys=[key], version=version,
+        )
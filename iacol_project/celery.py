@@ -1,6 +1,5 @@
 import os
 from celery import Celery
-from django.core.mail import send_mail
 from django.conf import settings
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'iacol_project.settings')
@@ -18,6 +17,7 @@ def debug_task(self):
 @app.task
 def send_email_task(subject, message, recipient_list):
     """Tarea asíncrona para envío de emails"""
+    from django.core.mail import send_mail
     try:
         send_mail(
             subject=subject,
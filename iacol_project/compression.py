@@ -0,0 +1,220 @@
+"""
+Política de compresión de respuestas dinámicas.
+
+Sustituye a BrotliMiddleware + GZipMiddleware, que comprimían en Python cada
+respuesta. Los estáticos no pasan por aquí: collectstatic
+(CompressedManifestStaticFilesStorage) genera los .br/.gz en el build y
+WhiteNoise los sirve ya comprimidos. Este middleware:
+
+- no comprime cuerpos pequeños (COMPRESSION_MIN_SIZE), archivos (FileResponse),
+  SSE ni tipos ya comprimidos (imágenes, fuentes, zip, pdf...);
+- negocia br (COMPRESSION_BROTLI_QUALITY) o gzip;
+- guarda la variante comprimida de las páginas cacheables (Cache-Control
+  público con max-age, sin cookies) en un LRU en memoria del proceso indexado
+  por el hash del cuerpo, así una página servida desde cache se comprime una
+  sola vez por worker.
+"""
+import hashlib
+import re
+import secrets
+import threading
+from collections import OrderedDict
+from gzip import GzipFile
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import FileResponse
+from django.utils.cache import get_max_age, patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+from django.utils.text import StreamingBuffer, compress_sequence, compress_string
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+re_accepts_br = _lazy_re_compile(r'\bbr\b')
+re_accepts_gzip = _lazy_re_compile(r'\bgzip\b')
+
+# Texto, JSON/XML (incluidos los sufijos +json/+xml) y SVG; todo lo demás
+# (imágenes rasterizadas, fuentes woff, archivos, pdf, vídeo) ya va comprimido
+COMPRESSIBLE_TYPES = re.compile(
+    r'^(text/|application/(json|javascript|x-javascript|xml|[\w.+-]+\+(json|xml))|image/svg\+xml|image/x-icon)',
+    re.IGNORECASE,
+)
+NEVER_COMPRESS_TYPES = ('text/event-stream',)
+
+
+class CompressedVariantCache:
+    """LRU en memoria (limitado en bytes) de cuerpos ya comprimidos"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = value
+            self._size += len(value)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+variant_cache = CompressedVariantCache(getattr(settings, 'COMPRESSION_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+
+
+async def acompress_sequence(sequence, *, max_random_bytes=None):
+    """
+    compress_sequence() para iteradores async: un único flujo gzip que se vacía
+    tras cada fragmento (comprimir cada fragmento por separado daría un gzip
+    multi-miembro que no todos los clientes decodifican y comprime peor)
+    """
+    buf = StreamingBuffer()
+    # Relleno de longitud aleatoria en el nombre de fichero (BREACH), como compress_sequence()
+    filename = b'a' * secrets.randbelow(max_random_bytes) if max_random_bytes else None
+    with GzipFile(filename=filename, mode='wb', compresslevel=6, fileobj=buf, mtime=0) as zfile:
+        # Cabecera gzip
+        yield buf.read()
+        async for item in sequence:
+            zfile.write(item)
+            zfile.flush()
+            data = buf.read()
+            if data:
+                yield data
+    yield buf.read()
+
+
+def is_compressible(response):
+    """Aplica la política: tipo comprimible, sin Content-Encoding y no un archivo"""
+    if response.has_header('Content-Encoding') or isinstance(response, FileResponse):
+        return False
+    content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+    if content_type in NEVER_COMPRESS_TYPES:
+        return False
+    return bool(COMPRESSIBLE_TYPES.match(content_type))
+
+
+def is_cacheable(response):
+    """Páginas que un cache compartido puede reutilizar: su cuerpo se repite"""
+    if response.status_code != 200 or response.cookies:
+        return False
+    cache_control = response.get('Cache-Control', '').lower()
+    if 'private' in cache_control or 'no-store' in cache_control:
+        return False
+    return bool(get_max_age(response))
+
+
+def negotiate_encoding(request):
+    accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    if brotli is not None and re_accepts_br.search(accept_encoding):
+        return 'br'
+    if re_accepts_gzip.search(accept_encoding):
+        return 'gzip'
+    return None
+
+
+class CompressionMiddleware:
+    """
+    Middleware síncrono y async: bajo ASGI comprime en el mismo event loop en
+    vez de saltar a un hilo como haría MiddlewareMixin.process_response().
+    """
+    sync_capable = True
+    async_capable = True
+
+    # Mitigación BREACH de GZipMiddleware para respuestas no cacheables
+    max_random_bytes = 100
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_size = settings.COMPRESSION_MIN_SIZE
+        self.brotli_quality = settings.COMPRESSION_BROTLI_QUALITY
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def process_response(self, request, response):
+        if not is_compressible(response):
+            return response
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate_encoding(request)
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            # Exportaciones grandes: gzip incremental, sin Content-Length
+            if response.is_async:
+                response.streaming_content = acompress_sequence(
+                    response.streaming_content, max_random_bytes=self.max_random_bytes,
+                )
+            else:
+                response.streaming_content = compress_sequence(
+                    response.streaming_content, max_random_bytes=self.max_random_bytes,
+                )
+            encoding = 'gzip'
+            del response.headers['Content-Length']
+        else:
+            compressed = self.compress_content(response, encoding)
+            if compressed is None:
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def compress_content(self, response, encoding):
+        """Cuerpo comprimido, o None si no reduce el tamaño"""
+        content = response.content
+        cache_key = None
+        if is_cacheable(response):
+            cache_key = (encoding, hashlib.blake2b(content, digest_size=16).digest())
+            cached = variant_cache.get(cache_key)
+            if cached is not None:
+                return cached or None
+
+        if encoding == 'br':
+            compressed = brotli.compress(content, quality=self.brotli_quality)
+        elif cache_key is not None:
+            # Cuerpo público y repetido: sin relleno aleatorio para poder reutilizarlo
+            compressed = compress_string(content)
+        else:
+            compressed = compress_string(content, max_random_bytes=self.max_random_bytes)
+
+        if len(compressed) >= len(content):
+            compressed = b''
+        if cache_key is not None:
+            variant_cache.set(cache_key, compressed)
+        return compressed or None
@@ -0,0 +1,220 @@
+"""
+Liveness y readiness para el orquestador y el balanceador.
+
+- /health/live/ (y /health/): el proceso responde; no toca ninguna dependencia.
+- /health/ready/: sondea Postgres, Redis, la cola del broker de Celery y el
+  almacenamiento de media. 503 si falla una dependencia crítica
+  (HEALTH_CRITICAL_PROBES), para que el balanceador saque al worker de
+  rotación; 200 con "degraded" si falla una no crítica (Redis tiene respaldo
+  local, una cola de Celery larga no impide atender peticiones).
+
+Los resultados se guardan en memoria del proceso HEALTH_CHECK_CACHE_SECONDS
+(no en Redis, que es una de las dependencias) y solo un hilo los refresca a la
+vez: un balanceador que sondea cada segundo desde varios nodos no multiplica
+las consultas a la base de datos. Mientras se refrescan, los demás sondeos
+reciben el resultado anterior en lugar de esperar.
+
+Cada sondeo está acotado por HEALTH_PROBE_TIMEOUT. El de Postgres usa una
+conexión propia, fuera del pool: con el pool agotado o Postgres caído,
+pedirle una conexión esperaría DB_POOL_TIMEOUT, más que el timeout del
+healthcheck del contenedor.
+
+HealthCheckMiddleware va primero en MIDDLEWARE y responde antes de la
+validación de ALLOWED_HOSTS, la redirección a HTTPS, la sesión y las métricas
+de peticiones: los sondeos llegan directamente al contenedor por IP y HTTP.
+El detalle de cada sondeo solo se incluye para IPs internas.
+"""
+import math
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+
+import psycopg
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import JsonResponse
+
+from .metrics import is_internal_request
+
+OK = 'ok'
+DEGRADED = 'degraded'
+DOWN = 'down'
+
+# /health/ era el health check anterior (sin sondeos): se mantiene como liveness
+LIVENESS_PATHS = ('/health/', '/health/live/')
+READINESS_PATH = '/health/ready/'
+
+
+def probe_database():
+    timeout = settings.HEALTH_PROBE_TIMEOUT
+    params = connections['default'].get_connection_params()
+    # connect_timeout son segundos enteros (libpq aplica un mínimo de 2)
+    params['connect_timeout'] = max(1, math.ceil(timeout))
+    params['options'] = f"{params.get('options', '')} -c statement_timeout={int(timeout * 1000)}".strip()
+    with psycopg.connect(**params) as conn:
+        conn.execute('SELECT 1')
+    return OK, {}
+
+
+def probe_redis():
+    from django_redis import get_redis_connection
+    get_redis_connection('default').ping()
+    return OK, {}
+
+
+_broker_client = None
+
+
+def get_broker_client():
+    global _broker_client
+    if _broker_client is None:
+        import redis
+        _broker_client = redis.Redis.from_url(
+            settings.CELERY_BROKER_URL,
+            socket_connect_timeout=settings.HEALTH_PROBE_TIMEOUT,
+            socket_timeout=settings.HEALTH_PROBE_TIMEOUT,
+        )
+    return _broker_client
+
+
+def probe_celery_broker():
+    """Profundidad de las colas (listas de Redis): una cola larga indica workers caídos o saturados"""
+    if not settings.CELERY_BROKER_URL.startswith(('redis://', 'rediss://')):
+        return OK, {'detail': 'broker no Redis: sin profundidad de cola'}
+    client = get_broker_client()
+    pipe = client.pipeline(transaction=False)
+    for queue in settings.HEALTH_CELERY_QUEUES:
+        pipe.llen(queue)
+    depths = dict(zip(settings.HEALTH_CELERY_QUEUES, pipe.execute()))
+    status = DEGRADED if max(depths.values(), default=0) > settings.HEALTH_CELERY_QUEUE_MAX_DEPTH else OK
+    return status, {'queue_depth': depths}
+
+
+def probe_storage():
+    media_root = str(settings.MEDIA_ROOT)
+    if not os.path.isdir(media_root) or not os.access(media_root, os.W_OK):
+        return DOWN, {'detail': 'MEDIA_ROOT no existe o no se puede escribir'}
+    free_mb = shutil.disk_usage(media_root).free // (1024 * 1024)
+    status = DEGRADED if free_mb < settings.HEALTH_STORAGE_MIN_FREE_MB else OK
+    return status, {'free_mb': free_mb}
+
+
+PROBES = {
+    'database': probe_database,
+    'redis': probe_redis,
+    'celery_broker': probe_celery_broker,
+    'storage': probe_storage,
+}
+
+
+def run_probe(name, probe):
+    start = time.perf_counter()
+    try:
+        status, details = probe()
+    except Exception as e:
+        status, details = DOWN, {'detail': f'{type(e).__name__}: {e}'}
+    if status != OK and name not in settings.HEALTH_CRITICAL_PROBES:
+        # Una dependencia no crítica caída degrada el servicio pero no lo saca de rotación
+        status = DEGRADED
+    return {'status': status, 'latency_ms': round((time.perf_counter() - start) * 1000, 2), **details}
+
+
+def overall_status(checks):
+    statuses = {check['status'] for check in checks.values()}
+    if DOWN in statuses:
+        return DOWN
+    return DEGRADED if DEGRADED in statuses else OK
+
+
+class ProbeCache:
+    """Último resultado de los sondeos, refrescado por un solo hilo a la vez"""
+
+    def __init__(self):
+        self._result = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def fresh(self):
+        """(resultado, antigüedad) si no ha vencido; None en otro caso"""
+        result, checked_at = self._result, self._checked_at
+        age = time.monotonic() - checked_at
+        if result is not None and age < settings.HEALTH_CHECK_CACHE_SECONDS:
+            return result, age
+        return None
+
+    def get(self):
+        cached = self.fresh()
+        if cached is not None:
+            return cached
+        # Si otro hilo ya está refrescando se responde con el resultado anterior
+        if not self._lock.acquire(blocking=self._result is None):
+            return self._result, time.monotonic() - self._checked_at
+        try:
+            # Otro hilo pudo refrescarlo mientras se esperaba el lock
+            cached = self.fresh()
+            if cached is not None:
+                return cached
+            checks = {name: run_probe(name, probe) for name, probe in PROBES.items()}
+            self._result = {'status': overall_status(checks), 'checks': checks}
+            self._checked_at = time.monotonic()
+            return self._result, 0.0
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        self._result = None
+        self._checked_at = 0.0
+
+
+probe_cache = ProbeCache()
+
+
+def _timestamp():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def liveness_response():
+    response = JsonResponse({'status': 'alive', 'timestamp': _timestamp()})
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+def readiness_response(request, result, age):
+    body = {'status': result['status'], 'timestamp': _timestamp(), 'age': round(age, 2)}
+    if is_internal_request(request):
+        body['checks'] = result['checks']
+    response = JsonResponse(body, status=503 if result['status'] == DOWN else 200)
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+class HealthCheckMiddleware:
+    """Primero en MIDDLEWARE: responde los sondeos sin pasar por el resto de la pila"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if request.path in LIVENESS_PATHS:
+            return liveness_response()
+        if request.path == READINESS_PATH:
+            return readiness_response(request, *probe_cache.get())
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if request.path in LIVENESS_PATHS:
+            return liveness_response()
+        if request.path == READINESS_PATH:
+            # Con el resultado vigente no hace falta saltar a un hilo
+            cached = probe_cache.fresh() or await sync_to_async(probe_cache.get)()
+            return readiness_response(request, *cached)
+        return await self.get_response(request)
@@ -0,0 +1,157 @@
+"""
+Logging no bloqueante: los hilos de las peticiones solo encolan el registro y
+un hilo escritor (QueueListener) hace la E/S de ficheros y consola.
+
+- QueueListenerHandler: QueueHandler con cola acotada y su propio
+  QueueListener (dictConfig de Python 3.11 no configura listeners), que
+  recibe los nombres de los handlers de destino. Con la cola llena el registro
+  se descarta (y se cuenta) en vez de bloquear la petición.
+- SamplingFilter: deja pasar solo una fracción de los INFO/DEBUG de los
+  loggers de alto volumen; WARNING y superiores nunca se muestrean.
+- JSONFormatter: una línea JSON por registro, con los campos de `extra`.
+
+Los mensajes deben usar formato % perezoso (logger.info("... %s", valor)):
+si el nivel está desactivado o el registro se descarta por muestreo, el
+mensaje nunca se formatea.
+"""
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Atributos de LogRecord; el resto son campos de `extra`
+RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+# Solo se serializan extras simples: objetos como `request` (django.request) se
+# formatearían en el hilo escritor y podrían tocar la sesión o la base de datos
+JSON_EXTRA_TYPES = (str, int, float, bool, list, tuple, dict, type(None))
+
+_exception_formatter = logging.Formatter()
+
+
+class JSONFormatter(logging.Formatter):
+    """Registro estructurado: campos fijos, `extra` y traza de la excepción"""
+
+    def format(self, record):
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'module': record.module,
+            'message': record.getMessage(),
+            'process': record.process,
+            'thread': record.thread,
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRS and not key.startswith('_') and isinstance(value, JSON_EXTRA_TYPES):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Muestrea los registros por debajo de WARNING de los loggers indicados
+    (prefijos; todos si no se indican). Los que pasan llevan `sample_rate`
+    para poder reponderar los conteos.
+    """
+
+    def __init__(self, rate=1.0, loggers=()):
+        super().__init__()
+        self.rate = rate
+        self.loggers = tuple(loggers)
+
+    def filter(self, record):
+        if self.rate >= 1 or record.levelno >= logging.WARNING:
+            return True
+        if self.loggers and not record.name.startswith(self.loggers):
+            return True
+        if random.random() >= self.rate:
+            return False
+        record.sample_rate = self.rate
+        return True
+
+
+def get_handler_by_name(name):
+    # logging.getHandlerByName() llega en Python 3.12
+    getter = getattr(logging, 'getHandlerByName', None)
+    return getter(name) if getter else logging._handlers.get(name)
+
+
+class QueueListenerHandler(QueueHandler):
+    """
+    QueueHandler con su propio QueueListener. dictConfig configura los
+    handlers en orden alfabético, así que el nombre de este debe ir después
+    de los de sus destinos ('queue' tras 'console' y 'file').
+    """
+
+    def __init__(self, handlers, queue_size=10000):
+        super().__init__(queue.Queue(queue_size))
+        self.targets = [get_handler_by_name(name) for name in handlers]
+        missing = [name for name, target in zip(handlers, self.targets) if target is None]
+        if missing:
+            raise ValueError(f"Handlers de destino aún no configurados: {', '.join(missing)}")
+        self.queue_size = queue_size
+        self.dropped = 0
+        self.listener = None
+        self._closed = False
+        self._lock = threading.Lock()
+        # Los hilos no sobreviven a fork (gunicorn --preload, Celery prefork)
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _start_listener(self):
+        # Con el primer registro del proceso, no al configurar
+        with self._lock:
+            if self.listener is None and not self._closed:
+                self.listener = QueueListener(self.queue, *self.targets, respect_handler_level=True)
+                self.listener.start()
+
+    def _reset_after_fork(self):
+        self.queue = queue.Queue(self.queue_size)
+        self.listener = None
+        self._lock = threading.Lock()
+
+    def prepare(self, record):
+        """
+        Copia con el mensaje ya formateado y la traza como texto (los argumentos y
+        el traceback no se comparten con el hilo escritor). A diferencia del
+        QueueHandler estándar la traza queda en exc_text, no en el mensaje, para
+        que JSONFormatter la emita en su propio campo.
+        """
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self.listener is None:
+            self._start_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Sin bloquear: el contador es orientativo
+            self.dropped += 1
+
+    def close(self):
+        # Vacía la cola antes de cerrar (logging.shutdown al salir o al reconfigurar)
+        with self._lock:
+            self._closed = True
+            listener, self.listener = self.listener, None
+        if listener is not None and listener._thread is not None:
+            listener.stop()
+        super().close()
+
@@ -0,0 +1,192 @@
+"""
+Métricas Prometheus por petición, expuestas en /metrics.
+
+- iacol_http_requests_total / iacol_http_request_duration_seconds por vista
+  (nombre de URL), método y status;
+- consultas SQL y tiempo de base de datos por petición;
+- aciertos y fallos de cache (tier redis o local);
+- tamaño de respuesta y peticiones en curso.
+
+Con varios workers de gunicorn cada proceso escribe sus valores en
+PROMETHEUS_MULTIPROC_DIR y /metrics los agrega (MultiProcessCollector); ver
+gunicorn.conf.py. Sin esa variable (desarrollo, tests) se usa el registro del
+proceso.
+
+Las consultas se cuentan con un execute_wrapper instalado en cada conexión
+(señal connection_created). El acumulador de la petición vive en un
+ContextVar, que sync_to_async copia al hilo: las vistas async también cuentan
+las consultas que hacen vía el ORM async.
+"""
+import contextvars
+import ipaddress
+import os
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import REGISTRY, multiprocess
+
+UNRESOLVED_VIEW = '<unresolved>'
+
+# gunicorn.conf.py vacía y crea el directorio al arrancar el servidor web, pero
+# cualquier otro proceso con la variable (manage.py, Celery) escribe sus
+# valores al crear el primer gauge: sin el directorio fallaría al importar
+if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+REQUESTS = Counter(
+    'iacol_http_requests_total', 'Peticiones HTTP por vista, método y status',
+    ['view', 'method', 'status'],
+)
+REQUEST_DURATION = Histogram(
+    'iacol_http_request_duration_seconds', 'Duración de la petición hasta devolver la respuesta',
+    ['view', 'method'],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+RESPONSE_SIZE = Histogram(
+    'iacol_http_response_size_bytes', 'Tamaño del cuerpo de la respuesta (tras la compresión)',
+    ['view'],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+)
+IN_FLIGHT = Gauge(
+    'iacol_http_requests_in_flight', 'Peticiones en curso',
+    multiprocess_mode='livesum',
+)
+DB_QUERIES = Histogram(
+    'iacol_db_queries_per_request', 'Consultas SQL por petición',
+    ['view'],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+DB_DURATION = Histogram(
+    'iacol_db_query_duration_seconds_per_request', 'Tiempo total en la base de datos por petición',
+    ['view'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+CACHE_REQUESTS = Counter(
+    'iacol_cache_requests_total', 'Lecturas de cache por resultado y tier',
+    ['result', 'tier'],
+)
+
+
+class RequestStats:
+    __slots__ = ('queries', 'query_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+
+
+_request_stats = contextvars.ContextVar('iacol_request_stats', default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    stats = _request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.query_time += time.perf_counter() - start
+
+
+def install_query_counter(sender, connection, **kwargs):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+connection_created.connect(install_query_counter, dispatch_uid='iacol_metrics_query_counter')
+# Conexiones abiertas antes de cargar este módulo
+for _connection in connections.all(initialized_only=True):
+    install_query_counter(None, _connection)
+
+
+def record_cache_read(hit, tier='redis'):
+    """Llamado por iacol_project.cache en cada lectura"""
+    CACHE_REQUESTS.labels('hit' if hit else 'miss', tier).inc()
+
+
+def get_view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else UNRESOLVED_VIEW
+
+
+class MetricsMiddleware:
+    """Primer middleware de la cadena: mide todo lo que hacen los demás"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token, start = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            IN_FLIGHT.dec()
+            _request_stats.reset(token)
+        self._observe(request, response, stats, start)
+        return response
+
+    async def __acall__(self, request):
+        stats, token, start = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            IN_FLIGHT.dec()
+            _request_stats.reset(token)
+        self._observe(request, response, stats, start)
+        return response
+
+    def _start(self):
+        IN_FLIGHT.inc()
+        stats = RequestStats()
+        return stats, _request_stats.set(stats), time.perf_counter()
+
+    def _observe(self, request, response, stats, start):
+        view = get_view_name(request)
+        REQUEST_DURATION.labels(view, request.method).observe(time.perf_counter() - start)
+        REQUESTS.labels(view, request.method, str(response.status_code)).inc()
+        DB_QUERIES.labels(view).observe(stats.queries)
+        DB_DURATION.labels(view).observe(stats.query_time)
+        if not response.streaming:
+            RESPONSE_SIZE.labels(view).observe(len(response.content))
+
+
+def is_internal_request(request):
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return address.is_private or address.is_loopback
+
+
+def metrics_view(request):
+    """
+    Exposición para Prometheus. Con METRICS_TOKEN exige `Authorization: Bearer
+    <token>`; sin él solo responde a IPs internas (nginx no enruta /metrics).
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        if not constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'):
+            return HttpResponseForbidden()
+    elif not is_internal_request(request):
+        return HttpResponseForbidden()
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
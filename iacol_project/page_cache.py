@@ -0,0 +1,169 @@
+"""
+Cache de página completa para visitantes anónimos (landings y páginas de marketing).
+
+La clave depende del idioma activo (prefijo de i18n_patterns) y de la ruta;
+los parámetros de campaña (utm_*, gclid, fbclid...) no la fragmentan. No se
+cachea ni se sirve desde cache cuando:
+
+- el usuario está autenticado o tiene mensajes pendientes;
+- la respuesta usó el token CSRF, escribió cookies o la sesión;
+- la respuesta no es 200 o es privada / no-store.
+
+Purga:
+- purge_page_cache(['resources']) invalida esas páginas en todos los idiomas
+  (la usan BlogPost y Agent al guardarse o borrarse);
+- purge_page_cache() invalida todo subiendo la generación (comando
+  `manage.py purge_page_cache` en cada despliegue); cambiar PAGE_CACHE_VERSION
+  tiene el mismo efecto.
+"""
+import functools
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.urls import reverse
+from django.utils import translation
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'page:'
+GENERATION_KEY = 'page:generation'
+TRACKING_PARAMS = ('utm_', 'gclid', 'fbclid', 'msclkid', '_ga')
+
+# Generación leída de Redis, memorizada en el proceso PAGE_CACHE_GENERATION_TTL segundos
+_generation = (None, 0)
+_generation_lock = threading.Lock()
+
+
+def get_page_cache():
+    return caches[settings.PAGE_CACHE_ALIAS]
+
+
+def get_generation():
+    global _generation
+    value, expires = _generation
+    now = time.monotonic()
+    if value is not None and expires > now:
+        return value
+
+    value = get_page_cache().get(GENERATION_KEY, 0)
+    with _generation_lock:
+        _generation = (value, now + settings.PAGE_CACHE_GENERATION_TTL)
+    return value
+
+
+def page_cache_key(path, language, generation=None):
+    if generation is None:
+        generation = get_generation()
+    return f"{KEY_PREFIX}{settings.PAGE_CACHE_VERSION}:{generation}:{language}:{path}"
+
+
+def purge_page_cache(url_names=None):
+    """
+    Invalida las páginas `url_names` en todos los idiomas, o todas si no se
+    indican. Los demás procesos ven una purga total tras PAGE_CACHE_GENERATION_TTL.
+    """
+    global _generation
+    page_cache = get_page_cache()
+    if not url_names:
+        page_cache.add(GENERATION_KEY, 0, None)
+        generation = page_cache.incr(GENERATION_KEY)
+        with _generation_lock:
+            _generation = (generation, time.monotonic() + settings.PAGE_CACHE_GENERATION_TTL)
+        logger.info("Cache de páginas purgado (generación %s)", generation)
+        return generation
+
+    # Generación actual en Redis, no la memorizada (puede haber cambiado en otro proceso)
+    generation = page_cache.get(GENERATION_KEY, 0)
+    keys = []
+    for language, _ in settings.LANGUAGES:
+        with translation.override(language):
+            keys.extend(page_cache_key(reverse(name), language, generation) for name in url_names)
+    page_cache.delete_many(keys)
+    logger.info("Cache de páginas purgado: %s", ', '.join(url_names))
+    return generation
+
+
+def purge_page_cache_on_commit(url_names):
+    """Purga tras el commit, para que ninguna petición recachee el contenido anterior"""
+    def purge():
+        try:
+            purge_page_cache(url_names)
+        except Exception as e:
+            logger.warning("No se pudo purgar el cache de páginas: %s", e)
+    transaction.on_commit(purge)
+
+
+def _only_tracking_params(request):
+    return all(param.startswith(TRACKING_PARAMS) for param in request.GET)
+
+
+def _can_use_page_cache(request):
+    if not settings.PAGE_CACHE_ENABLED or request.method not in ('GET', 'HEAD'):
+        return False
+    if not _only_tracking_params(request):
+        return False
+    if request.user.is_authenticated:
+        return False
+    return not len(get_messages(request))
+
+
+def _is_cacheable_response(request, response):
+    if response.status_code != 200 or response.streaming or response.cookies:
+        return False
+    if request.META.get('CSRF_COOKIE_NEEDS_UPDATE'):
+        return False
+    session = getattr(request, 'session', None)
+    if session is not None and session.modified:
+        return False
+    cache_control = response.get('Cache-Control', '').lower()
+    return 'private' not in cache_control and 'no-store' not in cache_control
+
+
+def _patch_public(response):
+    # Cache compartido corto (nginx/CDN/navegador); Vary: Cookie para que al
+    # iniciar sesión no se reutilice la versión anónima
+    patch_cache_control(response, public=True, max_age=settings.PAGE_CACHE_MAX_AGE)
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def anonymous_page_cache(timeout=None):
+    """
+    Decorador de vistas síncronas: sirve la página desde el cache de Django
+    (Redis) a los anónimos y la guarda al renderizarla sin datos de la sesión.
+    """
+    def decorator(view_func):
+        @functools.wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not _can_use_page_cache(request):
+                return view_func(request, *args, **kwargs)
+
+            page_cache = get_page_cache()
+            key = page_cache_key(request.path, request.LANGUAGE_CODE)
+            cached = page_cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                response = HttpResponse(content, content_type=content_type)
+                response['X-Page-Cache'] = 'HIT'
+                return _patch_public(response)
+
+            response = view_func(request, *args, **kwargs)
+            if _is_cacheable_response(request, response):
+                # Solo se guarda lo renderizado para la URL limpia
+                if not request.GET:
+                    page_cache.set(
+                        key, (response.content, response['Content-Type']),
+                        settings.PAGE_CACHE_TIMEOUT if timeout is None else timeout,
+                    )
+                response['X-Page-Cache'] = 'MISS'
+                _patch_public(response)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,77 @@
+"""
+Paginador para tablas grandes (p. ej. el admin de AgentUsageLog).
+
+- count: sin filtros usa pg_class.reltuples (lo mantiene autovacuum/ANALYZE);
+  con filtros, la estimación de filas del planificador (EXPLAIN). Solo si la
+  estimación es pequeña (< exact_count_threshold) se hace el COUNT(*) exacto,
+  que entonces es barato.
+- page(): con el listado ordenado por la clave primaria, la página se localiza
+  por keyset (WHERE pk <= (subconsulta sobre el índice de la pk)) en vez de
+  OFFSET sobre filas completas con sus JOIN: el salto recorre solo el índice.
+
+Con otras ordenaciones o bases de datos se comporta como Paginator.
+"""
+import json
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet, Subquery
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    exact_count_threshold = 10000
+
+    def _is_postgres_queryset(self):
+        return isinstance(self.object_list, QuerySet) and connections[self.object_list.db].vendor == 'postgresql'
+
+    def estimated_count(self):
+        """Estimación de filas de object_list, o None si Postgres no la tiene"""
+        queryset = self.object_list
+        with connections[queryset.db].cursor() as cursor:
+            if not queryset.query.where:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+                # -1: tabla nunca analizada (Postgres 14+)
+                return row[0] if row and row[0] >= 0 else None
+            sql, params = queryset.order_by().values('pk').query.sql_with_params()
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    @cached_property
+    def count(self):
+        if not self._is_postgres_queryset():
+            return super().count
+        estimate = self.estimated_count()
+        if estimate is None or estimate < self.exact_count_threshold:
+            return super().count
+        return estimate
+
+    def _keyset_lookup(self):
+        """'pk__lte' / 'pk__gte' si object_list está ordenado solo por la pk"""
+        if not self._is_postgres_queryset():
+            return None
+        pk_names = {'pk', self.object_list.model._meta.pk.attname}
+        ordering = tuple(self.object_list.query.order_by)
+        if len(ordering) != 1:
+            return None
+        field = ordering[0]
+        if field.lstrip('-') not in pk_names:
+            return None
+        return 'pk__lte' if field.startswith('-') else 'pk__gte'
+
+    def page(self, number):
+        number = self.validate_number(number)
+        lookup = self._keyset_lookup()
+        bottom = (number - 1) * self.per_page
+        if lookup is None or bottom == 0:
+            return super().page(number)
+        start_pk = self.object_list.values('pk')[bottom:bottom + 1]
+        object_list = self.object_list.filter(**{lookup: Subquery(start_pk)})[:self.per_page]
+        return self._get_page(object_list, number, self)
@@ -0,0 +1,166 @@
+"""
+Backend PostgreSQL con pool de conexiones psycopg_pool (Django 4.2 no lo trae;
+llega de forma nativa en Django 5.1 con la misma opción OPTIONS['pool']).
+
+    DATABASES = {'default': {
+        'ENGINE': 'iacol_project.postgresql_pool',
+        ...
+        'CONN_MAX_AGE': 0,
+        'OPTIONS': {'pool': {'min_size': 2, 'max_size': 10, 'max_lifetime': 1800, 'check': True}},
+    }}
+
+Cada proceso (worker de gunicorn/uvicorn, worker de Celery) tiene su propio
+pool. Django sigue manejando una conexión por hilo/contexto: al cerrarla al
+final de la petición o de la tarea (CONN_MAX_AGE=0) se devuelve al pool en vez
+de cerrarse, por lo que el modelo es seguro con la ejecución thread-sensitive
+de ASGI. Sin OPTIONS['pool'] se comporta como el backend estándar.
+
+OPTIONS['pool']['timeout'] es la espera por una conexión libre con el pool
+saturado. Si además hubo conexiones fallidas durante esa espera, PostgreSQL no
+está aceptando conexiones: hasta la siguiente conexión entregada, las
+peticiones esperan como mucho BROKEN_POOL_TIMEOUT en vez de bloquear el
+worker el timeout completo cada una.
+"""
+import logging
+import os
+import threading
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.db.backends.postgresql import base
+from psycopg_pool import ConnectionPool, PoolTimeout
+
+from .creation import DatabaseCreation
+
+logger = logging.getLogger(__name__)
+
+# alias -> (clave del pool, pool); la clave incluye el PID para que un proceso
+# hijo (fork de Celery) cree su propio pool
+_pools = {}
+_pools_lock = threading.Lock()
+
+BROKEN_POOL_TIMEOUT = 1.0  # segundos de espera mientras PostgreSQL rechaza conexiones
+
+
+class DjangoConnectionPool(ConnectionPool):
+    """ConnectionPool que falla enseguida mientras PostgreSQL no acepta conexiones"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.broken = False
+
+    def getconn(self, timeout=None):
+        if self.broken:
+            timeout = min(self.timeout if timeout is None else timeout, BROKEN_POOL_TIMEOUT)
+        errors = self.get_stats().get('connections_errors', 0)
+        started = time.monotonic()
+        try:
+            connection = super().getconn(timeout)
+        except PoolTimeout:
+            if not self.broken and self.get_stats().get('connections_errors', 0) > errors:
+                self.broken = True
+                logger.error("Pool '%s' sin conexiones tras %.1fs: PostgreSQL no acepta conexiones",
+                             self.name, time.monotonic() - started)
+            raise
+        if self.broken:
+            self.broken = False
+            logger.info("Pool '%s' entrega conexiones de nuevo", self.name)
+        return connection
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._connection_pool = None  # pool que entregó self.connection
+        if self.pool_options and self.settings_dict['CONN_MAX_AGE'] != 0:
+            raise ImproperlyConfigured(
+                "OPTIONS['pool'] requiere CONN_MAX_AGE = 0: la conexión se devuelve al pool al final de cada petición."
+            )
+
+    @property
+    def pool_options(self):
+        if self.alias == NO_DB_ALIAS:
+            return None
+        options = self.settings_dict['OPTIONS'].get('pool')
+        if not options:
+            return None
+        return {} if options is True else dict(options)
+
+    @property
+    def pool(self):
+        pool_options = self.pool_options
+        if pool_options is None:
+            return None
+
+        # Se recrea si cambia la base de datos (p. ej. la base de tests) o el proceso
+        key = (self.alias, os.getpid(), self.settings_dict['NAME'], self.settings_dict['HOST'])
+        with _pools_lock:
+            current = _pools.get(self.alias)
+            if current and current[0] == key:
+                return current[1]
+
+            if pool_options.pop('check', True):
+                pool_options['check'] = ConnectionPool.check_connection
+            pool = DjangoConnectionPool(
+                kwargs=self.get_connection_params(),
+                open=False,
+                configure=self._configure_pooled_connection,
+                name=f"django-{self.alias}",
+                **pool_options,
+            )
+            _pools[self.alias] = (key, pool)
+
+        if current and current[0][1] == key[1]:
+            current[1].close()
+        logger.info("Pool de conexiones '%s' creado (pid %s): %s", self.alias, key[1], pool.get_stats())
+        return pool
+
+    def close_pool(self):
+        """Cierra el pool de este alias (conexiones inactivas incluidas)"""
+        with _pools_lock:
+            current = _pools.pop(self.alias, None)
+        if current and current[0][1] == os.getpid():
+            current[1].close()
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop('pool', None)
+        return conn_params
+
+    def _configure_pooled_connection(self, connection):
+        # Misma configuración que get_new_connection() aplica a una conexión directa
+        isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+        if isolation_level is not None:
+            connection.isolation_level = base.IsolationLevel(isolation_level)
+        connection.commit()
+
+    @base.async_unsafe
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+
+        isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+        self.isolation_level = (
+            base.IsolationLevel(isolation_level) if isolation_level is not None
+            else base.IsolationLevel.READ_COMMITTED
+        )
+        # Abre el pool la primera vez sin esperar a min_size
+        pool.open(wait=False)
+        connection = pool.getconn()
+        # El pool puede recrearse mientras la conexión está en uso: vuelve al que la entregó
+        self._connection_pool = pool
+        return connection
+
+    def _close(self):
+        if self.connection is None or self._connection_pool is None:
+            return super()._close()
+
+        with self.wrap_database_errors:
+            # putconn() hace rollback de una transacción abierta o descarta la conexión rota
+            self._connection_pool.putconn(self.connection)
+            self.connection = None
+            self._connection_pool = None
@@ -0,0 +1,177 @@
+"""
+Registro de consultas SQL por petición, detector de N+1 y presupuestos por vista.
+
+Solo para desarrollo y CI (QUERY_INSPECTOR_ENABLED, por defecto igual a DEBUG):
+en producción el middleware se desactiva solo (MiddlewareNotUsed).
+
+    @query_budget(8)
+    def agent_configure(request, agent_id): ...
+
+Con el inspector activo cada respuesta lleva X-Query-Count, se avisa en el log
+de las formas de consulta repetidas más de QUERY_INSPECTOR_N_PLUS_ONE_THRESHOLD
+veces y de los presupuestos excedidos (con QUERY_BUDGET_STRICT se lanza
+QueryBudgetExceeded). En los tests:
+
+    class AgentViewsTest(QueryBudgetTestMixin, TestCase):
+        def test_configure(self):
+            self.assertQueryBudget(f'/agents/{agent.id}/configure/')
+"""
+import contextvars
+import logging
+import re
+import time
+from collections import Counter, namedtuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+RecordedQuery = namedtuple('RecordedQuery', 'sql duration')
+
+# Recorders activos en el contexto actual (se anidan); sync_to_async copia el
+# contexto, así que también reciben las consultas del ORM async
+_active_recorders = contextvars.ContextVar('iacol_query_recorders', default=())
+
+re_in_list = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+re_number = re.compile(r'\b\d+\b')
+re_spaces = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def normalize_sql(sql):
+    """Forma de la consulta: sin listas IN variables ni literales numéricos"""
+    sql = re_in_list.sub('(%s...)', sql)
+    sql = re_number.sub('N', sql)
+    return re_spaces.sub(' ', sql).strip()
+
+
+def record_query(execute, sql, params, many, context):
+    recorders = _active_recorders.get()
+    if not recorders:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        query = RecordedQuery(sql, time.perf_counter() - start)
+        for recorder in recorders:
+            recorder.queries.append(query)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class QueryRecorder:
+    """Context manager que registra las consultas ejecutadas dentro del bloque"""
+
+    def __init__(self):
+        self.queries = []
+        self._token = None
+
+    def __enter__(self):
+        install_query_recorder(None, connections['default'])
+        self._token = _active_recorders.set(_active_recorders.get() + (self,))
+        return self
+
+    def __exit__(self, *exc_info):
+        _active_recorders.reset(self._token)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(query.duration for query in self.queries)
+
+    def repeated_shapes(self, threshold=None):
+        """[(forma, veces)] de las consultas repetidas más de `threshold` veces"""
+        if threshold is None:
+            threshold = settings.QUERY_INSPECTOR_N_PLUS_ONE_THRESHOLD
+        shapes = Counter(normalize_sql(query.sql) for query in self.queries)
+        return [(shape, times) for shape, times in shapes.most_common() if times > threshold]
+
+    def report(self):
+        return '\n'.join(f'{i}. ({query.duration * 1000:.1f} ms) {query.sql}' for i, query in enumerate(self.queries, 1))
+
+
+def query_budget(max_queries):
+    """Declara el máximo de consultas de una vista (función, async o clase basada en vistas)"""
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+def get_query_budget(view_func):
+    budget = getattr(view_func, 'query_budget', None)
+    if budget is None and hasattr(view_func, 'view_class'):
+        budget = getattr(view_func.view_class, 'query_budget', None)
+    return budget
+
+
+class QueryInspectorMiddleware:
+    """Registra las consultas de cada petición; va justo después de MetricsMiddleware"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.QUERY_INSPECTOR_ENABLED:
+            raise MiddlewareNotUsed
+        connection_created.connect(install_query_recorder, dispatch_uid='iacol_query_recorder')
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        return self.inspect(request, response, recorder)
+
+    async def __acall__(self, request):
+        with QueryRecorder() as recorder:
+            response = await self.get_response(request)
+        return self.inspect(request, response, recorder)
+
+    def inspect(self, request, response, recorder):
+        response['X-Query-Count'] = str(recorder.count)
+        for shape, times in recorder.repeated_shapes():
+            logger.warning("Posible N+1 en %s: %d consultas con la forma %s", request.path, times, shape)
+
+        match = getattr(request, 'resolver_match', None)
+        budget = get_query_budget(match.func) if match is not None else None
+        if budget is not None and recorder.count > budget:
+            message = f"{match.view_name}: {recorder.count} consultas, presupuesto {budget}"
+            if settings.QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(f"{message}\n{recorder.report()}")
+            logger.warning("Presupuesto de consultas excedido en %s", message)
+        return response
+
+
+class QueryBudgetTestMixin:
+    """Mixin para TestCase: verifica el presupuesto declarado con @query_budget"""
+
+    def assertQueryBudget(self, path, method='get', n_plus_one_threshold=None, **kwargs):
+        with QueryRecorder() as recorder:
+            response = getattr(self.client, method)(path, **kwargs)
+
+        budget = get_query_budget(response.resolver_match.func)
+        self.assertIsNotNone(budget, f"{response.resolver_match.view_name} no declara @query_budget")
+        self.assertLessEqual(
+            recorder.count, budget,
+            f"{response.resolver_match.view_name}: {recorder.count} consultas (presupuesto {budget})\n{recorder.report()}",
+        )
+        repeated = recorder.repeated_shapes(n_plus_one_threshold)
+        self.assertEqual(repeated, [], f"Consultas repetidas (posible N+1): {repeated}")
+        return response
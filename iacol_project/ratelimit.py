@@ -0,0 +1,295 @@
+"""
+Rate limiting unificado (API keys, usuarios e IPs) con token bucket.
+
+Cada verificación es un único script Lua atómico en Redis (EVALSHA, un solo
+round trip). Si Redis no está disponible se usa un bucket en memoria del
+proceso, de modo que el límite sigue aplicándose (por worker) en vez de
+fallar abierto o bloquear la petición.
+
+Uso:
+    @rate_limit(key='user', rate='20/m', method='GET')
+    def agent_list(request): ...
+"""
+import asyncio
+import functools
+import ipaddress
+import logging
+import math
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+
+from .async_utils import aget_user
+
+logger = logging.getLogger(__name__)
+
+RateLimitResult = namedtuple('RateLimitResult', 'allowed limit remaining reset retry_after')
+
+KEY_PREFIX = 'rl:'
+RATE_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# Tras un fallo de Redis se usa el bucket local durante este tiempo antes de reintentar
+REDIS_RETRY_INTERVAL = 5
+LOCAL_MAX_BUCKETS = 10000
+
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local refill_rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1])
+local ts = tonumber(bucket[2])
+if tokens == nil or ts == nil then
+    tokens = capacity
+    ts = now
+end
+
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * refill_rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / refill_rate * 1000) + 1000)
+return {allowed, tostring(tokens)}
+"""
+
+
+def parse_rate(rate):
+    """'20/m' -> (20, 60). También acepta periodos con número, p. ej. '100/5m'."""
+    match = re.fullmatch(r'(\d+)/(\d*)([smhd])', rate.strip())
+    if not match:
+        raise ValueError(f"Rate inválido: {rate!r}")
+    count, multiplier, unit = match.groups()
+    return int(count), int(multiplier or 1) * RATE_UNITS[unit]
+
+
+class TokenBucketLimiter:
+    """Token bucket en Redis con respaldo en memoria del proceso"""
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+        self._script = None
+        self._redis_down_until = 0
+        self._local_buckets = OrderedDict()  # LRU: se descartan los buckets usados hace más tiempo
+        self._local_lock = threading.Lock()
+
+    def _get_script(self):
+        if self._script is None:
+            from django_redis import get_redis_connection
+            self._script = get_redis_connection(self.alias).register_script(TOKEN_BUCKET_SCRIPT)
+        return self._script
+
+    def _redis_enabled(self):
+        from django_redis.cache import RedisCache
+        backend = caches[self.alias]
+        if not isinstance(backend, RedisCache) or getattr(backend, 'degraded', False):
+            return False
+        return time.monotonic() >= self._redis_down_until
+
+    def consume(self, key, capacity, period, cost=1):
+        """Consume `cost` tokens del bucket `key`. Retorna RateLimitResult."""
+        refill_rate = capacity / period
+        tokens = None
+        if self._redis_enabled():
+            try:
+                allowed, tokens = self._get_script()(keys=[KEY_PREFIX + key], args=[capacity, refill_rate, cost])
+                allowed, tokens = bool(int(allowed)), float(tokens)
+            except Exception as e:
+                logger.warning("Redis no disponible para rate limiting, usando bucket local: %s", e)
+                self._redis_down_until = time.monotonic() + REDIS_RETRY_INTERVAL
+                tokens = None
+        if tokens is None:
+            allowed, tokens = self._consume_local(key, capacity, refill_rate, cost)
+        return self._result(allowed, tokens, capacity, refill_rate, cost)
+
+    async def aconsume(self, key, capacity, period, cost=1):
+        """Versión async de consume() con redis.asyncio (sin salto a un hilo)"""
+        backend = caches[self.alias]
+        if not hasattr(backend, 'get_async_client'):
+            return await sync_to_async(self.consume)(key, capacity, period, cost=cost)
+
+        refill_rate = capacity / period
+        tokens = None
+        if self._redis_enabled():
+            try:
+                script = backend.get_async_client().register_script(TOKEN_BUCKET_SCRIPT)
+                allowed, tokens = await script(keys=[KEY_PREFIX + key], args=[capacity, refill_rate, cost])
+                allowed, tokens = bool(int(allowed)), float(tokens)
+            except Exception as e:
+                logger.warning("Redis no disponible para rate limiting, usando bucket local: %s", e)
+                self._redis_down_until = time.monotonic() + REDIS_RETRY_INTERVAL
+                tokens = None
+        if tokens is None:
+            allowed, tokens = self._consume_local(key, capacity, refill_rate, cost)
+        return self._result(allowed, tokens, capacity, refill_rate, cost)
+
+    @staticmethod
+    def _result(allowed, tokens, capacity, refill_rate, cost):
+        return RateLimitResult(
+            allowed=allowed,
+            limit=capacity,
+            remaining=int(tokens),
+            reset=math.ceil((capacity - tokens) / refill_rate),
+            retry_after=0 if allowed else math.ceil((cost - tokens) / refill_rate),
+        )
+
+    def _consume_local(self, key, capacity, refill_rate, cost):
+        now = time.monotonic()
+        with self._local_lock:
+            tokens, ts = self._local_buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - ts) * refill_rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._local_buckets[key] = (tokens, now)
+            self._local_buckets.move_to_end(key)
+            if len(self._local_buckets) > LOCAL_MAX_BUCKETS:
+                self._local_buckets.popitem(last=False)
+        return allowed, tokens
+
+    def reset(self):
+        """Vacía los buckets locales (útil en tests)"""
+        with self._local_lock:
+            self._local_buckets.clear()
+
+
+limiter = TokenBucketLimiter()
+
+
+@functools.lru_cache(maxsize=8)
+def _proxy_networks(proxies):
+    return tuple(ipaddress.ip_network(proxy, strict=False) for proxy in proxies)
+
+
+def is_trusted_proxy(address):
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(address in network for network in _proxy_networks(tuple(settings.RATELIMIT_TRUSTED_PROXIES)))
+
+
+def get_client_ip(request):
+    """
+    IP del cliente. RATELIMIT_IP_META_KEY (X-Real-IP de nginx) solo se tiene en
+    cuenta si la conexión llega de RATELIMIT_TRUSTED_PROXIES; de cualquier
+    otro origen la cabecera la pone el cliente y se usa REMOTE_ADDR.
+    """
+    remote_addr = request.META.get('REMOTE_ADDR', '')
+    meta_key = settings.RATELIMIT_IP_META_KEY
+    if meta_key and is_trusted_proxy(remote_addr):
+        ip = request.META.get(meta_key, '').split(',')[0].strip()
+        if ip:
+            return ip
+    return remote_addr
+
+
+def get_rate_limit_identity(request, key):
+    """Identidad del bucket: 'ip', 'user', 'api_key' o un callable(request)"""
+    if callable(key):
+        return str(key(request))
+
+    if key == 'api_key':
+        auth = getattr(request, 'auth', None)
+        if auth is not None and getattr(auth, 'pk', None) is not None:
+            return f"key:{auth.pk}"
+        key = 'user'
+
+    if key == 'user':
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return f"user:{user.pk}"
+        key = 'ip'
+
+    if key == 'ip':
+        return f"ip:{get_client_ip(request)}"
+    raise ValueError(f"Clave de rate limit no soportada: {key!r}")
+
+
+def add_rate_limit_headers(response, result):
+    response['X-RateLimit-Limit'] = str(result.limit)
+    response['X-RateLimit-Remaining'] = str(result.remaining)
+    response['X-RateLimit-Reset'] = str(result.reset)
+    if not result.allowed:
+        response['Retry-After'] = str(result.retry_after)
+    return response
+
+
+def rate_limited_response(result):
+    response = JsonResponse({
+        'error': 'Demasiadas solicitudes, intenta de nuevo más tarde',
+        'retry_after': result.retry_after,
+    }, status=429)
+    return add_rate_limit_headers(response, result)
+
+
+def check_rate_limit(request, key, rate, group, cost=1):
+    """Verifica el límite para la petición. Retorna RateLimitResult."""
+    capacity, period = parse_rate(rate)
+    identity = get_rate_limit_identity(request, key)
+    return limiter.consume(f"{group}:{identity}", capacity, period, cost=cost)
+
+
+async def acheck_rate_limit(request, key, rate, group, cost=1):
+    """check_rate_limit() para vistas async; resuelve request.user si hace falta"""
+    capacity, period = parse_rate(rate)
+    if key in ('user', 'api_key'):
+        await aget_user(request)
+    identity = get_rate_limit_identity(request, key)
+    return await limiter.aconsume(f"{group}:{identity}", capacity, period, cost=cost)
+
+
+def rate_limit(key='user', rate='60/m', method=None, group=None, cost=1):
+    """
+    Decorador de vistas. Con el límite excedido responde 429 con Retry-After;
+    siempre añade X-RateLimit-Limit / X-RateLimit-Remaining / X-RateLimit-Reset.
+
+    Acepta vistas síncronas y async (en estas el bucket se consulta con
+    redis.asyncio). Para vistas DRF conviene aplicarlo debajo de @api_view (o
+    en el método del APIView) para que request.user / request.auth ya estén
+    autenticados.
+    """
+    methods = {method} if isinstance(method, str) else set(method or ())
+    parse_rate(rate)  # Validar al importar
+
+    def decorator(view_func):
+        bucket_group = group or f"{view_func.__module__}.{view_func.__qualname__}"
+
+        @functools.wraps(view_func)
+        def wrapper(*args, **kwargs):
+            # Soporta funciones (request, ...) y métodos (self, request, ...)
+            request = args[1] if len(args) > 1 and not hasattr(args[0], 'META') else args[0]
+            if not settings.RATELIMIT_ENABLE or (methods and request.method not in methods):
+                return view_func(*args, **kwargs)
+
+            result = check_rate_limit(request, key, rate, bucket_group, cost=cost)
+            if not result.allowed:
+                logger.warning("Rate limit excedido en %s (%s)", bucket_group, rate)
+                return rate_limited_response(result)
+            return add_rate_limit_headers(view_func(*args, **kwargs), result)
+
+        @functools.wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            if not settings.RATELIMIT_ENABLE or (methods and request.method not in methods):
+                return await view_func(request, *args, **kwargs)
+
+            result = await acheck_rate_limit(request, key, rate, bucket_group, cost=cost)
+            if not result.allowed:
+                logger.warning("Rate limit excedido en %s (%s)", bucket_group, rate)
+                return rate_limited_response(result)
+            return add_rate_limit_headers(await view_func(request, *args, **kwargs), result)
+
+        return async_wrapper if asyncio.iscoroutinefunction(view_func) else wrapper
+    return decorator
@@ -0,0 +1,31 @@
+"""
+Motor de sesiones: cached_db (lectura desde el cache, escritura en la base de
+datos y en el cache) sin guardar la sesión en cada petición.
+
+SESSION_SAVE_EVERY_REQUEST hacía un UPDATE de django_session por petición
+autenticada solo para desplazar la expiración. Aquí la sesión se marca como
+modificada (y se guarda) como mucho una vez cada SESSION_REFRESH_INTERVAL
+segundos; la expiración sigue siendo deslizante con esa granularidad.
+
+    SESSION_ENGINE = 'iacol_project.sessions'
+"""
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+
+REFRESHED_AT_KEY = '_refreshed_at'
+
+
+class SessionStore(CachedDBStore):
+    def load(self):
+        data = super().load()
+        # Las sesiones vacías (anónimos sin datos) no se crean por esto
+        if data and int(time.time()) - data.get(REFRESHED_AT_KEY, 0) >= settings.SESSION_REFRESH_INTERVAL:
+            self.modified = True
+        return data
+
+    def save(self, must_create=False):
+        # Cualquier guardado (login, cambios de datos o refresco) desplaza la expiración
+        self._get_session()[REFRESHED_AT_KEY] = int(time.time())
+        super().save(must_create=must_create)
@@ -1,6 +1,7 @@
 import os
 from pathlib import Path
 import environ
+from celery.schedules import crontab
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -69,13 +70,12 @@ THIRD_PARTY_APPS = [
     'allauth',
     'allauth.account',
     'allauth.socialaccount',
-    # 'django_ratelimit',  # Temporarily disabled due to cache issues
     'csp',
     'defender',
 ]
 
 LOCAL_APPS = [
-    'apps.authentication',
+    'apps.authentication.apps.AuthenticationConfig',
     'apps.dashboard.apps.DashboardConfig',
     'apps.agents',
     'apps.payments',
@@ -90,8 +90,9 @@ if DEBUG:
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
-    'django_brotli.middleware.BrotliMiddleware',  # Compresión Brotli (mejor que GZIP)
-    'django.middleware.gzip.GZipMiddleware',  # Compresión GZIP como fallback
+    'iacol_project.health.HealthCheckMiddleware',  # /health/live/ y /health/ready/, antes de ALLOWED_HOSTS y HTTPS
+    'iacol_project.metrics.MetricsMiddleware',  # Métricas Prometheus (/metrics); mide todo lo demás
+    'iacol_project.compression.CompressionMiddleware',  # Brotli/GZIP solo para respuestas que lo valen
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -99,7 +100,7 @@ MIDDLEWARE = [
     'django.middleware.locale.LocaleMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'iacol_project.auth_cache.CachedAuthenticationMiddleware',  # AuthenticationMiddleware con el usuario en cache
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'allauth.account.middleware.AccountMiddleware',
@@ -107,15 +108,27 @@ MIDDLEWARE = [
 
 # Only add CSP middleware in production
 if not DEBUG:
-    MIDDLEWARE.insert(2, 'csp.middleware.CSPMiddleware')
+    MIDDLEWARE.insert(3, 'csp.middleware.CSPMiddleware')
+
+# Inspector de consultas tras MetricsMiddleware: cuenta las mismas consultas
+# (sesión y usuario incluidos) que los presupuestos de los tests
+if env.bool('QUERY_INSPECTOR_ENABLED', default=DEBUG):
+    MIDDLEWARE.insert(2, 'iacol_project.querybudget.QueryInspectorMiddleware')
 
 ROOT_URLCONF = 'iacol_project.urls'
 
+_template_loaders = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+if not DEBUG:
+    # Plantillas compiladas una vez por proceso; en desarrollo se leen de disco en cada render
+    _template_loaders = [('django.template.loaders.cached.Loader', _template_loaders)]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -123,6 +136,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            'loaders': _template_loaders,
         },
     },
 ]
@@ -133,15 +147,33 @@ ASGI_APPLICATION = 'iacol_project.asgi.application'
 # Base de datos - PostgreSQL for Docker environment (both DEBUG and production)
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'iacol_project.postgresql_pool',  # PostgreSQL + pool psycopg_pool por proceso
         'NAME': env('DB_NAME', default='iacol'),
         'USER': env('DB_USER', default='postgres'),
         'PASSWORD': env('DB_PASSWORD', default='postgres'),
         'HOST': env('DB_HOST', default='db'),  # Docker hostname
         'PORT': env('DB_PORT', default='5432'),
+        'OPTIONS': {},
     }
 }
 
+# Pool de conexiones: cada worker (gunicorn/uvicorn o Celery) mantiene hasta
+# DB_POOL_MAX_SIZE conexiones; dimensionar para que workers * max_size quepa en max_connections
+if env.bool('DB_POOL', default=True):
+    DATABASES['default']['CONN_MAX_AGE'] = 0  # La conexión vuelve al pool al final de cada petición/tarea
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': env.int('DB_POOL_MIN_SIZE', default=2),
+        'max_size': env.int('DB_POOL_MAX_SIZE', default=10),
+        'max_lifetime': env.float('DB_POOL_MAX_LIFETIME', default=1800),  # segundos
+        'max_idle': env.float('DB_POOL_MAX_IDLE', default=300),
+        'timeout': env.float('DB_POOL_TIMEOUT', default=10),  # espera máxima por una conexión libre
+        'check': env.bool('DB_POOL_CHECK', default=True),  # health check al entregar cada conexión
+    }
+else:
+    # Sin pool: conexiones persistentes por hilo con health check
+    DATABASES['default']['CONN_MAX_AGE'] = env.int('DB_CONN_MAX_AGE', default=60)
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
 # Internacionalización
 LANGUAGE_CODE = 'es'
 LANGUAGES = [
@@ -163,8 +195,15 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 if DEBUG:
     STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
 else:
+    # collectstatic genera los .br/.gz de cada archivo en el build; WhiteNoise
+    # los sirve según Accept-Encoding sin comprimir nada por petición
     STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# Compresión de respuestas dinámicas (iacol_project.compression)
+COMPRESSION_MIN_SIZE = env.int('COMPRESSION_MIN_SIZE', default=1024)  # bytes
+COMPRESSION_BROTLI_QUALITY = env.int('COMPRESSION_BROTLI_QUALITY', default=5)  # 0-11; 5 es rápido para HTML dinámico
+COMPRESSION_CACHE_MAX_BYTES = env.int('COMPRESSION_CACHE_MAX_BYTES', default=16 * 1024 * 1024)  # por proceso
+
 # Archivos media
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
@@ -214,43 +253,124 @@ CORS_ALLOWED_ORIGINS = list(set(base_allowed_origins))
 REDIS_URL = env('REDIS_URL', default='redis://redis:6379/0')
 CELERY_BROKER_URL = REDIS_URL
 CELERY_RESULT_BACKEND = REDIS_URL
-
-# Cache configuration - Redis if available, fallback to LocMem
-try:
-    import redis
-    # Test Redis connection
-    redis_client = redis.from_url(REDIS_URL)
-    redis_client.ping()
-    CACHES = {
-        'default': {
-            'BACKEND': 'django_redis.cache.RedisCache',
-            'LOCATION': REDIS_URL,
-            'OPTIONS': {
-                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
-                'CONNECTION_POOL_KWARGS': {
-                    'max_connections': 20,
-                    'decode_responses': True,
-                },
+# Ejecutar tareas en línea (útil en desarrollo sin worker)
+CELERY_TASK_ALWAYS_EAGER = env.bool('CELERY_TASK_ALWAYS_EAGER', default=False)
+# Tareas periódicas (servicio beat de docker-compose)
+CELERY_BEAT_SCHEDULE = {
+    'archive-old-usage-logs': {
+        'task': 'apps.agents.tasks.archive_old_usage_logs',
+        'schedule': crontab(hour=3, minute=30),
+    },
+    'process-subscriptions': {
+        'task': 'apps.agents.tasks.process_subscriptions',
+        'schedule': crontab(minute='*/15'),
+    },
+}
+# Ciclo de vida de suscripciones (apps/agents/subscriptions.py). Sin cobro: renovar extiende el periodo
+SUBSCRIPTION_RENEWAL_DAYS = env.int('SUBSCRIPTION_RENEWAL_DAYS', default=30)
+SUBSCRIPTION_RENEWAL_LEAD_HOURS = env.int('SUBSCRIPTION_RENEWAL_LEAD_HOURS', default=24)  # antes de end_date
+SUBSCRIPTION_BATCH_SIZE = env.int('SUBSCRIPTION_BATCH_SIZE', default=1000)
+SUBSCRIPTION_MAX_BATCHES = env.int('SUBSCRIPTION_MAX_BATCHES', default=500)  # por ejecución
+
+# Blog API - creación masiva y procesamiento de imágenes en segundo plano
+BLOG_API_BULK_MAX_POSTS = env.int('BLOG_API_BULK_MAX_POSTS', default=50)
+BLOG_IMAGE_MAX_BYTES = 5 * 1024 * 1024  # 5MB por imagen
+BLOG_IMAGE_MAX_DIMENSION = 2400  # px, lado mayor tras normalizar
+# Copias locales de imágenes remotas del blog y variantes WebP responsivas
+BLOG_IMAGE_DEDUPLICATE = env.bool('BLOG_IMAGE_DEDUPLICATE', default=True)
+BLOG_IMAGE_VARIANT_WIDTHS = [480, 960, 1600]
+# Autenticación por API key: cache de la resolución clave -> usuario y registro de uso en lote
+BLOG_API_KEY_CACHE_TIMEOUT = env.int('BLOG_API_KEY_CACHE_TIMEOUT', default=300)  # Redis
+BLOG_API_KEY_LOCAL_CACHE_TIMEOUT = env.int('BLOG_API_KEY_LOCAL_CACHE_TIMEOUT', default=30)  # memoria del proceso
+BLOG_API_KEY_USAGE_FLUSH_INTERVAL = env.int('BLOG_API_KEY_USAGE_FLUSH_INTERVAL', default=60)
+
+# Logs de uso de agentes: payloads grandes comprimidos fuera de la tabla (apps/agents/payloads.py)
+USAGE_LOG_INLINE_PAYLOAD_BYTES = env.int('USAGE_LOG_INLINE_PAYLOAD_BYTES', default=2048)
+USAGE_LOG_PAYLOAD_CODEC = env('USAGE_LOG_PAYLOAD_CODEC', default='br')  # br o gzip
+USAGE_LOG_PAYLOAD_BROTLI_QUALITY = env.int('USAGE_LOG_PAYLOAD_BROTLI_QUALITY', default=5)
+# Retención: los logs más antiguos se archivan (JSONL gzip por mes) y se borran; 0 la desactiva
+USAGE_LOG_RETENTION_DAYS = env.int('USAGE_LOG_RETENTION_DAYS', default=180)
+USAGE_LOG_ARCHIVE_DIR = env('USAGE_LOG_ARCHIVE_DIR', default=str(BASE_DIR / 'archive' / 'usage_logs'))
+USAGE_LOG_ARCHIVE_BATCH_SIZE = env.int('USAGE_LOG_ARCHIVE_BATCH_SIZE', default=5000)
+USAGE_LOG_ARCHIVE_MAX_BATCHES = env.int('USAGE_LOG_ARCHIVE_MAX_BATCHES', default=200)  # por ejecución
+# Exportación del historial: filas por viaje al cursor del servidor
+EXECUTION_EXPORT_CHUNK_SIZE = env.int('EXECUTION_EXPORT_CHUNK_SIZE', default=2000)
+# Dashboard en vivo (SSE, apps/agents/events.py): comentario keepalive si no hay eventos y
+# duración máxima de cada conexión (el navegador reconecta con Last-Event-ID)
+SSE_HEARTBEAT_SECONDS = env.int('SSE_HEARTBEAT_SECONDS', default=15)
+SSE_MAX_STREAM_SECONDS = env.int('SSE_MAX_STREAM_SECONDS', default=300)
+
+# Cache configuration - Redis con conexión perezosa y respaldo local por operación
+# (sin ping al importar settings; ver iacol_project/cache.py)
+CACHES = {
+    'default': {
+        'BACKEND': 'iacol_project.cache.ResilientRedisCache',
+        'LOCATION': REDIS_URL,
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            'CONNECTION_POOL_KWARGS': {
+                'max_connections': 20,
             },
-            'TIMEOUT': 300,  # 5 minutes default TTL
-        }
-    }
-    print("Redis cache configured successfully")
-except (ImportError, redis.ConnectionError) as e:
-    print(f"Redis not available, using LocMemCache: {e}")
-    CACHES = {
-        'default': {
-            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-            'LOCATION': 'unique-snowflake',
-            'TIMEOUT': 300,  # 5 minutes default TTL
-        }
-    }
+            # Acotar la espera cuando Redis no responde; luego se usa el cache local
+            'SOCKET_CONNECT_TIMEOUT': env.float('REDIS_SOCKET_CONNECT_TIMEOUT', default=0.5),
+            'SOCKET_TIMEOUT': env.float('REDIS_SOCKET_TIMEOUT', default=1.0),
+            'FALLBACK_RETRY_INTERVAL': env.int('CACHE_FALLBACK_RETRY_INTERVAL', default=5),
+        },
+        'TIMEOUT': 300,  # 5 minutes default TTL
+    },
+    # Fragmentos {% cache %} de las tarjetas (agentes, proveedores, productos): en memoria
+    # del proceso para no hacer un round trip a Redis por tarjeta. Las claves incluyen
+    # updated_at, así que un cambio produce una clave nueva y no hace falta invalidar.
+    'template_fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'template-fragments',
+        'TIMEOUT': 86400,
+        'OPTIONS': {'MAX_ENTRIES': env.int('TEMPLATE_FRAGMENT_CACHE_MAX_ENTRIES', default=5000)},
+    },
+}
 
 # Cache middleware settings
 CACHE_MIDDLEWARE_ALIAS = 'default'
 CACHE_MIDDLEWARE_SECONDS = 600  # 10 minutes
 CACHE_MIDDLEWARE_KEY_PREFIX = 'iacol_middleware'
 
+# Cache de página completa para anónimos (iacol_project.page_cache)
+PAGE_CACHE_ENABLED = env.bool('PAGE_CACHE_ENABLED', default=not DEBUG)
+PAGE_CACHE_ALIAS = 'default'
+PAGE_CACHE_TIMEOUT = env.int('PAGE_CACHE_TIMEOUT', default=600)  # en Redis
+PAGE_CACHE_MAX_AGE = env.int('PAGE_CACHE_MAX_AGE', default=60)  # Cache-Control público (nginx/CDN/navegador)
+PAGE_CACHE_GENERATION_TTL = 5  # segundos que cada proceso memoriza la generación tras una purga total
+# Cambiarlo en un despliegue invalida todas las páginas (p. ej. el hash del commit)
+PAGE_CACHE_VERSION = env('PAGE_CACHE_VERSION', default='1')
+
+# Métricas Prometheus (iacol_project.metrics). Sin token, /metrics solo responde a IPs internas
+METRICS_TOKEN = env('METRICS_TOKEN', default='')
+
+# Health checks (iacol_project.health): resultados cacheados en el proceso para que los
+# sondeos frecuentes del balanceador no se conviertan en carga para la base de datos
+HEALTH_CHECK_CACHE_SECONDS = env.float('HEALTH_CHECK_CACHE_SECONDS', default=5)
+HEALTH_PROBE_TIMEOUT = env.float('HEALTH_PROBE_TIMEOUT', default=1.0)
+# Una dependencia crítica caída responde 503 (el balanceador saca al worker); las demás solo degradan
+HEALTH_CRITICAL_PROBES = env.list('HEALTH_CRITICAL_PROBES', default=['database', 'storage'])
+HEALTH_CELERY_QUEUES = env.list('HEALTH_CELERY_QUEUES', default=['celery'])
+HEALTH_CELERY_QUEUE_MAX_DEPTH = env.int('HEALTH_CELERY_QUEUE_MAX_DEPTH', default=1000)
+HEALTH_STORAGE_MIN_FREE_MB = env.int('HEALTH_STORAGE_MIN_FREE_MB', default=500)
+
+# Registro de consultas por petición y presupuestos @query_budget (iacol_project.querybudget).
+# Solo desarrollo/CI: añade X-Query-Count y avisa de N+1; con STRICT un presupuesto excedido es un error
+QUERY_INSPECTOR_ENABLED = env.bool('QUERY_INSPECTOR_ENABLED', default=DEBUG)
+QUERY_INSPECTOR_N_PLUS_ONE_THRESHOLD = env.int('QUERY_INSPECTOR_N_PLUS_ONE_THRESHOLD', default=5)
+QUERY_BUDGET_STRICT = env.bool('QUERY_BUDGET_STRICT', default=False)
+
+# Rate limiting (iacol_project.ratelimit): token bucket en Redis con respaldo en memoria
+RATELIMIT_ENABLE = env.bool('RATELIMIT_ENABLE', default=True)
+# nginx envía la IP real en X-Real-IP; sin la cabecera se usa REMOTE_ADDR
+RATELIMIT_IP_META_KEY = env('RATELIMIT_IP_META_KEY', default='HTTP_X_REAL_IP')
+# Redes desde las que se acepta esa cabecera (nginx en la red de Docker); IPs o CIDR
+RATELIMIT_TRUSTED_PROXIES = env.list('RATELIMIT_TRUSTED_PROXIES', default=[
+    '127.0.0.0/8', '::1', '10.0.0.0/8', '172.16.0.0/12', '192.168.0.0/16',
+])
+
 # Crispy Forms
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
@@ -285,6 +405,12 @@ ACCOUNT_RATE_LIMITS = {
 ACCOUNT_MAX_EMAIL_ADDRESSES = 1
 
 # Logging Configuration - Production optimized
+# Las peticiones solo encolan los registros; un hilo escritor por handler
+# 'queue*' hace la E/S (iacol_project.logging_utils). Los INFO de las apps se
+# muestrean con LOG_INFO_SAMPLE_RATE; WARNING y superiores siempre se escriben.
+LOG_INFO_SAMPLE_RATE = env.float('LOG_INFO_SAMPLE_RATE', default=1.0 if DEBUG else 0.1)
+LOG_QUEUE_SIZE = env.int('LOG_QUEUE_SIZE', default=10000)
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -298,7 +424,14 @@ LOGGING = {
             'style': '{',
         },
         'json': {
-            'format': '{"timestamp": "%(asctime)s", "level": "%(levelname)s", "module": "%(module)s", "message": "%(message)s"}',
+            '()': 'iacol_project.logging_utils.JSONFormatter',
+        },
+    },
+    'filters': {
+        'sample_app_info': {
+            '()': 'iacol_project.logging_utils.SamplingFilter',
+            'rate': LOG_INFO_SAMPLE_RATE,
+            'loggers': ['apps.'],
         },
     },
     'handlers': {
@@ -313,36 +446,49 @@ LOGGING = {
             'filename': os.path.join(BASE_DIR, 'django.log'),
             'formatter': 'verbose',
         },
-        'security_file': {
+        'file_security': {
             'level': 'WARNING',
             'class': 'logging.FileHandler',
             'filename': os.path.join(BASE_DIR, 'security.log'),
             'formatter': 'verbose',
         },
+        # Los loggers usan estos; cada uno reparte en su hilo a los de arriba.
+        # dictConfig los crea en orden alfabético: sus nombres van tras los destinos
+        'queue': {
+            'class': 'iacol_project.logging_utils.QueueListenerHandler',
+            'handlers': ['console', 'file'],
+            'queue_size': LOG_QUEUE_SIZE,
+            'filters': ['sample_app_info'],
+        },
+        'queue_security': {
+            'class': 'iacol_project.logging_utils.QueueListenerHandler',
+            'handlers': ['console', 'file_security'],
+            'queue_size': LOG_QUEUE_SIZE,
+        },
     },
     'loggers': {
         'django': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'INFO' if not DEBUG else 'DEBUG',
             'propagate': True,
         },
         'django.security': {
-            'handlers': ['console', 'security_file'],
+            'handlers': ['queue_security'],
             'level': 'WARNING',
             'propagate': False,
         },
         'apps.dashboard': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'INFO' if not DEBUG else 'DEBUG',
             'propagate': False,
         },
         'apps.agents': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'INFO' if not DEBUG else 'DEBUG',
             'propagate': False,
         },
         'apps.api': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'INFO' if not DEBUG else 'DEBUG',
             'propagate': False,
         },
@@ -406,8 +552,13 @@ else:
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 
 # Session configuration
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'  # Explicitly set database sessions
-SESSION_SAVE_EVERY_REQUEST = True  # Save session on every request to prevent corruption
+# cached_db sin UPDATE por petición (iacol_project.sessions); la expiración se desplaza como
+# mucho una vez por SESSION_REFRESH_INTERVAL. Solo Redis: 'django.contrib.sessions.backends.cache'
+SESSION_ENGINE = env('SESSION_ENGINE', default='iacol_project.sessions')
+SESSION_SAVE_EVERY_REQUEST = False
+SESSION_REFRESH_INTERVAL = env.int('SESSION_REFRESH_INTERVAL', default=3600)  # segundos
+# Usuario autenticado en cache (iacol_project.auth_cache); 0 lo desactiva
+AUTH_USER_CACHE_TIMEOUT = env.int('AUTH_USER_CACHE_TIMEOUT', default=300)
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
 SESSION_COOKIE_AGE = 1209600  # 2 weeks
 
@@ -438,6 +589,15 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Configuración N8N
 N8N_WEBHOOK_URL = env('N8N_WEBHOOK_URL', default='http://n8n:5678/webhook/')
 N8N_API_URL = env('N8N_API_URL', default='http://n8n:5678/api/v1/')
+N8N_API_KEY = env('N8N_API_KEY', default='')
+# Cliente HTTP (apps/agents/n8n.py)
+N8N_CONNECT_TIMEOUT = env.float('N8N_CONNECT_TIMEOUT', default=3.0)  # segundos
+N8N_TIMEOUT = env.float('N8N_TIMEOUT', default=30.0)  # segundos de espera de la respuesta
+N8N_MAX_RETRIES = env.int('N8N_MAX_RETRIES', default=2)
+N8N_RETRY_BACKOFF = env.float('N8N_RETRY_BACKOFF', default=0.5)  # base del backoff exponencial con jitter
+N8N_MAX_CONNECTIONS = env.int('N8N_MAX_CONNECTIONS', default=10)  # peticiones simultáneas por host y proceso
+N8N_CIRCUIT_FAILURE_THRESHOLD = env.int('N8N_CIRCUIT_FAILURE_THRESHOLD', default=5)
+N8N_CIRCUIT_RESET_TIMEOUT = env.int('N8N_CIRCUIT_RESET_TIMEOUT', default=30)  # segundos con el circuito abierto
 
 # Evolution API
 EVOLUTION_API_URL = env('EVOLUTION_API_URL', default='http://evolution_api:8080')
@@ -0,0 +1,151 @@
+"""
+Perfil del arranque en frío de los procesos de la aplicación.
+
+Cada medición es un intérprete nuevo que ejecuta las fases de arranque de un
+tipo de proceso y mide cuánto tarda cada una:
+
+- web (worker de gunicorn): django.setup() y carga del URLconf raíz, que
+  importa todas las vistas.
+- celery (worker de Celery): django.setup() e importación de los módulos de
+  tareas (autodiscover_tasks).
+
+Una ejecución adicional con `python -X importtime` atribuye el tiempo de cada
+fase a los módulos que importa. El resultado es JSON para seguir el arranque
+entre versiones:
+
+    manage.py profile_startup --output startup.json
+    manage.py profile_startup --compare startup.json --max-regression 20
+"""
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+from datetime import datetime, timezone as dt_timezone
+
+import django
+from django.conf import settings
+
+RESULTS_VERSION = 1
+PROCESSES = {
+    'web': ('setup', 'urlconf'),
+    'celery': ('setup', 'celery_tasks'),
+}
+PHASE_MARKER = '#startup-phase '
+
+# Se ejecuta con `python -c PROBE <proceso>`; las marcas de fase van a stderr, igual que -X importtime
+PROBE = f"""
+import json, sys, time
+def setup():
+    import django
+    django.setup()
+def urlconf():
+    from django.urls import get_resolver
+    get_resolver().url_patterns
+def celery_tasks():
+    from iacol_project.celery import app
+    app.loader.import_default_modules()
+timings = {{}}
+for name in {PROCESSES!r}[sys.argv[1]]:
+    sys.stderr.write({PHASE_MARKER!r} + name + '\\n')
+    sys.stderr.flush()
+    start = time.perf_counter()
+    globals()[name]()
+    timings[name] = time.perf_counter() - start
+print(json.dumps(timings))
+"""
+
+re_importtime = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$')
+
+
+class StartupProbeError(Exception):
+    pass
+
+
+def run_probe(process, importtime=False):
+    """Arranca `process` en un intérprete nuevo; devuelve (segundos por fase, stderr)"""
+    command = [sys.executable]
+    if importtime:
+        command += ['-X', 'importtime']
+    command += ['-c', PROBE, process]
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'iacol_project.settings')}
+    # Solo la ejecución con importtime=True registra los imports
+    env.pop('PYTHONPROFILEIMPORTTIME', None)
+    result = subprocess.run(command, capture_output=True, text=True, cwd=settings.BASE_DIR, env=env, timeout=300)
+    if result.returncode != 0:
+        raise StartupProbeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'sin salida')
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def parse_importtime(stderr):
+    """{fase: [(módulo, propio µs, acumulado µs)]} con los imports de primer nivel de cada fase"""
+    modules = {}
+    current = None
+    for line in stderr.splitlines():
+        if line.startswith(PHASE_MARKER):
+            current = modules.setdefault(line[len(PHASE_MARKER):], [])
+            continue
+        match = re_importtime.match(line)
+        if current is None or not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        # -X importtime indenta los imports anidados; los de primer nivel suman el total de la fase
+        if not indent:
+            current.append((name, int(self_us), int(cumulative_us)))
+    return modules
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1)
+
+
+def _timing(values):
+    values = sorted(values)
+    return {'median_ms': _ms(statistics.median(values)), 'min_ms': _ms(values[0]), 'max_ms': _ms(values[-1])}
+
+
+def profile_process(process, repeat, top):
+    runs = [run_probe(process)[0] for _ in range(repeat)]
+    result = {
+        'total': _timing([sum(run.values()) for run in runs]),
+        'phases': {name: _timing([run[name] for run in runs]) for name in PROCESSES[process]},
+    }
+    _, stderr = run_probe(process, importtime=True)
+    result['slowest_imports'] = {}
+    for name, imports in parse_importtime(stderr).items():
+        imports.sort(key=lambda item: item[2], reverse=True)
+        result['slowest_imports'][name] = [
+            {'module': module, 'cumulative_ms': round(cumulative / 1000, 1), 'self_ms': round(own / 1000, 1)}
+            for module, own, cumulative in imports[:top]
+        ]
+    return result
+
+
+def profile_startup(processes=None, repeat=5, top=15):
+    """Mediana de `repeat` arranques en frío por proceso y los `top` imports más lentos de cada fase"""
+    return {
+        'version': RESULTS_VERSION,
+        'meta': {
+            'timestamp': datetime.now(dt_timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'settings': os.environ.get('DJANGO_SETTINGS_MODULE'),
+            'repeat': repeat,
+        },
+        'processes': {process: profile_process(process, repeat, top) for process in processes or PROCESSES},
+    }
+
+
+def compare_startup(baseline, current):
+    """[(proceso, antes, ahora, % de cambio)] de la mediana del arranque total"""
+    rows = []
+    for process, result in current['processes'].items():
+        before = baseline.get('processes', {}).get(process)
+        if before is None:
+            continue
+        old, new = before['total']['median_ms'], result['total']['median_ms']
+        change = (new - old) / old * 100 if old else 0.0
+        rows.append((process, old, new, round(change, 1)))
+    return rows
@@ -8,12 +8,17 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import redirect
 from django.urls import resolve
 from django.contrib.sitemaps.views import sitemap
-from django.utils import timezone
 from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.i18n import set_language
+from .metrics import metrics_view
 from .sitemaps import StaticSitemap, AgentSitemap, PaymentSitemap
 
 urlpatterns = [
-    path('i18n/', include('django.conf.urls.i18n')),
+    # Sin token CSRF en el selector de idioma: así las páginas anónimas se pueden
+    # cachear completas (iacol_project.page_cache). set_language solo cambia la
+    # cookie de idioma y redirige a un `next` validado.
+    path('i18n/setlang/', csrf_exempt(set_language), name='set_language'),
 ]
 
 urlpatterns += i18n_patterns(
@@ -28,14 +33,9 @@ urlpatterns += i18n_patterns(
     prefix_default_language=False
 )
 
-# Health check endpoint for monitoring
-from django.http import JsonResponse
-
-def health_check(request):
-    return JsonResponse({'status': 'healthy', 'timestamp': timezone.now().isoformat()})
-
+# /health/, /health/live/ y /health/ready/ los responde iacol_project.health.HealthCheckMiddleware
 urlpatterns += [
-    path('health/', health_check, name='health-check'),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 # Static and media files are served by Nginx in production